@@ -0,0 +1,78 @@
+import argparse
+import glob
+import os
+import re
+import time
+from typing import List, Dict, Callable
+
+from bs4 import BeautifulSoup as bs
+
+from Utils.scrap_in_json import ImmowebScraper
+from Utils.extract import extract_classified, extract_table
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "classified")
+
+
+def soup_table(content: bytes) -> Dict[str, str]:
+    # The two find_all passes and tag-stripping regex get_other_info used before extract_table, kept as the reference.
+    soup = bs(content, 'html.parser')
+    table = {}
+    for block in soup.find_all('div', class_='text-block') + soup.find_all('div', class_='accordion__content'):
+        headers = block.find_all('th', class_='classified-table__header')
+        data = block.find_all('td', class_='classified-table__data')
+        for th, td in zip(headers, data):
+            table[re.sub('<[^<]+?>', '', str(th)).strip()] = re.sub('<[^<]+?>', '', str(td)).strip()
+    return table
+
+
+def time_path(parse: Callable[[bytes], object], pages: List[bytes], repeat: int) -> float:
+    """
+    Time an extraction path over the fixture pages.
+
+    Args:
+        parse (Callable[[bytes], object]): Extraction function.
+        pages (List[bytes]): Raw HTML of the fixture pages.
+        repeat (int): Number of passes over the pages.
+
+    Returns:
+        float: Mean time per page in milliseconds.
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for page in pages:
+            parse(page)
+    return (time.perf_counter() - start) * 1000 / (repeat * len(pages))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare the fast and BeautifulSoup window.classified and classified-table extraction paths.")
+    parser.add_argument("--fixtures", default=FIXTURES, help="Directory of the fixture detail pages.")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of passes over the pages.")
+    args = parser.parse_args()
+
+    pages = [open(path, "rb").read() for path in sorted(glob.glob(os.path.join(args.fixtures, "*.html")))]
+    if not pages:
+        raise SystemExit(f"No fixture pages in {args.fixtures}")
+
+    for page in pages:
+        if extract_classified(page) != ImmowebScraper.parse_json_data_soup(page):
+            raise SystemExit("Fast path and BeautifulSoup path disagree")
+        if extract_table(page) != soup_table(page):
+            raise SystemExit("Single-pass table and BeautifulSoup table disagree")
+
+    soup_ms = time_path(ImmowebScraper.parse_json_data_soup, pages, args.repeat)
+    fast_ms = time_path(extract_classified, pages, args.repeat)
+    print(f"pages: {len(pages)}")
+    print(f"beautifulsoup: {soup_ms:.3f} ms/page")
+    print(f"fast scan:     {fast_ms:.3f} ms/page")
+    print(f"speedup:       {soup_ms / fast_ms:.1f}x")
+
+    soup_table_ms = time_path(soup_table, pages, args.repeat)
+    table_ms = time_path(extract_table, pages, args.repeat)
+    print(f"table, beautifulsoup: {soup_table_ms:.3f} ms/page")
+    print(f"table, single pass:   {table_ms:.3f} ms/page")
+    print(f"table speedup:        {soup_table_ms / table_ms:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
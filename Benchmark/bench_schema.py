@@ -0,0 +1,89 @@
+import argparse
+import glob
+import os
+import time
+from typing import List, Dict, Any, Callable
+
+from Utils.extract import extract_classified
+from Utils.schema import CompiledSchema, listing_fields
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "classified")
+
+
+def handwritten_row(data: Dict[str, Any], type_of_sale: str) -> Dict[str, Any]:
+    # The expressions save_data used before the compiled schema, kept as the reference.
+    if type_of_sale == "sale":
+        price = data["transaction"]["sale"]["price"] if data["transaction"]["sale"]["price"] is not None else False
+    elif type_of_sale == "rent":
+        monthly_rent = data["transaction"]["rental"]["monthlyRentalPrice"] if data["transaction"]["rental"]["monthlyRentalPrice"] is not None else 0
+        monthly_costs = data["transaction"]["rental"]["monthlyRentalCosts"] if data["transaction"]["rental"]["monthlyRentalCosts"] is not None else 0
+        price = monthly_rent + monthly_costs if (monthly_rent and monthly_costs) else False
+
+    return {
+        "Locality": data["property"]["location"]["postalCode"] if data["property"]["location"]["postalCode"] is not None else False,
+        "Type of property": data["property"]["type"] if data["property"]["type"] is not None else False,
+        "Subtype of property": data["property"]["subtype"] if data["property"]["subtype"] is not None else False,
+        "Price": price,
+        "Type of sale": type_of_sale,
+        "Bedrooms": data["property"]["bedroomCount"] if data["property"]["bedroomCount"] is not None else False,
+        "Living area": data["property"]["netHabitableSurface"] if data["property"]["netHabitableSurface"] is not None else False,
+        "Kitchen type": data["property"]["kitchen"]["type"] if data["property"]["kitchen"]["type"] is not None else False,
+        "Furnished": data["transaction"]["rental"]["isFurnished"] if type_of_sale == "rent" else data["transaction"]["sale"]["isFurnished"],
+        "How many fireplaces?": data["property"]["fireplaceCount"] if data["property"]["fireplaceCount"] is not None else False,
+        "Terrace surface": data["property"]["terraceSurface"] if data["property"]["terraceSurface"] is not None else False,
+        "Garden surface": data["property"]["gardenSurface"] if data["property"]["gardenSurface"] is not None else False,
+        "Surface of the plot": data["property"]["netHabitableSurface"] if data["property"]["netHabitableSurface"] is not None else False,
+        "Number of frontages": data["property"]["building"]["facadeCount"] if data["property"]["building"]["facadeCount"] is not None else False,
+        "Swimming pool": data["property"]["hasSwimmingPool"] if data["property"]["hasSwimmingPool"] is not None else False,
+        "Building condition": data["property"]["building"]["condition"] if data["property"]["building"]["condition"] is not None else False
+    }
+
+
+def time_build(build: Callable[[Dict[str, Any], str], Any], listings: List[tuple], repeat: int) -> float:
+    """
+    Time a row builder over the JSON data of the fixture pages.
+
+    Args:
+        build (Callable[[Dict[str, Any], str], Any]): Row builder taking the data and the type of sale.
+        listings (List[tuple]): JSON data and type of sale of every page.
+        repeat (int): Number of passes over the pages.
+
+    Returns:
+        float: Mean time per row in microseconds.
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for data, type_of_sale in listings:
+            build(data, type_of_sale)
+    return (time.perf_counter() - start) * 1e6 / (repeat * len(listings))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare the compiled row schema with the hand-written row expressions.")
+    parser.add_argument("--fixtures", default=FIXTURES, help="Directory of the fixture detail pages.")
+    parser.add_argument("--repeat", type=int, default=2000, help="Number of passes over the pages.")
+    args = parser.parse_args()
+
+    listings = []
+    for path in sorted(glob.glob(os.path.join(args.fixtures, "*.html"))):
+        with open(path, "rb") as file:
+            data = extract_classified(file.read())
+        listings.append((data, "rent" if data["transaction"]["type"] == "FOR_RENT" else "sale"))
+    if not listings:
+        raise SystemExit(f"No fixture pages in {args.fixtures}")
+
+    schemas = {type_of_sale: CompiledSchema(listing_fields(type_of_sale)) for type_of_sale in ("sale", "rent")}
+    for data, type_of_sale in listings:
+        if schemas[type_of_sale](data).as_dict() != handwritten_row(data, type_of_sale):
+            raise SystemExit("Compiled schema and hand-written expressions disagree")
+
+    handwritten_us = time_build(handwritten_row, listings, args.repeat)
+    compiled_us = time_build(lambda data, type_of_sale: schemas[type_of_sale](data), listings, args.repeat)
+    print(f"rows:        {len(listings)}")
+    print(f"hand-written: {handwritten_us:.3f} us/row")
+    print(f"compiled:     {compiled_us:.3f} us/row")
+    print(f"speedup:      {handwritten_us / compiled_us:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+import argparse
+import html
+import json
+import os
+import random
+from typing import List, Dict, Any, Optional, Tuple
+
+from Benchmark.server import FIXTURES
+
+# The pages are synthetic: shaped like Immoweb's search and detail pages, with made-up listings,
+# not recorded from the live site.
+PER_PAGE = 30
+SEARCH_PAGES = {"for-sale": 2, "for-rent": 1}
+FIRST_ID = 11480000
+TYPES = [("HOUSE", "HOUSE"), ("HOUSE", "VILLA"), ("HOUSE", "TOWN_HOUSE"), ("APARTMENT", "DUPLEX")]
+POSTAL_CODES = [1000, 2000, 2800, 3000, 4000, 5000, 6950, 8000, 9000]
+CONDITIONS = ["GOOD", "TO_RENOVATE", "AS_NEW", "JUST_RENOVATED", None]
+KITCHENS = ["INSTALLED", "SEMI_EQUIPPED", "HYPER_EQUIPPED", None]
+# Screen reader text follows the unit of a surface, the way Immoweb marks it up.
+SURFACE = '{} <span class="abbreviation"><span aria-hidden="true">m²</span> <span class="sr-only">square meters</span></span>'
+
+
+def make_classified(cid: int, transaction: str, agency: int) -> Dict[str, Any]:
+    """
+    Draw the window.classified JSON data of a listing.
+
+    Args:
+        cid (int): Classified ID.
+        transaction (str): "for-sale" or "for-rent".
+        agency (int): Position of the listing on its search page, used to name its agency.
+
+    Returns:
+        Dict[str, Any]: JSON data of the listing.
+    """
+    sale = transaction == "for-sale"
+    property_type, subtype = random.choice(TYPES)
+    postal_code = str(random.choice(POSTAL_CODES))
+    return {
+        "id": cid, "cluster": None, "customers": [{"name": f"Agency {agency}"}],
+        "property": {
+            "type": property_type, "subtype": subtype, "title": None, "description": "Lovely " * 200,
+            "bedroomCount": random.choice([1, 2, 3, 4, None]),
+            "netHabitableSurface": random.choice([80, 105, 120, 200, None]),
+            "location": {
+                "country": "Belgium", "region": "Flanders", "province": "Antwerp", "locality": "Mechelen",
+                "postalCode": postal_code, "street": "Rue", "number": "1",
+            },
+            "kitchen": {"type": random.choice(KITCHENS)},
+            "fireplaceCount": random.choice([None, 1]),
+            "terraceSurface": random.choice([None, 10, 20]),
+            "gardenSurface": random.choice([None, 65, 100]),
+            "hasSwimmingPool": random.choice([None, False, True]),
+            "building": {
+                "facadeCount": random.choice([2, 3, 4, None]), "condition": random.choice(CONDITIONS),
+                "constructionYear": 1950,
+            },
+            "rooms": [{"name": f"r{k}", "surface": k} for k in range(20)],
+        },
+        "transaction": {
+            "type": "FOR_SALE" if sale else "FOR_RENT",
+            "sale": {"price": random.randint(150, 900) * 1000, "isFurnished": False} if sale else None,
+            "rental": None if sale else {
+                "monthlyRentalPrice": random.randint(6, 30) * 100,
+                "monthlyRentalCosts": random.choice([None, 50, 100]),
+                "isFurnished": random.choice([True, False]),
+            },
+        },
+        "media": {"pictures": [{"largeUrl": f"https://x/{k}.jpg"} for k in range(30)]},
+        # Braces and quotes inside strings, which a naive scan for the end of the object trips on.
+        "note": "braces } { and \"quotes\" in strings; };",
+    }
+
+
+def words(value: Optional[str]) -> Optional[str]:
+    """
+    Turn an enum of the JSON data into the text of a table cell, e.g. "Semi equipped" from "SEMI_EQUIPPED".
+    """
+    return value.replace("_", " ").capitalize() if value else None
+
+
+def table_rows(data: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """
+    Get the classified-table rows of a listing, matching its JSON data. Unknown values have no row.
+
+    Args:
+        data (Dict[str, Any]): JSON data of the listing.
+
+    Returns:
+        List[Tuple[str, str]]: Inner HTML of the header and data cells of every row.
+    """
+    prop = data["property"]
+    terms = data["transaction"]["sale"] or data["transaction"]["rental"]
+    yes_no = {True: "Yes", False: "No"}
+    rows = [
+        ("Bedrooms", prop["bedroomCount"]),
+        ("Living area", SURFACE.format(prop["netHabitableSurface"]) if prop["netHabitableSurface"] else None),
+        ("Kitchen type", words(prop["kitchen"]["type"])),
+        ("Furnished", yes_no[terms["isFurnished"]]),
+        ("How many fireplaces?", prop["fireplaceCount"]),
+        ("Terrace surface", SURFACE.format(prop["terraceSurface"]) if prop["terraceSurface"] else None),
+        ("Garden surface", SURFACE.format(prop["gardenSurface"]) if prop["gardenSurface"] else None),
+        ("Number of frontages", prop["building"]["facadeCount"]),
+        ("Swimming pool", yes_no.get(prop["hasSwimmingPool"])),
+        ("Building condition", words(prop["building"]["condition"])),
+    ]
+    if data["transaction"]["rental"] and data["transaction"]["rental"]["monthlyRentalCosts"]:
+        rows.append(("Monthly charges", f"€ {data['transaction']['rental']['monthlyRentalCosts']}"))
+    return [(header, str(value)) for header, value in rows if value is not None]
+
+
+def detail_page(data: Dict[str, Any], transaction: str) -> str:
+    """
+    Render the detail page of a listing, with its price heading, classified-table and window.classified script.
+
+    Args:
+        data (Dict[str, Any]): JSON data of the listing.
+        transaction (str): "for-sale" or "for-rent".
+
+    Returns:
+        str: HTML of the page.
+    """
+    sale = transaction == "for-sale"
+    price = data["transaction"]["sale"]["price"] if sale else data["transaction"]["rental"]["monthlyRentalPrice"]
+    title = words(data["property"]["subtype"])
+    rows = "".join(
+        '<tr class="classified-table__row"><th class="classified-table__header" scope="row">\n  %s\n</th>'
+        '<td class="classified-table__data">\n  %s\n</td></tr>' % row
+        for row in table_rows(data)
+    )
+    return (
+        f'<!DOCTYPE html><html><head><title>{title}</title>' + '<link rel="stylesheet" href="a.css">' * 20 +
+        '</head><body>' + '<div class="nav"><ul>' + '<li><a href="/x">item</a></li>' * 300 + '</ul></div>' +
+        f'<div class="classified"><h1 class="classified__title">{title} for {"sale" if sale else "rent"}</h1>' +
+        f'<p class="classified__price"><span aria-hidden="true">€{price:,}</span><span class="sr-only">{price}€</span></p>' +
+        f'<div class="accordion__content"><table class="classified-table"><tbody>{rows}</tbody></table></div>' +
+        f'<script type="text/javascript">\n        window.classified = {json.dumps(data)};\n        window.dataLayer = [];\n</script></div>' +
+        '<footer>' + '<p>footer text</p>' * 200 + '</footer></body></html>'
+    )
+
+
+def search_result(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Get the summary of a listing carried by the :results attribute of a search page.
+    """
+    prop, terms = data["property"], data["transaction"]
+    return {
+        "id": data["id"],
+        "property": {
+            "type": prop["type"], "subtype": prop["subtype"], "bedroomCount": prop["bedroomCount"],
+            "netHabitableSurface": prop["netHabitableSurface"],
+            "location": {"postalCode": prop["location"]["postalCode"], "locality": "Mechelen"},
+        },
+        "transaction": {
+            "type": terms["type"],
+            "sale": {"price": terms["sale"]["price"]} if terms["sale"] else None,
+            "rental": {"monthlyRentalPrice": terms["rental"]["monthlyRentalPrice"]} if terms["rental"] else None,
+        },
+    }
+
+
+def make_fixtures(directory: str, seed: int = 1) -> int:
+    """
+    Write synthetic search and detail pages for the benchmarks and the stand-in server.
+
+    The same seed always gives the same pages, so results stay comparable
+    between versions. Detail links start with the __BASE__ placeholder the
+    server replaces with its address.
+
+    Args:
+        directory (str): Directory to write search/ and classified/ into.
+        seed (int): Seed of the random listings.
+
+    Returns:
+        int: Number of detail pages written.
+    """
+    random.seed(seed)
+    os.makedirs(os.path.join(directory, "classified"), exist_ok=True)
+    os.makedirs(os.path.join(directory, "search"), exist_ok=True)
+    cid = FIRST_ID
+    for transaction, pages in SEARCH_PAGES.items():
+        for page in range(1, pages + 1):
+            results, cards = [], []
+            for position in range(PER_PAGE):
+                cid += 1
+                data = make_classified(cid, transaction, position)
+                prop = data["property"]
+                postal_code = prop["location"]["postalCode"]
+                with open(os.path.join(directory, "classified", f"{cid}.html"), "w") as file:
+                    file.write(detail_page(data, transaction))
+                href = f"__BASE__/en/classified/{prop['subtype'].lower().replace('_', '-')}/{transaction}/mechelen/{postal_code}/{cid}"
+                cards.append(
+                    f'<article class="card"><h2 class="card__title"><a class="card__title-link" href="{href}">'
+                    f'{prop["subtype"]}</a></h2><p class="card__information--locality">{postal_code} Mechelen</p></article>'
+                )
+                results.append(search_result(data))
+            with open(os.path.join(directory, "search", f"{transaction}_{page}.html"), "w") as file:
+                file.write(
+                    '<!DOCTYPE html><html><body><iw-search :results="%s" :result-count="%d"></iw-search><main>%s</main></body></html>'
+                    % (html.escape(json.dumps(results)), pages * PER_PAGE, "".join(cards))
+                )
+    with open(os.path.join(directory, "search", "empty.html"), "w") as file:
+        file.write('<!DOCTYPE html><html><body><iw-search :results="[]" :result-count="0"></iw-search><main></main></body></html>')
+    return cid - FIRST_ID
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Write the synthetic Immoweb-like pages the benchmarks run on.")
+    parser.add_argument("--directory", default=FIXTURES, help="Directory of the fixture pages.")
+    parser.add_argument("--seed", type=int, default=1, help="Seed of the random listings.")
+    args = parser.parse_args()
+    print(f"{make_fixtures(args.directory, args.seed)} detail pages written to {args.directory}")
+
+
+if __name__ == "__main__":
+    main()
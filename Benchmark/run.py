@@ -0,0 +1,220 @@
+import argparse
+import contextlib
+import datetime
+import glob
+import io
+import json
+import os
+import platform
+import sqlite3
+import tempfile
+import time
+from typing import List, Dict, Any, Callable, Tuple
+
+from bs4 import BeautifulSoup as bs
+
+from Benchmark.server import StandInServer, FIXTURES
+from Utils import scrap_in_json, scrap_multy, scrap_draft
+from Utils.extract import extract_classified
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+PROPERTY_TYPES = {
+    "House": ["Villa", "Town-house", "Bungalow", "Mansion"],
+    "Apartment": ["Duplex", "Penthouse", "Studio"],
+}
+
+
+def fixture_pages(fixtures: str) -> List[Tuple[bytes, str]]:
+    """
+    Load the fixture detail pages with their type of sale.
+
+    Args:
+        fixtures (str): Directory of the fixture pages.
+
+    Returns:
+        List[Tuple[bytes, str]]: Raw HTML and "sale" or "rent" of every page.
+    """
+    pages = []
+    for path in sorted(glob.glob(os.path.join(fixtures, "classified", "*.html"))):
+        with open(path, "rb") as file:
+            content = file.read()
+        transaction = extract_classified(content)["transaction"]["type"]
+        pages.append((content, "rent" if transaction == "FOR_RENT" else "sale"))
+    return pages
+
+
+def parse_time(parse: Callable[[bytes, str], Any], pages: List[Tuple[bytes, str]], repeat: int) -> float:
+    """
+    Time the parsing of the fixture pages, without any network.
+
+    Args:
+        parse (Callable[[bytes, str], Any]): Parsing of one page and its type of sale.
+        pages (List[Tuple[bytes, str]]): Fixture pages.
+        repeat (int): Number of passes over the pages.
+
+    Returns:
+        float: Mean time per page in milliseconds.
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for content, type_of_sale in pages:
+            parse(content, type_of_sale)
+    return (time.perf_counter() - start) * 1000 / (repeat * len(pages))
+
+
+def count_csv_rows(path: str) -> int:
+    if not os.path.isfile(path):
+        return 0
+    with open(path) as file:
+        return max(sum(1 for _ in file) - 1, 0)
+
+
+def count_sqlite_rows(path: str) -> int:
+    if not os.path.isfile(path):
+        return 0
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute("SELECT COUNT(*) FROM rows").fetchone()[0]
+    finally:
+        connection.close()
+
+
+def crawl_in_json(server: StandInServer, workdir: str, engine: str) -> int:
+    output_file = os.path.join(workdir, f"in_json_{engine}.csv")
+    for transaction, type_of_sale in (("for-sale", "sale"), ("for-rent", "rent")):
+        scraper = scrap_in_json.ImmowebScraper(server.search_url(transaction), HEADERS, output_file, type_of_sale)
+        scraper.run_scraper(engine=engine)
+    return count_csv_rows(output_file)
+
+
+def crawl_multy(server: StandInServer, workdir: str) -> int:
+    output_file = os.path.join(workdir, "multy.xlsx")
+    pages = len(glob.glob(os.path.join(server.fixtures, "search", "for-sale_*.html")))
+    scraper = scrap_multy.ImmowebScraper(server.search_url("for-sale"), HEADERS, output_file, PROPERTY_TYPES)
+    scraper.run_scraper(total_pages=pages + 1, pages_per_batch=pages + 1)
+    return count_sqlite_rows(scrap_multy.ImmowebScraper.store_file(output_file))
+
+
+def crawl_draft(server: StandInServer, workdir: str) -> int:
+    # scrap_draft.scrap writes all.xlsx in the working directory.
+    links = []
+    page = 1
+    while True:
+        content = scrap_draft.requests.get(f"{server.search_url('for-sale')}&page={page}", headers=HEADERS).content
+        found = [a['href'] for a in bs(content, 'html.parser').find_all('a', class_="card__title-link")]
+        if not found:
+            break
+        links.extend(found)
+        page += 1
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        for link in links:
+            scrap_draft.scrap([], 0, link)
+        return len(scrap_draft.pd.read_excel("all.xlsx"))
+    finally:
+        os.chdir(cwd)
+
+
+def measure(server: StandInServer, crawl: Callable[[], int]) -> Dict[str, float]:
+    """
+    Run a crawl against the stand-in server and measure its throughput.
+
+    Args:
+        server (StandInServer): Running stand-in server.
+        crawl (Callable[[], int]): Crawl returning the number of rows it wrote.
+
+    Returns:
+        Dict[str, float]: Requests, rows, seconds, pages/sec and rows/sec.
+    """
+    requests_before = server.requests
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        rows = crawl()
+    seconds = time.perf_counter() - start
+    requests = server.requests - requests_before
+    return {
+        "requests": requests,
+        "rows": rows,
+        "seconds": round(seconds, 4),
+        "pages_per_sec": round(requests / seconds, 2),
+        "rows_per_sec": round(rows / seconds, 2),
+    }
+
+
+def run(fixtures: str, latency: float, repeat: int) -> Dict[str, Any]:
+    """
+    Benchmark every scraper variant against the stand-in server.
+
+    Args:
+        fixtures (str): Directory of the fixture pages.
+        latency (float): Latency of the stand-in server in seconds.
+        repeat (int): Number of passes over the pages when timing the parsing.
+
+    Returns:
+        Dict[str, Any]: Machine-readable results.
+    """
+    pages = fixture_pages(fixtures)
+    in_json = {
+        "sale": scrap_in_json.ImmowebScraper("", HEADERS, os.devnull, "sale"),
+        "rent": scrap_in_json.ImmowebScraper("", HEADERS, os.devnull, "rent"),
+    }
+    multy = scrap_multy.ImmowebScraper("", HEADERS, os.devnull, PROPERTY_TYPES)
+
+    def parse_in_json(content: bytes, type_of_sale: str) -> Any:
+        return in_json[type_of_sale].build_property_info(scrap_in_json.ImmowebScraper.parse_json_data(content))
+
+    def parse_multy(content: bytes, type_of_sale: str) -> Any:
+        return multy.get_other_info(content), multy.get_type_and_subtype_of_property(bs(content, 'html.parser'))
+
+    def parse_draft(content: bytes, type_of_sale: str) -> Any:
+        return scrap_draft.get_other_info(content)
+
+    variants = {}
+    with StandInServer(fixtures, latency) as server, tempfile.TemporaryDirectory() as workdir:
+        variants["scrap_in_json.thread"] = measure(server, lambda: crawl_in_json(server, workdir, "thread"))
+        variants["scrap_in_json.async"] = measure(server, lambda: crawl_in_json(server, workdir, "async"))
+        variants["scrap_multy"] = measure(server, lambda: crawl_multy(server, workdir))
+        variants["scrap_draft"] = measure(server, lambda: crawl_draft(server, workdir))
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        variants["scrap_in_json.thread"]["parse_ms_per_page"] = round(parse_time(parse_in_json, pages, repeat), 4)
+        variants["scrap_in_json.async"]["parse_ms_per_page"] = variants["scrap_in_json.thread"]["parse_ms_per_page"]
+        variants["scrap_multy"]["parse_ms_per_page"] = round(parse_time(parse_multy, pages, repeat), 4)
+        variants["scrap_draft"]["parse_ms_per_page"] = round(parse_time(parse_draft, pages, repeat), 4)
+    # scrap.py cannot be pointed at the stand-in server: importing it requests a hard-coded immoweb.be search
+    # page and creates data_set.csv, and its scrap() fetches the live site too.
+    variants["scrap"] = {
+        "skipped": "Utils/scrap.py requests immoweb.be and writes data_set.csv as soon as it is imported"
+    }
+
+    return {
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "latency": latency,
+        "detail_pages": len(pages),
+        "variants": variants,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the scraper variants offline on synthetic Immoweb-like pages.")
+    parser.add_argument("--fixtures", default=FIXTURES, help="Directory of the fixture pages.")
+    parser.add_argument("--latency", type=float, default=0.05, help="Latency of the stand-in server in seconds.")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of passes over the pages when timing the parsing.")
+    parser.add_argument("--output", help="Write the JSON results to this file instead of stdout.")
+    args = parser.parse_args()
+
+    results = run(args.fixtures, args.latency, args.repeat)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
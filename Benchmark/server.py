@@ -0,0 +1,134 @@
+import argparse
+import hashlib
+import os
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+class BacklogHTTPServer(ThreadingHTTPServer):
+    # The default backlog of 5 drops connections when hundreds of requests start at once.
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+class StandInServer:
+    """
+    Local stand-in for Immoweb serving the synthetic pages of Benchmark/make_fixtures.py with a configurable latency.
+
+    Search pages are served from fixtures/search/<transaction>_<page>.html,
+    e.g. /en/search/house/for-sale?page=2 from for-sale_2.html. Pages past
+    the generated ones get empty.html. Detail pages are served from
+    fixtures/classified/<classified id>.html. The __BASE__ placeholder in the
+    fixture links is replaced with the address of the server. Responses
+    carry an ETag and answer If-None-Match with a 304.
+    """
+    def __init__(self, fixtures: str = FIXTURES, latency: float = 0.0, host: str = "127.0.0.1", port: int = 0) -> None:
+        """
+        Args:
+            fixtures (str): Directory of the fixture pages.
+            latency (float): Seconds slept before answering each request.
+            host (str): Interface to listen on.
+            port (int): Port to listen on, 0 for any free port.
+        """
+        self.fixtures = fixtures
+        self.latency = latency
+        self.requests = 0
+        self.bytes_sent = 0
+        self.lock = threading.Lock()
+        self.httpd = BacklogHTTPServer((host, port), self._handler())
+        self.base = f"http://{host}:{self.httpd.server_address[1]}"
+        self.thread = None
+
+    def _page(self, path: str, query: str) -> str:
+        name = path.rstrip("/").rsplit("/", 1)[-1]
+        if "/search/" in path:
+            page = parse_qs(query).get("page", ["1"])[0]
+            file = os.path.join(self.fixtures, "search", f"{name}_{page}.html")
+            return file if os.path.isfile(file) else os.path.join(self.fixtures, "search", "empty.html")
+        return os.path.join(self.fixtures, "classified", f"{name}.html")
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args) -> None:
+                pass
+
+            def do_GET(self) -> None:
+                time.sleep(server.latency)
+                parts = urlsplit(self.path)
+                file = server._page(parts.path, parts.query)
+                if not os.path.isfile(file):
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                with open(file, "rb") as page:
+                    body = page.read().replace(b"__BASE__", server.base.encode())
+                etag = f'"{hashlib.md5(body).hexdigest()}"'
+                with server.lock:
+                    server.requests += 1
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                with server.lock:
+                    server.bytes_sent += len(body)
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+    def search_url(self, transaction: str = "for-sale") -> str:
+        """
+        Get the base search URL to give to a scraper.
+
+        Args:
+            transaction (str): "for-sale" or "for-rent".
+
+        Returns:
+            str: Search URL on the stand-in server.
+        """
+        return f"{self.base}/en/search/house/{transaction}?countries=BE"
+
+    def start(self) -> "StandInServer":
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> "StandInServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve the synthetic Immoweb-like pages locally.")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds slept before answering each request.")
+    parser.add_argument("--fixtures", default=FIXTURES)
+    args = parser.parse_args()
+    server = StandInServer(args.fixtures, args.latency, port=args.port)
+    print(f"Serving {args.fixtures} on {server.search_url()}")
+    server.httpd.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Dict, Any, Optional, Sequence, Tuple
+
+from Utils.crawl_state import classified_id
+from Utils.metrics import Metrics
+from Utils.parse_pool import ParsePool
+from Utils.schema import CompiledSchema, listing_fields
+from Utils.writer import BatchWriter, make_sink
+
+SEGMENT_SIZE = 256 << 20
+
+
+def read_record(directory: str, segment: str, offset: int, length: int) -> Tuple[Dict[str, Any], bytes]:
+    """
+    Read one page of an archive segment.
+
+    Args:
+        directory (str): Directory of the archive.
+        segment (str): Name of the segment file.
+        offset (int): Position of the gzip member of the page in the segment.
+        length (int): Size of the gzip member.
+
+    Returns:
+        Tuple[Dict[str, Any], bytes]: Header of the page and its raw HTML.
+    """
+    with open(os.path.join(directory, segment), "rb") as file:
+        file.seek(offset)
+        data = gzip.decompress(file.read(length))
+    header, _, content = data.partition(b"\n")
+    return json.loads(header), content
+
+
+class PageArchive:
+    """
+    Append-only archive of the raw detail pages, WARC-like in spirit.
+
+    Every page is a gzip member of its own, appended to the current segment
+    file after a JSON header line with its URL, classified ID, type of sale,
+    fetch time and digest, so segments can be read without the index and a
+    torn write only loses the last page. A new segment starts once the
+    current one would exceed segment_size bytes. An SQLite index maps every
+    fetch of a classified ID to the segment, offset and length of its page.
+    A body already archived is indexed again without being stored twice.
+
+    A single process writes to an archive directory at a time; scrapers in
+    that process share one instance.
+    """
+    def __init__(self, directory: str, segment_size: int = SEGMENT_SIZE) -> None:
+        """
+        Args:
+            directory (str): Directory holding the segments and the index.
+            segment_size (int): Size in bytes after which a new segment is started (default is 256 MiB).
+        """
+        self.directory = directory
+        self.segment_size = segment_size
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(os.path.join(directory, "index.sqlite"), check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "classified_id TEXT, url TEXT NOT NULL, type_of_sale TEXT, fetched_at REAL NOT NULL, "
+            "digest TEXT NOT NULL, segment TEXT NOT NULL, offset INTEGER NOT NULL, length INTEGER NOT NULL)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS pages_classified ON pages (classified_id, fetched_at)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS pages_digest ON pages (digest)")
+        self.connection.commit()
+        segments = self.segments()
+        self.segment = segments[-1] if segments else self._segment_name(0)
+        self.file = None
+
+    @staticmethod
+    def _segment_name(number: int) -> str:
+        return f"segment-{number:05d}.gz"
+
+    def segments(self) -> List[str]:
+        """
+        Get the segment files of the archive.
+
+        Returns:
+            List[str]: Names of the segments, oldest first.
+        """
+        return sorted(name for name in os.listdir(self.directory) if name.startswith("segment-") and name.endswith(".gz"))
+
+    def add(self, url: str, content: bytes, type_of_sale: Optional[str] = None, fetched_at: Optional[float] = None) -> None:
+        """
+        Archive a detail page.
+
+        Args:
+            url (str): URL of the property detail page.
+            content (bytes): Raw HTML of the page.
+            type_of_sale (Optional[str]): Type of sale ("sale" or "rent") of the search that found the page.
+            fetched_at (Optional[float]): Unix time of the fetch (default is now).
+        """
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        cid = classified_id(url)
+        digest = hashlib.sha256(content).hexdigest()
+        with self.lock:
+            location = self.connection.execute(
+                "SELECT segment, offset, length FROM pages WHERE digest = ? LIMIT 1", (digest,)
+            ).fetchone()
+        member = None
+        if location is None:
+            header = {"url": url, "classified_id": cid, "type_of_sale": type_of_sale, "fetched_at": fetched_at, "digest": digest}
+            member = gzip.compress(json.dumps(header).encode() + b"\n" + content, compresslevel=6)
+        with self.lock:
+            if member is not None:
+                location = self._append(member)
+            with self.connection:
+                self.connection.execute(
+                    "INSERT INTO pages VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (cid, url, type_of_sale, fetched_at, digest) + tuple(location)
+                )
+
+    def _append(self, member: bytes) -> Tuple[str, int, int]:
+        if self.file is None:
+            self.file = open(os.path.join(self.directory, self.segment), "ab")
+        if self.file.tell() > 0 and self.file.tell() + len(member) > self.segment_size:
+            self.file.close()
+            self.segment = self._segment_name(int(self.segment[len("segment-"):-len(".gz")]) + 1)
+            self.file = open(os.path.join(self.directory, self.segment), "ab")
+        offset = self.file.tell()
+        self.file.write(member)
+        self.file.flush()
+        return self.segment, offset, len(member)
+
+    def read(self, cid: str, before: Optional[float] = None) -> Optional[bytes]:
+        """
+        Read the latest archived page of a listing.
+
+        Args:
+            cid (str): Classified ID.
+            before (Optional[float]): Only consider the pages fetched before this Unix time (default is all).
+
+        Returns:
+            Optional[bytes]: Raw HTML of the page, or None if the listing is not archived.
+        """
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT segment, offset, length FROM pages WHERE classified_id = ? AND fetched_at < ? "
+                "ORDER BY fetched_at DESC LIMIT 1",
+                (cid, before if before is not None else float("inf"))
+            ).fetchone()
+        if row is None:
+            return None
+        return read_record(self.directory, *row)[1]
+
+    def entries(self) -> List[Dict[str, Any]]:
+        """
+        Get the location of the latest page of every listing, by classified ID or by URL when it has none.
+
+        Returns:
+            List[Dict[str, Any]]: URL, type of sale, fetch time, segment, offset and length of every page.
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT classified_id, url, type_of_sale, fetched_at, segment, offset, length FROM pages ORDER BY fetched_at"
+            ).fetchall()
+        latest = {}
+        for cid, url, type_of_sale, fetched_at, segment, offset, length in rows:
+            latest[cid or url] = {
+                "url": url, "type_of_sale": type_of_sale, "fetched_at": fetched_at,
+                "segment": segment, "offset": offset, "length": length,
+            }
+        return list(latest.values())
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get the size of the archive.
+
+        Returns:
+            Dict[str, int]: Archived fetches, distinct listings, segments and bytes on disk.
+        """
+        with self.lock:
+            fetches, listings = self.connection.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT COALESCE(classified_id, url)) FROM pages"
+            ).fetchone()
+        segments = self.segments()
+        size = sum(os.path.getsize(os.path.join(self.directory, name)) for name in segments)
+        return {"fetches": fetches, "listings": listings, "segments": len(segments), "bytes": size}
+
+    def close(self) -> None:
+        """
+        Close the current segment and the index.
+        """
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+            self.connection.close()
+
+
+def parse_archived(directory: str, segment: str, offset: int, length: int, url: str, type_of_sale: str) -> Tuple[Optional[str], Tuple]:
+    """
+    Read an archived page and parse it with parse_listing, in a process of the parse pool.
+
+    Args:
+        directory (str): Directory of the archive.
+        segment (str): Name of the segment file.
+        offset (int): Position of the page in the segment.
+        length (int): Size of the page in the segment.
+        url (str): URL of the property detail page.
+        type_of_sale (str): Type of sale ("sale" or "rent").
+
+    Returns:
+        Tuple[Optional[str], Tuple]: Classified ID and values of the columns, in the order of listing_fields.
+    """
+    from Utils.scrap_in_json import parse_listing
+    _, content = read_record(directory, segment, offset, length)
+    return parse_listing(content, url, type_of_sale)
+
+
+def reextract(
+        directory: str,
+        output_file: str,
+        cores: Optional[int] = None,
+        chunk_size: int = 32,
+        metrics: Optional[Metrics] = None
+) -> Dict[str, int]:
+    """
+    Run the current extraction over the latest archived page of every listing, without any request.
+
+    The parser processes read the pages from the segments themselves, so
+    only the rows travel between processes. The output is written next to
+    output_file and replaces it once complete.
+
+    Only listings whose detail page was fetched are archived. Rows a lite
+    crawl built from search summaries alone have no page, so they are not in
+    the rebuilt output.
+
+    Args:
+        directory (str): Directory of the archive.
+        output_file (str): Path to the CSV file, or to a partitioned Parquet dataset if it ends in .parquet.
+        cores (Optional[int]): Number of parser processes (default is the number of CPUs).
+        chunk_size (int): Number of pages sent to a process at once.
+        metrics (Optional[Metrics]): Records the parse time of every page under the "reextract" stage.
+
+    Returns:
+        Dict[str, int]: Number of archived listings, rows written and pages that failed to parse.
+
+    Raises:
+        FileNotFoundError: The archive does not exist.
+    """
+    if not os.path.isfile(os.path.join(directory, "index.sqlite")):
+        raise FileNotFoundError(f"No page archive in {directory}")
+    archive = PageArchive(directory)
+    try:
+        entries = archive.entries()
+    finally:
+        archive.close()
+
+    root, extension = os.path.splitext(output_file)
+    partial = f"{root}.reextract{extension}"
+    if os.path.isdir(partial):
+        shutil.rmtree(partial)
+    elif os.path.isfile(partial):
+        os.remove(partial)
+    schemas = {type_of_sale: CompiledSchema(listing_fields(type_of_sale)) for type_of_sale in ("sale", "rent")}
+    counts = {"listings": len(entries), "rows": 0, "errors": 0}
+    lock = threading.Lock()
+    writer = BatchWriter(make_sink(partial), metrics=metrics, name=f"writer:{partial}").start()
+
+    def save(parsed: Future, type_of_sale: str) -> None:
+        try:
+            cid, values = parsed.result()
+        except Exception:
+            with lock:
+                counts["errors"] += 1
+            return
+        property_info = schemas[type_of_sale].record_type(values)
+        writer.put(dict(property_info.items(), classified_id=cid) if partial.endswith(".db") else property_info)
+        with lock:
+            counts["rows"] += 1
+
+    pool = ParsePool(parse_archived, cores, chunk_size=chunk_size, metrics=metrics, stage="reextract").start()
+    try:
+        for entry in entries:
+            # Pages archived without their search fall back to the transaction in the URL.
+            type_of_sale = entry["type_of_sale"] or ("rent" if "/for-rent/" in entry["url"] else "sale")
+            pool.submit(
+                directory, entry["segment"], entry["offset"], entry["length"], entry["url"], type_of_sale,
+                callback=lambda parsed, type_of_sale=type_of_sale: save(parsed, type_of_sale)
+            )
+    finally:
+        pool.close()
+        writer.close()
+
+    if os.path.exists(partial):
+        if os.path.isdir(output_file):
+            shutil.rmtree(output_file)
+        os.replace(partial, output_file)
+    return counts
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Inspect the raw-page archive and extract the listings again offline.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    reextract_parser = commands.add_parser("reextract", help="Rebuild the output from the archived pages.")
+    stats_parser = commands.add_parser("stats", help="Print the size of the archive.")
+    for command in (reextract_parser, stats_parser):
+        command.add_argument("archive", help="Directory of the archive.")
+    reextract_parser.add_argument("output", help="CSV file, or Parquet dataset ending in .parquet.")
+    reextract_parser.add_argument("--cores", type=int, help="Number of parser processes (default is every CPU).")
+    args = parser.parse_args(argv)
+
+    if args.command == "reextract":
+        start = time.perf_counter()
+        counts = reextract(args.archive, args.output, args.cores)
+        print(f"{counts['rows']} rows from {counts['listings']} listings in {time.perf_counter() - start:.1f}s, "
+              f"{counts['errors']} errors")
+    else:
+        archive = PageArchive(args.archive)
+        try:
+            print(archive.stats())
+        finally:
+            archive.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+import json
+import os
+import threading
+import time
+from typing import List, Dict, Set, Optional, Callable, Tuple
+
+
+class Checkpoint:
+    """
+    Checkpoint of a crawl, a JSON snapshot followed by an append-only log of the progress made since.
+
+    It records which search pages were fully discovered, which detail URLs
+    were scraped, which ones are still pending and why the failed ones
+    failed. With a planned search, the pages are numbered in the order of
+    the plan, which is saved too so a resumed run numbers them the same way.
+
+    Progress is appended to the log (filename + ".log") as JSON lines, so a
+    save only writes the events since the previous one. Saves run on a
+    background thread, so the worker recording progress never waits for
+    before_save or the disk. The snapshot is replaced atomically, and the
+    log emptied, only once the log holds more events than the snapshot has
+    entries, so rewriting it stays linear over the whole crawl. A torn last
+    line of the log is ignored on load.
+    """
+    def __init__(
+            self,
+            filename: str,
+            interval: float = 30.0,
+            every: int = 100,
+            before_save: Optional[Callable[[], None]] = None,
+            compact_after: int = 10000
+    ) -> None:
+        """
+        Args:
+            filename (str): Path to the JSON snapshot.
+            interval (float): Seconds between two saves.
+            every (int): Number of completed URLs that triggers a save.
+            before_save (Optional[Callable[[], None]]): Called before writing, e.g. to flush the rows of the
+                completed URLs to disk.
+            compact_after (int): Minimum number of events in the log before the snapshot is rewritten.
+        """
+        self.filename = filename
+        self.log_filename = filename + ".log"
+        self.interval = interval
+        self.every = every
+        self.before_save = before_save
+        self.compact_after = compact_after
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()
+        self.pages_done: Set[int] = set()
+        self.last_page_found = False
+        self.completed: Set[str] = set()
+        self.pending: Dict[str, None] = {}
+        self.failed: Dict[str, str] = {}
+        self.plan: Optional[List[Tuple[str, int]]] = None
+        self.events: List[list] = []
+        # Events in the log file, None until the files on disk belong to this crawl.
+        self.logged: Optional[int] = None
+        self.changes = 0
+        self.saved_at = time.monotonic()
+        self.wake = threading.Event()
+        self.stopped = False
+        self.saver: Optional[threading.Thread] = None
+
+    def load(self) -> bool:
+        """
+        Load the snapshot and replay the log, if they exist.
+
+        Returns:
+            bool: True if a checkpoint was loaded.
+        """
+        found = False
+        with self.lock:
+            if os.path.isfile(self.filename):
+                with open(self.filename) as file:
+                    data = json.load(file)
+                self.pages_done = set(data["pages_done"])
+                self.last_page_found = data["last_page_found"]
+                self.completed = set(data["completed"])
+                self.pending = dict.fromkeys(data["pending"])
+                self.failed = data["failed"]
+                self.plan = [tuple(partition) for partition in data["plan"]] if data.get("plan") is not None else None
+                found = True
+            self.logged = 0
+            if os.path.isfile(self.log_filename):
+                with open(self.log_filename) as file:
+                    for line in file:
+                        try:
+                            event = json.loads(line)
+                        except ValueError:
+                            break
+                        self._apply(event)
+                        self.logged += 1
+                found = True
+        return found
+
+    def _apply(self, event: list) -> None:
+        kind = event[0]
+        if kind == "pending":
+            if event[1] not in self.completed:
+                self.pending[event[1]] = None
+        elif kind == "done":
+            self.pending.pop(event[1], None)
+            self.failed.pop(event[1], None)
+            self.completed.add(event[1])
+        elif kind == "fail":
+            self.failed[event[1]] = event[2]
+        elif kind == "page":
+            self.pages_done.add(event[1])
+            self.last_page_found = self.last_page_found or event[2]
+        elif kind == "plan":
+            self.plan = [tuple(partition) for partition in event[1]] if event[1] is not None else None
+
+    def _record(self, event: list) -> None:
+        # Called with the lock held.
+        self._apply(event)
+        self.events.append(event)
+
+    def set_plan(self, plan: Optional[List[Tuple[str, int]]]) -> None:
+        """
+        Record the plan of the search.
+
+        Args:
+            plan (Optional[List[Tuple[str, int]]]): Search URL and number of pages of every partition, or None.
+        """
+        with self.lock:
+            self._record(["plan", plan])
+
+    def next_page(self) -> int:
+        """
+        Get the first search page that was not fully discovered.
+
+        Returns:
+            int: Page number.
+        """
+        with self.lock:
+            page = 1
+            while page in self.pages_done:
+                page += 1
+            return page
+
+    def is_page_done(self, page: int) -> bool:
+        """
+        Tell whether every link of a search page is already pending or scraped.
+
+        Args:
+            page (int): Page number.
+
+        Returns:
+            bool: True if the page can be skipped.
+        """
+        with self.lock:
+            return page in self.pages_done
+
+    def pending_urls(self) -> List[str]:
+        """
+        Get the URLs that were discovered but not scraped, failed ones included.
+
+        Returns:
+            List[str]: URLs in discovery order.
+        """
+        with self.lock:
+            return list(self.pending)
+
+    def add_pending(self, url: str) -> bool:
+        """
+        Record a discovered URL.
+
+        Args:
+            url (str): URL of the property detail page.
+
+        Returns:
+            bool: False if the URL was already scraped or is already pending.
+        """
+        with self.lock:
+            if url in self.completed or url in self.pending:
+                return False
+            self._record(["pending", url])
+            return True
+
+    def page_done(self, page: int, last: bool = False) -> None:
+        """
+        Record that every link of a search page is pending.
+
+        Args:
+            page (int): Page number.
+            last (bool): Whether the page was empty, i.e. past the last page.
+        """
+        with self.lock:
+            self._record(["page", page, last])
+        self.maybe_save()
+
+    def complete(self, url: str) -> None:
+        """
+        Record that a URL was scraped.
+
+        Args:
+            url (str): URL of the property detail page.
+        """
+        with self.lock:
+            self._record(["done", url])
+            self.changes += 1
+        self.maybe_save()
+
+    def fail(self, url: str, error: BaseException) -> None:
+        """
+        Record why a URL failed. It stays pending, so a resumed run tries it again.
+
+        Args:
+            url (str): URL of the property detail page.
+            error (BaseException): Exception raised while scraping it.
+        """
+        with self.lock:
+            self._record(["fail", url, f"{type(error).__name__}: {error}"])
+            self.changes += 1
+        self.maybe_save()
+
+    def maybe_save(self) -> None:
+        """
+        Wake the saving thread if enough URLs completed or enough time passed since the last save.
+        """
+        if self.changes >= self.every or time.monotonic() - self.saved_at >= self.interval:
+            with self.lock:
+                if self.saver is None and not self.stopped:
+                    self.saver = threading.Thread(target=self._run, daemon=True)
+                    self.saver.start()
+            self.wake.set()
+
+    def save(self) -> None:
+        """
+        Append the progress recorded since the last save to the log, or compact it into the snapshot.
+
+        The events are taken first and before_save runs afterwards, so every
+        URL recorded as completed has its row on disk when its event is.
+        """
+        with self.save_lock:
+            with self.lock:
+                events, self.events = self.events, []
+                self.changes = 0
+                self.saved_at = time.monotonic()
+                entries = len(self.completed) + len(self.pending) + len(self.pages_done)
+                compact = self.logged is None or self.logged + len(events) > max(self.compact_after, entries)
+                data = None
+                if compact:
+                    data = {
+                        "pages_done": sorted(self.pages_done),
+                        "last_page_found": self.last_page_found,
+                        "completed": sorted(self.completed),
+                        "pending": list(self.pending),
+                        "failed": dict(self.failed),
+                        "plan": self.plan,
+                    }
+            if self.before_save is not None:
+                self.before_save()
+            if data is not None:
+                with open(self.filename + ".tmp", "w") as file:
+                    json.dump(data, file)
+                os.replace(self.filename + ".tmp", self.filename)
+                # Events replayed over a newer snapshot change nothing, so a crash here is harmless.
+                open(self.log_filename, "w").close()
+                self.logged = 0
+            elif events:
+                with open(self.log_filename, "a") as file:
+                    file.writelines(json.dumps(event) + "\n" for event in events)
+                self.logged += len(events)
+
+    def close(self) -> None:
+        """
+        Stop the saving thread and save the remaining progress.
+        """
+        with self.lock:
+            self.stopped = True
+            saver, self.saver = self.saver, None
+        self.wake.set()
+        if saver is not None:
+            saver.join()
+        self.save()
+
+    def _run(self) -> None:
+        while True:
+            self.wake.wait()
+            self.wake.clear()
+            if self.stopped:
+                return
+            self.save()
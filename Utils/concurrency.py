@@ -0,0 +1,249 @@
+import email.utils
+import random
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import BaseAdapter
+
+from Utils.transport import make_transport, mount_transport
+
+THROTTLED_STATUSES = (429, 503)
+
+
+def retry_after(response: requests.Response) -> Optional[float]:
+    """
+    Read the Retry-After header of a response.
+
+    Args:
+        response (requests.Response): Throttled response.
+
+    Returns:
+        Optional[float]: Seconds to wait, or None if the header is missing or invalid.
+    """
+    value = response.headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(email.utils.parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def request_kind(url: str, response: Optional[requests.Response]) -> str:
+    """
+    Get the class of a request whose round trips are compared with each other.
+
+    Search pages, detail pages and revalidated pages answered by a 304 take
+    very different times, so each gets its own latency baseline. The caching
+    adapter answers a 304 with the page from disk as a 200, marked
+    revalidated, so the mark counts as a 304.
+
+    Args:
+        url (str): URL of the request.
+        response (Optional[requests.Response]): Response, or None on a connection error.
+
+    Returns:
+        str: Host and first two path segments, e.g. "www.immoweb.be/en/classified", tagged ":304" for a revalidation.
+    """
+    parts = urlsplit(url)
+    kind = parts.netloc + "/".join(parts.path.split("/")[:3])
+    if response is not None and (response.status_code == 304 or getattr(response, "revalidated", False)):
+        return kind + ":304"
+    return kind
+
+
+class AdaptiveLimiter:
+    """
+    AIMD limit on the number of requests in flight.
+
+    Every healthy response raises the limit by increase / limit, i.e. about
+    one slot per round trip. A 429, a 5xx, a connection error or a smoothed
+    round trip above latency_tolerance times the baseline multiplies it by
+    decrease, at most once per cooldown seconds. Round trips are smoothed
+    and baselined per kind of request, the baseline being the lowest
+    smoothed round trip of the last baseline_window seconds, once
+    warmup responses of that kind came back. A single fast response
+    therefore does not hold the limit down for the rest of the crawl.
+    """
+    def __init__(
+            self,
+            initial: int = 10,
+            minimum: int = 1,
+            maximum: int = 200,
+            increase: float = 1.0,
+            decrease: float = 0.5,
+            latency_tolerance: float = 3.0,
+            cooldown: float = 1.0,
+            baseline_window: float = 10.0,
+            warmup: int = 8
+    ) -> None:
+        """
+        Args:
+            initial (int): Limit before any feedback.
+            minimum (int): Lowest limit.
+            maximum (int): Highest limit.
+            increase (float): Slots added per round trip while healthy.
+            decrease (float): Factor applied to the limit on congestion.
+            latency_tolerance (float): Ratio of the baseline above which the smoothed round trip counts as a latency
+                spike.
+            cooldown (float): Minimum number of seconds between two decreases.
+            baseline_window (float): Number of seconds over which the lowest smoothed round trip is the baseline.
+            warmup (int): Number of responses of a kind smoothed before its round trips count towards the baseline.
+        """
+        self.minimum = minimum
+        self.maximum = maximum
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.cooldown = cooldown
+        self.baseline_window = baseline_window
+        self.warmup = warmup
+        self.condition = threading.Condition()
+        self._limit = float(min(max(initial, minimum), maximum))
+        self.in_flight = 0
+        self.rtt: Dict[str, float] = {}
+        self.samples: Dict[str, int] = {}
+        # Increasing (time, smoothed round trip) pairs of every kind, the first being the baseline.
+        self.windows: Dict[str, Deque[Tuple[float, float]]] = {}
+        self.paused_until = 0.0
+        self.decreased_at = 0.0
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def acquire(self) -> None:
+        """
+        Wait for a free slot and for the end of any Retry-After pause.
+        """
+        with self.condition:
+            while True:
+                wait = self.paused_until - time.monotonic()
+                if wait <= 0 and self.in_flight < self.limit:
+                    self.in_flight += 1
+                    return
+                self.condition.wait(wait if wait > 0 else None)
+
+    def release(self, rtt: float, status: Optional[int], kind: str = "") -> None:
+        """
+        Free a slot and adjust the limit from the outcome of the request.
+
+        Args:
+            rtt (float): Round trip time of the request in seconds.
+            status (Optional[int]): HTTP status, or None on a connection error.
+            kind (str): Kind of request, see request_kind.
+        """
+        with self.condition:
+            self.in_flight -= 1
+            now = time.monotonic()
+            spike = False
+            if status is not None:
+                smoothed = self.rtt[kind] = rtt if kind not in self.rtt else 0.8 * self.rtt[kind] + 0.2 * rtt
+                self.samples[kind] = self.samples.get(kind, 0) + 1
+                if self.samples[kind] > self.warmup:
+                    spike = smoothed > self.latency_tolerance * self._baseline(kind, smoothed, now)
+            if status is None or status in THROTTLED_STATUSES or status >= 500 or spike:
+                if now - self.decreased_at >= self.cooldown:
+                    self._limit = max(self.minimum, self._limit * self.decrease)
+                    self.decreased_at = now
+            else:
+                self._limit = min(self.maximum, self._limit + self.increase / self._limit)
+            self.condition.notify_all()
+
+    def _baseline(self, kind: str, smoothed: float, now: float) -> float:
+        window = self.windows.setdefault(kind, deque())
+        while window and window[-1][1] >= smoothed:
+            window.pop()
+        window.append((now, smoothed))
+        while window[0][0] < now - self.baseline_window:
+            window.popleft()
+        return window[0][1]
+
+    def pause(self, seconds: float) -> None:
+        """
+        Stop handing out slots for a while, e.g. to honor Retry-After.
+
+        Args:
+            seconds (float): Duration of the pause.
+        """
+        with self.condition:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.condition.notify_all()
+
+    def stats(self) -> Dict[str, object]:
+        """
+        Get the current limit and the observed round trip times.
+
+        Returns:
+            Dict[str, object]: Limit, requests in flight, and smoothed and baseline round trip in seconds per kind
+                of request.
+        """
+        with self.condition:
+            return {
+                "limit": self.limit,
+                "in_flight": self.in_flight,
+                "rtt": dict(self.rtt),
+                "baseline_rtt": {kind: window[0][1] for kind, window in self.windows.items() if window},
+            }
+
+
+class ThrottledSession(requests.Session):
+    """
+    Session sending every request through an AdaptiveLimiter.
+
+    Throttled answers (429, 503) and connection errors are retried with
+    exponential backoff, waiting for Retry-After when the server sends it.
+    """
+    def __init__(
+            self,
+            limiter: AdaptiveLimiter,
+            max_retries: int = 3,
+            backoff: float = 1.0,
+            transport: Optional[BaseAdapter] = None
+    ) -> None:
+        """
+        Args:
+            limiter (AdaptiveLimiter): Limit shared by every request of the session.
+            max_retries (int): Number of retries of a throttled or failed request.
+            backoff (float): Base delay in seconds of the exponential backoff.
+            transport (Optional[BaseAdapter]): Adapter sending every request (default is a keep-alive pool sized
+                to the maximum of the limiter).
+        """
+        super().__init__()
+        self.limiter = limiter
+        self.transport = transport if transport is not None else make_transport("http1", limiter.maximum)
+        mount_transport(self, self.transport)
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+    def request(self, method: str, url: str, *args, **kwargs) -> requests.Response:
+        for attempt in range(self.max_retries + 1):
+            delay = self.backoff * 2 ** attempt * random.uniform(0.5, 1.5)
+            self.limiter.acquire()
+            start = time.monotonic()
+            try:
+                response = super().request(method, url, *args, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                self.limiter.release(time.monotonic() - start, None, request_kind(url, None))
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(delay)
+                continue
+            except BaseException:
+                self.limiter.release(time.monotonic() - start, None, request_kind(url, None))
+                raise
+            self.limiter.release(time.monotonic() - start, response.status_code, request_kind(url, response))
+            if response.status_code not in THROTTLED_STATUSES or attempt == self.max_retries:
+                return response
+            wait = retry_after(response)
+            response.close()
+            self.limiter.pause(wait if wait is not None else delay)
+        return response
@@ -0,0 +1,299 @@
+import csv
+import hashlib
+import json
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+from typing import List, Dict, Any, Optional
+
+from Utils.writer import ParquetSink
+
+CLASSIFIED_ID = re.compile(r'/(\d+)/?(?:[?#].*)?$')
+
+
+def classified_id(url: str) -> Optional[str]:
+    """
+    Get the classified ID at the end of a detail URL.
+
+    Args:
+        url (str): URL of the property detail page, e.g. ".../mechelen/2800/11486576".
+
+    Returns:
+        Optional[str]: Classified ID, or None if the URL does not end with one.
+    """
+    match = CLASSIFIED_ID.search(url)
+    return match.group(1) if match else None
+
+
+def record_hash(record: Dict[str, Any]) -> str:
+    """
+    Hash a record independently of the order of its keys.
+
+    Args:
+        record (Dict[str, Any]): Row mapping column names to values.
+
+    Returns:
+        str: SHA-1 hex digest of the record.
+    """
+    return hashlib.sha1(json.dumps(record, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def write_csv(records: List[Dict[str, Any]], filename: str) -> None:
+    """
+    Rewrite a CSV file with records, replacing it once the new file is complete.
+
+    The header holds every column of the records in the order they first
+    appear, and a record without a column leaves its cell empty.
+
+    Args:
+        records (List[Dict[str, Any]]): Rows mapping column names to values.
+        filename (str): Path to the CSV file.
+    """
+    columns = list(dict.fromkeys(column for record in records for column in record))
+    with open(filename + ".tmp", 'w', newline='') as file:
+        writer = csv.DictWriter(file, columns, restval="")
+        writer.writeheader()
+        writer.writerows(records)
+    os.replace(filename + ".tmp", filename)
+
+
+def write_parquet(records: List[Dict[str, Any]], directory: str) -> None:
+    """
+    Rewrite a partitioned Parquet dataset with records, replacing it once the new dataset is complete.
+
+    Args:
+        records (List[Dict[str, Any]]): Rows mapping column names to values.
+        directory (str): Root directory of the dataset.
+    """
+    shutil.rmtree(directory + ".tmp", ignore_errors=True)
+    sink = ParquetSink(directory + ".tmp")
+    sink.open()
+    try:
+        sink.write_rows(records)
+    finally:
+        sink.close()
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(directory + ".tmp", directory)
+
+
+def export_records(records: List[Dict[str, Any]], filename: str) -> None:
+    """
+    Rewrite the output of a crawl, a Parquet dataset if the path ends in .parquet, a CSV file otherwise.
+
+    Nothing is written without records.
+
+    Args:
+        records (List[Dict[str, Any]]): Rows mapping column names to values.
+        filename (str): Path to the output.
+    """
+    if not records:
+        return
+    if filename.endswith(".parquet"):
+        write_parquet(records, filename)
+    else:
+        write_csv(records, filename)
+
+
+class CrawlState:
+    """
+    Persistent index of the listings already scraped, keyed by classified ID.
+
+    Every listing keeps its URL, when it was first and last seen, the hash of
+    its extracted record and the record itself, so the output file can be
+    rebuilt with one row per listing.
+
+    A database created by this instance can be seeded once with the rows of
+    a CSV output written before there was a state, so rebuilding that output
+    keeps them.
+    """
+    def __init__(self, filename: str) -> None:
+        """
+        Args:
+            filename (str): Path to the SQLite database.
+        """
+        self.filename = filename
+        self.created = not os.path.exists(filename)
+        self.lock = threading.Lock()
+        self.counts = {"new": 0, "changed": 0, "unchanged": 0, "skipped": 0}
+        self.connection = sqlite3.connect(filename, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS listings ("
+            "classified_id TEXT PRIMARY KEY, url TEXT, first_seen REAL NOT NULL, last_seen REAL NOT NULL, "
+            "record_hash TEXT NOT NULL, record TEXT NOT NULL)"
+        )
+        self.connection.commit()
+
+    def last_seen(self, cid: str) -> Optional[float]:
+        """
+        Get when a listing was last scraped.
+
+        Args:
+            cid (str): Classified ID.
+
+        Returns:
+            Optional[float]: Unix time of the last scrape, or None if the listing is unknown.
+        """
+        with self.lock:
+            row = self.connection.execute("SELECT last_seen FROM listings WHERE classified_id = ?", (cid,)).fetchone()
+        return row[0] if row else None
+
+    def record(self, cid: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the latest record of a listing.
+
+        Args:
+            cid (str): Classified ID.
+
+        Returns:
+            Optional[Dict[str, Any]]: Row mapping column names to values, or None if the listing is unknown.
+        """
+        with self.lock:
+            row = self.connection.execute("SELECT record FROM listings WHERE classified_id = ?", (cid,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def expire(self, cid: str) -> None:
+        """
+        Mark a listing as due for a scrape, keeping its record until the next upsert.
+
+        Args:
+            cid (str): Classified ID.
+        """
+        with self.lock, self.connection:
+            self.connection.execute("UPDATE listings SET last_seen = 0 WHERE classified_id = ?", (cid,))
+
+    def is_fresh(self, cid: str, max_age: float) -> bool:
+        """
+        Tell whether a listing was scraped less than max_age seconds ago.
+
+        Args:
+            cid (str): Classified ID.
+            max_age (float): Age in seconds after which a listing is scraped again.
+
+        Returns:
+            bool: True if the listing can be skipped.
+        """
+        seen = self.last_seen(cid)
+        return seen is not None and time.time() - seen < max_age
+
+    def skip(self) -> None:
+        """
+        Count a listing skipped because it is fresh.
+        """
+        with self.lock:
+            self.counts["skipped"] += 1
+
+    def upsert(self, cid: str, url: Optional[str], record: Dict[str, Any]) -> str:
+        """
+        Insert or update the record of a listing.
+
+        Args:
+            cid (str): Classified ID.
+            url (Optional[str]): URL of the property detail page.
+            record (Dict[str, Any]): Row mapping column names to values.
+
+        Returns:
+            str: "new", "changed" or "unchanged".
+        """
+        digest = record_hash(record)
+        now = time.time()
+        with self.lock, self.connection:
+            row = self.connection.execute("SELECT record_hash FROM listings WHERE classified_id = ?", (cid,)).fetchone()
+            if row is None:
+                status = "new"
+                self.connection.execute(
+                    "INSERT INTO listings VALUES (?, ?, ?, ?, ?, ?)",
+                    (cid, url, now, now, digest, json.dumps(record))
+                )
+            elif row[0] == digest:
+                status = "unchanged"
+                self.connection.execute("UPDATE listings SET last_seen = ? WHERE classified_id = ?", (now, cid))
+            else:
+                status = "changed"
+                self.connection.execute(
+                    "UPDATE listings SET url = COALESCE(?, url), last_seen = ?, record_hash = ?, record = ? WHERE classified_id = ?",
+                    (url, now, digest, json.dumps(record), cid)
+                )
+            self.counts[status] += 1
+        return status
+
+    def seed(self, filename: str) -> int:
+        """
+        Import the rows of an existing CSV output into a state this instance created, once.
+
+        The rows carry no classified ID, so each one is kept under its
+        position in the file, e.g. "csv:00042", and is not matched with its
+        listing when that is scraped again. They are ordered before the
+        listings scraped since. A Parquet output is not imported.
+
+        Args:
+            filename (str): Path to the CSV output.
+
+        Returns:
+            int: Number of rows imported.
+        """
+        if not self.created or filename.endswith(".parquet") or not os.path.isfile(filename):
+            return 0
+        self.created = False
+        with open(filename, newline='') as file:
+            rows = list(csv.DictReader(file))
+        seen = os.path.getmtime(filename)
+        width = len(str(len(rows)))
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO listings VALUES (?, ?, ?, ?, ?, ?)",
+                ((f"csv:{i:0{width}d}", None, seen, seen, record_hash(row), json.dumps(row)) for i, row in enumerate(rows))
+            )
+        return len(rows)
+
+    def records(self) -> List[Dict[str, Any]]:
+        """
+        Get the latest record of every listing, in the order they were first seen.
+
+        Returns:
+            List[Dict[str, Any]]: Rows mapping column names to values.
+        """
+        with self.lock:
+            rows = self.connection.execute("SELECT record FROM listings ORDER BY first_seen, classified_id").fetchall()
+        return [json.loads(record) for record, in rows]
+
+    def export_csv(self, filename: str) -> None:
+        """
+        Rewrite a CSV file with one row per listing.
+
+        Args:
+            filename (str): Path to the CSV file.
+        """
+        records = self.records()
+        if records:
+            write_csv(records, filename)
+
+    def export_parquet(self, directory: str) -> None:
+        """
+        Rewrite a partitioned Parquet dataset with one row per listing.
+
+        Args:
+            directory (str): Root directory of the dataset.
+        """
+        records = self.records()
+        if records:
+            write_parquet(records, directory)
+
+    def export(self, filename: str) -> None:
+        """
+        Rewrite the output of the crawl, a Parquet dataset if the path ends in .parquet, a CSV file otherwise.
+
+        Args:
+            filename (str): Path to the output.
+        """
+        export_records(self.records(), filename)
+
+    def close(self) -> None:
+        """
+        Close the database.
+        """
+        with self.lock:
+            self.connection.close()
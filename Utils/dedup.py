@@ -0,0 +1,136 @@
+import hashlib
+import math
+import threading
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+from Utils.crawl_state import classified_id
+
+
+def dedup_key(url: str) -> str:
+    """
+    Get the key identifying a listing whatever page or search it was found on.
+
+    Args:
+        url (str): URL of the property detail page.
+
+    Returns:
+        str: Classified ID, or the URL without query, fragment and trailing slash.
+    """
+    cid = classified_id(url)
+    if cid is not None:
+        return cid
+    parts = urlsplit(url)
+    return f"{parts.netloc.lower()}{parts.path.rstrip('/')}"
+
+
+class Deduplicator:
+    """
+    Base class of the URL deduplication stages.
+
+    add returns whether a URL is seen for the first time and counts the duplicates.
+    """
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.seen = 0
+        self.duplicates = 0
+
+    def _add(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def add(self, url: str) -> bool:
+        """
+        Record a URL.
+
+        Args:
+            url (str): URL of the property detail page.
+
+        Returns:
+            bool: True if the listing was not seen before.
+        """
+        key = dedup_key(url)
+        with self.lock:
+            new = self._add(key)
+            if new:
+                self.seen += 1
+            else:
+                self.duplicates += 1
+        return new
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get the number of distinct listings and of duplicates dropped.
+
+        Returns:
+            Dict[str, int]: Seen and duplicate counts.
+        """
+        with self.lock:
+            return {"seen": self.seen, "duplicates": self.duplicates}
+
+
+class ExactDeduplicator(Deduplicator):
+    """
+    Deduplicate with a set of keys, exact but growing with the crawl.
+    """
+    def __init__(self) -> None:
+        super().__init__()
+        self.keys = set()
+
+    def _add(self, key: str) -> bool:
+        if key in self.keys:
+            return False
+        self.keys.add(key)
+        return True
+
+
+class BloomDeduplicator(Deduplicator):
+    """
+    Deduplicate with a Bloom filter of fixed size.
+
+    A new listing is wrongly taken for a duplicate with probability
+    error_rate once capacity keys were added, while a duplicate is never
+    let through.
+    """
+    def __init__(self, capacity: int, error_rate: float = 0.001) -> None:
+        """
+        Args:
+            capacity (int): Number of keys the filter is sized for.
+            error_rate (float): False positive rate at capacity.
+        """
+        super().__init__()
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hash_count):
+            yield (first + i * second) % self.size
+
+    def _add(self, key: str) -> bool:
+        new = False
+        for position in self._positions(key):
+            byte, bit = divmod(position, 8)
+            if not self.bits[byte] & (1 << bit):
+                self.bits[byte] |= 1 << bit
+                new = True
+        return new
+
+
+def make_deduplicator(expected_items: Optional[int] = None, error_rate: float = 0.001, exact_limit: int = 1_000_000) -> Deduplicator:
+    """
+    Choose an exact set for small crawls and a Bloom filter for large or continuous ones.
+
+    Args:
+        expected_items (Optional[int]): Expected number of distinct listings, None if unknown.
+        error_rate (float): False positive rate of the Bloom filter.
+        exact_limit (int): Largest expected number of listings kept in an exact set.
+
+    Returns:
+        Deduplicator: Deduplication stage.
+    """
+    if expected_items is None or expected_items <= exact_limit:
+        return ExactDeduplicator()
+    return BloomDeduplicator(expected_items, error_rate)
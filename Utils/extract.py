@@ -0,0 +1,253 @@
+import re
+import json
+import html
+from typing import List, Dict, Any, Optional, Tuple
+
+CLASSIFIED_START = re.compile(rb'window\.classified\s*=\s*\{')
+# Outside of a string only braces and quotes matter, inside of a string only quotes and backslashes.
+OUTSIDE_STRING = re.compile(rb'[{}"]')
+INSIDE_STRING = re.compile(rb'["\\]')
+# Search pages embed their results as an HTML-escaped JSON attribute of the iw-search element.
+SEARCH_RESULTS = re.compile(rb'<iw-search\b[^>]*?:results="([^"]*)"')
+RESULT_COUNT = re.compile(rb'<iw-search\b[^>]*?:result-count="(\d+)"')
+# A header cell followed by its data cell, with the inner HTML of both. A cell never runs past its closing tag.
+TABLE_ROW = re.compile(
+    rb'<th\b[^>]*?class="[^"]*\bclassified-table__header\b[^"]*"[^>]*>([^<]*(?:<(?!/th>)[^<]*)*)</th>\s*'
+    rb'<td\b[^>]*?class="[^"]*\bclassified-table__data\b[^"]*"[^>]*>([^<]*(?:<(?!/td>)[^<]*)*)</td>'
+)
+TAG = re.compile(rb'<[^<]+?>')
+# Text only read out by screen readers, e.g. the unit after a surface.
+SR_ONLY = re.compile(rb'<span\b[^>]*?class="[^"]*\bsr-only\b[^"]*"[^>]*>[^<]*</span>')
+# Screen reader text of the price heading, which holds the plain amount.
+PRICE = re.compile(rb'class="[^"]*\bclassified__price\b[^"]*"[^>]*>(?:[^<]|<(?!/p>))*?<span class="sr-only">([^<]*)</span>')
+NUMBER = re.compile(r'\d+(?:[,.\s]\d{3})*')
+# /classified/<subtype of property>/<for-sale|for-rent>/<locality>/<postal code>/<classified id>
+CLASSIFIED_URL = re.compile(r'/classified/([^/]+)/(for-sale|for-rent)/[^/]+/(\d+)/(\d+)')
+# Header of a classified-table row, path of its value in the window.classified JSON and kind of value.
+# A None transaction key stands for the one of the type of sale.
+TABLE_FIELDS = {
+    "Bedrooms": (("property", "bedroomCount"), "number"),
+    "Living area": (("property", "netHabitableSurface"), "number"),
+    "Kitchen type": (("property", "kitchen", "type"), "enum"),
+    "Furnished": (("transaction", None, "isFurnished"), "bool"),
+    "How many fireplaces?": (("property", "fireplaceCount"), "number"),
+    "Terrace surface": (("property", "terraceSurface"), "number"),
+    "Garden surface": (("property", "gardenSurface"), "number"),
+    "Number of frontages": (("property", "building", "facadeCount"), "number"),
+    "Swimming pool": (("property", "hasSwimmingPool"), "bool"),
+    "Building condition": (("property", "building", "condition"), "enum"),
+    "Price": (("transaction", "sale", "price"), "number"),
+    "Monthly rental price": (("transaction", "rental", "monthlyRentalPrice"), "number"),
+    "Monthly charges": (("transaction", "rental", "monthlyRentalCosts"), "number"),
+}
+# Type of property of every subtype found in classified URLs, as in window.classified.
+PROPERTY_SUBTYPES = {
+    "HOUSE": (
+        "HOUSE", "VILLA", "TOWN_HOUSE", "BUNGALOW", "MANSION", "CHALET", "COUNTRY_COTTAGE", "FARMHOUSE",
+        "MANOR_HOUSE", "CASTLE", "PAVILION", "EXCEPTIONAL_PROPERTY", "MIXED_USE_BUILDING", "APARTMENT_BLOCK",
+        "OTHER_PROPERTY",
+    ),
+    "APARTMENT": (
+        "APARTMENT", "GROUND_FLOOR", "DUPLEX", "TRIPLEX", "PENTHOUSE", "STUDIO", "FLAT_STUDIO", "LOFT",
+        "SERVICE_FLAT", "KOT",
+    ),
+}
+SUBTYPE_TYPES = {subtype: type_ for type_, subtypes in PROPERTY_SUBTYPES.items() for subtype in subtypes}
+
+
+class ExtractionError(Exception):
+    """
+    Raised when a detail page carries no listing data, neither the window.classified script nor a classified-table.
+    """
+
+
+def find_classified_span(content: bytes) -> Optional[Tuple[int, int]]:
+    """
+    Locate the window.classified object literal in the raw bytes of a detail page.
+
+    The scan jumps from one brace or quote to the next with a compiled regex
+    and keeps the nesting depth, skipping over string literals so braces
+    inside descriptions do not unbalance it.
+
+    Args:
+        content (bytes): Raw HTML of the property detail page.
+
+    Returns:
+        Optional[Tuple[int, int]]: Start and end offsets of the object, or None if not found.
+    """
+    match = CLASSIFIED_START.search(content)
+    if not match:
+        return None
+    start = match.end() - 1
+    depth = 0
+    position = start
+    while True:
+        token = OUTSIDE_STRING.search(content, position)
+        if not token:
+            return None
+        char = token.group()
+        position = token.end()
+        if char == b'{':
+            depth += 1
+        elif char == b'}':
+            depth -= 1
+            if depth == 0:
+                return start, position
+        else:
+            while True:
+                token = INSIDE_STRING.search(content, position)
+                if not token:
+                    return None
+                if token.group() == b'\\':
+                    position = token.end() + 1
+                else:
+                    position = token.end()
+                    break
+
+
+def extract_classified(content: bytes) -> Optional[Dict[str, Any]]:
+    """
+    Extract the window.classified JSON from a detail page without building a DOM.
+
+    Args:
+        content (bytes): Raw HTML of the property detail page.
+
+    Returns:
+        Optional[Dict[str, Any]]: JSON data of the property, or None if the fast path cannot find it.
+    """
+    span = find_classified_span(content)
+    if span is None:
+        return None
+    try:
+        return json.loads(content[span[0]:span[1]])
+    except ValueError:
+        return None
+
+
+def extract_search_results(content: bytes) -> Optional[List[Dict[str, Any]]]:
+    """
+    Extract the listing summaries embedded in a search result page.
+
+    Args:
+        content (bytes): Raw HTML of the search result page.
+
+    Returns:
+        Optional[List[Dict[str, Any]]]: JSON summary of every listing of the page, or None if the page has none.
+    """
+    match = SEARCH_RESULTS.search(content)
+    if not match:
+        return None
+    try:
+        results = json.loads(html.unescape(match.group(1).decode("utf-8")))
+    except ValueError:
+        return None
+    return results if isinstance(results, list) else None
+
+
+def extract_result_count(content: bytes) -> Optional[int]:
+    """
+    Extract the total number of results of a search from one of its pages.
+
+    Args:
+        content (bytes): Raw HTML of the search result page.
+
+    Returns:
+        Optional[int]: Number of listings matching the search, or None if the page does not say.
+    """
+    match = RESULT_COUNT.search(content)
+    return int(match.group(1)) if match else None
+
+
+def extract_table(content: bytes, visible_only: bool = False) -> Dict[str, str]:
+    """
+    Extract the header and data cells of the classified-table rows of a detail page in one pass.
+
+    Each row is matched by a single compiled regex over the raw bytes, and
+    the cells are stripped of their inner tags and whitespace, so the text
+    is the one BeautifulSoup would give without building a DOM.
+
+    Args:
+        content (bytes): Raw HTML of the property detail page.
+        visible_only (bool): Drop the screen reader text of the cells, e.g. "m²" after a surface.
+
+    Returns:
+        Dict[str, str]: Text of the header cell to text of the data cell, the last row winning for a repeated header.
+    """
+    table = {}
+    for header, data in TABLE_ROW.findall(content):
+        if visible_only:
+            header, data = SR_ONLY.sub(b"", header), SR_ONLY.sub(b"", data)
+        key = html.unescape(TAG.sub(b"", header).decode("utf-8", "replace")).strip()
+        if key:
+            table[key] = html.unescape(TAG.sub(b"", data).decode("utf-8", "replace")).strip()
+    return table
+
+
+def table_number(value: str) -> Optional[int]:
+    """
+    Read the first number of a cell, thousands separators included, e.g. 649000 from "€ 649,000".
+    """
+    match = NUMBER.search(value)
+    return int(re.sub(r"\D", "", match.group())) if match else None
+
+
+def classified_from_table(content: bytes, url: Optional[str]) -> Optional[Dict[str, Any]]:
+    """
+    Build window.classified-shaped JSON data from the classified-table rows and the URL of a detail page.
+
+    Used when a page has no window.classified script, so the listing is
+    still saved with the columns the table and the URL carry. The ID,
+    subtype of property, type of sale and postal code come from the URL, the
+    type of property from the subtype when it is a known one, the price
+    from the price heading when the table has no price row, and the other
+    columns from the rows of TABLE_FIELDS.
+
+    Args:
+        content (bytes): Raw HTML of the property detail page.
+        url (Optional[str]): URL of the property detail page.
+
+    Returns:
+        Optional[Dict[str, Any]]: JSON data of the property, or None if the page has no classified-table rows.
+    """
+    table = extract_table(content, visible_only=True)
+    if not table:
+        return None
+    match = CLASSIFIED_URL.search(url or "")
+    subtype = match.group(1).upper().replace("-", "_") if match else None
+    transaction = "rental" if match and match.group(2) == "for-rent" else "sale"
+    data: Dict[str, Any] = {
+        "id": int(match.group(4)) if match else None,
+        "property": {
+            "type": SUBTYPE_TYPES.get(subtype),
+            "subtype": subtype,
+            "location": {"postalCode": match.group(3) if match else None},
+            "kitchen": {},
+            "building": {},
+        },
+        "transaction": {"type": "FOR_RENT" if transaction == "rental" else "FOR_SALE", transaction: {}},
+    }
+    for key, value in table.items():
+        if key not in TABLE_FIELDS:
+            continue
+        path, kind = TABLE_FIELDS[key]
+        if path[0] == "transaction":
+            if path[1] is None:
+                path = ("transaction", transaction, path[2])
+            elif path[1] != transaction:
+                continue
+        if kind == "number":
+            value = table_number(value)
+        elif kind == "bool":
+            value = {"Yes": True, "No": False}.get(value.partition(" ")[0])
+        else:
+            value = value.upper().replace(" ", "_") or None
+        target = data
+        for name in path[:-1]:
+            target = target[name]
+        target[path[-1]] = value
+    price_key = "monthlyRentalPrice" if transaction == "rental" else "price"
+    if data["transaction"][transaction].get(price_key) is None:
+        price = PRICE.search(content)
+        if price:
+            data["transaction"][transaction][price_key] = table_number(price.group(1).decode("utf-8", "replace"))
+    return data
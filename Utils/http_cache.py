@@ -0,0 +1,249 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, Any, Optional, Callable
+
+from requests import Response, PreparedRequest
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+KEPT_HEADERS = ("Content-Type", "ETag", "Last-Modified")
+
+
+class ResponseCache:
+    """
+    On-disk cache of response bodies keyed by URL.
+
+    Bodies are compressed with zlib and stored once per SHA-256 digest, so
+    identical pages share a file. An SQLite index maps each URL to its
+    digest and validators. The least recently used entries are evicted
+    when the bodies take more than max_bytes on disk.
+    """
+    def __init__(self, directory: str, max_bytes: int = 1 << 30) -> None:
+        """
+        Args:
+            directory (str): Directory holding the index and the bodies.
+            max_bytes (int): Maximum size of the compressed bodies on disk.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(os.path.join(directory, "index.sqlite"), check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "url TEXT PRIMARY KEY, digest TEXT NOT NULL, size INTEGER NOT NULL, "
+            "etag TEXT, last_modified TEXT, headers TEXT NOT NULL, last_access REAL NOT NULL)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+        self.connection.commit()
+        self.total_bytes = self._stored_bytes()
+        with self.lock:
+            self._evict()
+
+    def _stored_bytes(self) -> int:
+        row = self.connection.execute("SELECT SUM(size) FROM (SELECT DISTINCT digest, size FROM entries)").fetchone()
+        return row[0] or 0
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.directory, digest[:2], digest[2:] + ".z")
+
+    def lookup(self, url: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the cache entry of a URL.
+
+        Args:
+            url (str): URL of the page.
+
+        Returns:
+            Optional[Dict[str, Any]]: Digest, validators and headers of the entry, or None.
+        """
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT digest, etag, last_modified, headers FROM entries WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"digest": row[0], "etag": row[1], "last_modified": row[2], "headers": json.loads(row[3])}
+
+    def read(self, url: str, digest: str) -> Optional[bytes]:
+        """
+        Read the body of a cache entry and mark it as recently used.
+
+        Args:
+            url (str): URL of the page.
+            digest (str): Digest of the body.
+
+        Returns:
+            Optional[bytes]: Body of the page, or None if the file is gone.
+        """
+        try:
+            with open(self._path(digest), "rb") as file:
+                content = zlib.decompress(file.read())
+        except (OSError, zlib.error):
+            return None
+        with self.lock, self.connection:
+            self.connection.execute("UPDATE entries SET last_access = ? WHERE url = ?", (time.time(), url))
+        return content
+
+    def store(self, url: str, content: bytes, headers: Dict[str, str]) -> None:
+        """
+        Store the body and validators of a response.
+
+        Args:
+            url (str): URL of the page.
+            content (bytes): Body of the response.
+            headers (Dict[str, str]): Headers of the response.
+        """
+        digest = hashlib.sha256(content).hexdigest()
+        path = self._path(digest)
+        kept = {name: headers[name] for name in KEPT_HEADERS if name in headers}
+        with self.lock:
+            shared = self.connection.execute("SELECT size FROM entries WHERE digest = ? LIMIT 1", (digest,)).fetchone()
+            if shared is None:
+                compressed = zlib.compress(content)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path + ".tmp", "wb") as file:
+                    file.write(compressed)
+                os.replace(path + ".tmp", path)
+                size = len(compressed)
+                self.total_bytes += size
+            else:
+                size = shared[0]
+            previous = self.connection.execute("SELECT digest FROM entries WHERE url = ?", (url,)).fetchone()
+            with self.connection:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (url, digest, size, kept.get("ETag"), kept.get("Last-Modified"), json.dumps(kept), time.time())
+                )
+            if previous is not None and previous[0] != digest:
+                self._release(previous[0])
+            self._evict()
+
+    def _release(self, digest: str) -> None:
+        # Delete a body once no URL points to it any more.
+        if self.connection.execute("SELECT 1 FROM entries WHERE digest = ? LIMIT 1", (digest,)).fetchone():
+            return
+        path = self._path(digest)
+        try:
+            self.total_bytes -= os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _evict(self) -> None:
+        while self.total_bytes > self.max_bytes:
+            row = self.connection.execute("SELECT url, digest FROM entries ORDER BY last_access LIMIT 1").fetchone()
+            if row is None:
+                break
+            with self.connection:
+                self.connection.execute("DELETE FROM entries WHERE url = ?", (row[0],))
+            self._release(row[1])
+
+    def record(self, hit: bool) -> None:
+        """
+        Count a request answered from the cache or from the network.
+
+        Args:
+            hit (bool): Whether the body was served from disk.
+        """
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get the hit and miss counters and the size of the cache.
+
+        Returns:
+            Dict[str, int]: Hits, misses and stored bytes.
+        """
+        return {"hits": self.hits, "misses": self.misses, "bytes": self.total_bytes}
+
+
+class CachingAdapter(HTTPAdapter):
+    """
+    Transport adapter revalidating cached pages with If-None-Match/If-Modified-Since.
+
+    A 304 answer is turned into a 200 response with the body read from disk,
+    marked by a revalidated attribute set to True.
+    """
+    def __init__(
+            self,
+            cache: ResponseCache,
+            should_cache: Optional[Callable[[str], bool]] = None,
+            transport: Optional[BaseAdapter] = None,
+            **kwargs
+    ) -> None:
+        """
+        Args:
+            cache (ResponseCache): Cache holding the bodies.
+            should_cache (Optional[Callable[[str], bool]]): Predicate choosing which URLs go through the cache.
+            transport (Optional[BaseAdapter]): Adapter sending the requests (default is the pool of this adapter).
+            **kwargs: Arguments of HTTPAdapter.
+        """
+        super().__init__(**kwargs)
+        self.cache = cache
+        self.should_cache = should_cache or (lambda url: True)
+        self.transport = transport
+
+    def _send(self, request: PreparedRequest, **kwargs) -> Response:
+        if self.transport is not None:
+            return self.transport.send(request, **kwargs)
+        return super().send(request, **kwargs)
+
+    def close(self) -> None:
+        super().close()
+        if self.transport is not None:
+            self.transport.close()
+
+    def send(self, request: PreparedRequest, **kwargs) -> Response:
+        if request.method != "GET" or not self.should_cache(request.url):
+            return self._send(request, **kwargs)
+
+        entry = self.cache.lookup(request.url)
+        if entry is not None:
+            if entry["etag"]:
+                request.headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                request.headers["If-Modified-Since"] = entry["last_modified"]
+
+        response = self._send(request, **kwargs)
+        if response.status_code == 304 and entry is not None:
+            content = self.cache.read(request.url, entry["digest"])
+            if content is not None:
+                response.close()
+                self.cache.record(hit=True)
+                return self._cached_response(request, content, entry["headers"])
+            # The body is gone, fetch the page again without validators.
+            request.headers.pop("If-None-Match", None)
+            request.headers.pop("If-Modified-Since", None)
+            response = self._send(request, **kwargs)
+
+        self.cache.record(hit=False)
+        if response.status_code == 200 and ("ETag" in response.headers or "Last-Modified" in response.headers):
+            self.cache.store(request.url, response.content, response.headers)
+        return response
+
+    def _cached_response(self, request: PreparedRequest, content: bytes, headers: Dict[str, str]) -> Response:
+        response = Response()
+        response.status_code = 200
+        response.reason = "OK"
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        response.headers = CaseInsensitiveDict(headers)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = content
+        response.revalidated = True
+        return response
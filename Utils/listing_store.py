@@ -0,0 +1,263 @@
+import argparse
+import csv
+import sqlite3
+import sys
+import time
+from typing import List, Dict, Any, Optional, Sequence, Tuple
+
+from Utils.provinces import PROVINCE_POSTAL_RANGES, province_of
+from Utils.writer import Sink, LISTING_COLUMN_TYPES, typed_value
+
+# Column of a listing row, SQL column and SQL type.
+STORE_COLUMNS = [
+    ("Locality", "locality", "TEXT"),
+    ("Type of property", "type_of_property", "TEXT"),
+    ("Subtype of property", "subtype_of_property", "TEXT"),
+    ("Price", "price", "REAL"),
+    ("Type of sale", "type_of_sale", "TEXT"),
+    ("Bedrooms", "bedrooms", "INTEGER"),
+    ("Living area", "living_area", "REAL"),
+    ("Kitchen type", "kitchen_type", "TEXT"),
+    ("Furnished", "furnished", "INTEGER"),
+    ("How many fireplaces?", "fireplaces", "INTEGER"),
+    ("Terrace surface", "terrace_surface", "REAL"),
+    ("Garden surface", "garden_surface", "REAL"),
+    ("Surface of the plot", "surface_of_the_plot", "REAL"),
+    ("Number of frontages", "frontages", "INTEGER"),
+    ("Swimming pool", "swimming_pool", "INTEGER"),
+    ("Building condition", "building_condition", "TEXT"),
+]
+
+INDEXES = {
+    "listings_locality": "locality",
+    "listings_type_of_property": "type_of_property",
+    "listings_price": "price",
+    "listings_type_of_sale": "type_of_sale",
+    "listings_sale_locality_price": "type_of_sale, locality, price",
+    "listings_province": "province",
+}
+
+# Medians are taken with window functions: the middle row, or the mean of the two middle rows.
+REFRESH_STATS = """
+WITH prices AS (
+    SELECT locality, type_of_sale, price AS value,
+           ROW_NUMBER() OVER (PARTITION BY locality, type_of_sale ORDER BY price) AS position,
+           COUNT(*) OVER (PARTITION BY locality, type_of_sale) AS total
+    FROM listings WHERE price IS NOT NULL
+), per_m2 AS (
+    SELECT locality, type_of_sale, price / living_area AS value,
+           ROW_NUMBER() OVER (PARTITION BY locality, type_of_sale ORDER BY price / living_area) AS position,
+           COUNT(*) OVER (PARTITION BY locality, type_of_sale) AS total
+    FROM listings WHERE price IS NOT NULL AND living_area > 0
+), median_price AS (
+    SELECT locality, type_of_sale, AVG(value) AS value FROM prices
+    WHERE position IN ((total + 1) / 2, (total + 2) / 2) GROUP BY locality, type_of_sale
+), median_per_m2 AS (
+    SELECT locality, type_of_sale, AVG(value) AS value FROM per_m2
+    WHERE position IN ((total + 1) / 2, (total + 2) / 2) GROUP BY locality, type_of_sale
+)
+INSERT INTO postal_stats
+SELECT l.locality, l.type_of_sale, MIN(l.province), COUNT(*), AVG(l.price), mp.value, MIN(l.price), MAX(l.price), pm.value
+FROM listings l
+LEFT JOIN median_price mp ON mp.locality IS l.locality AND mp.type_of_sale IS l.type_of_sale
+LEFT JOIN median_per_m2 pm ON pm.locality IS l.locality AND pm.type_of_sale IS l.type_of_sale
+GROUP BY l.locality, l.type_of_sale
+"""
+
+
+class ListingStore(Sink):
+    """
+    Indexed SQLite store of listings, filled by the scraper as it runs.
+
+    Listings are upserted by classified ID when the row carries one, so a
+    listing scraped again is updated instead of duplicated. The columns
+    queried most are indexed, and postal_stats holds the count, mean, median,
+    minimum and maximum price and the median price per m² of every postal
+    code and type of sale. It is recomputed when the sink is closed.
+    """
+    def __init__(self, filename: str) -> None:
+        """
+        Args:
+            filename (str): Path to the SQLite database.
+        """
+        self.filename = filename
+        self.connection = None
+
+    def open(self) -> None:
+        self.connection = sqlite3.connect(self.filename, timeout=30, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        columns = ", ".join(f"{name} {sql_type}" for _, name, sql_type in STORE_COLUMNS)
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS listings (id INTEGER PRIMARY KEY, classified_id TEXT UNIQUE, "
+                f"province TEXT, {columns}, updated REAL NOT NULL)"
+            )
+            for index, indexed in INDEXES.items():
+                self.connection.execute(f"CREATE INDEX IF NOT EXISTS {index} ON listings ({indexed})")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS postal_stats (locality TEXT, type_of_sale TEXT, province TEXT, "
+                "listings INTEGER, mean_price REAL, median_price REAL, min_price REAL, max_price REAL, "
+                "median_price_per_m2 REAL, PRIMARY KEY (locality, type_of_sale))"
+            )
+
+    def write_rows(self, rows: List[Dict[str, Any]]) -> None:
+        names = ["classified_id", "province"] + [name for _, name, _ in STORE_COLUMNS] + ["updated"]
+        updates = ", ".join(f"{name} = excluded.{name}" for name in names[1:])
+        now = time.time()
+        with self.connection:
+            self.connection.executemany(
+                f"INSERT INTO listings ({', '.join(names)}) VALUES ({', '.join('?' * len(names))}) "
+                f"ON CONFLICT(classified_id) DO UPDATE SET {updates}",
+                (
+                    [row.get("classified_id"), province_of(row.get("Locality"))]
+                    + [typed_value(LISTING_COLUMN_TYPES.get(column, "string"), row.get(column)) for column, _, _ in STORE_COLUMNS]
+                    + [now]
+                    for row in rows
+                )
+            )
+
+    def refresh_stats(self) -> None:
+        """
+        Recompute the aggregates of every postal code.
+        """
+        with self.connection:
+            self.connection.execute("DELETE FROM postal_stats")
+            self.connection.execute(REFRESH_STATS)
+
+    def close(self) -> None:
+        if self.connection is not None:
+            self.refresh_stats()
+            self.connection.close()
+            self.connection = None
+
+
+def build_filters(args: argparse.Namespace) -> Tuple[str, List[Any]]:
+    """
+    Build the WHERE clause of the query command.
+
+    Args:
+        args (argparse.Namespace): Parsed command line.
+
+    Returns:
+        Tuple[str, List[Any]]: SQL condition and its parameters.
+    """
+    conditions, parameters = [], []
+    if args.locality:
+        conditions.append(f"locality IN ({', '.join('?' * len(args.locality))})")
+        parameters += args.locality
+    for option, column in (("province", "province"), ("type", "type_of_property"), ("subtype", "subtype_of_property"), ("sale", "type_of_sale")):
+        value = getattr(args, option, None)
+        if value is not None:
+            conditions.append(f"{column} = ?")
+            parameters.append(value.upper() if column != "type_of_sale" else value)
+    for option, condition in (
+            ("min_price", "price >= ?"), ("max_price", "price <= ?"),
+            ("min_bedrooms", "bedrooms >= ?"), ("min_living_area", "living_area >= ?"),
+    ):
+        value = getattr(args, option, None)
+        if value is not None:
+            conditions.append(condition)
+            parameters.append(value)
+    if getattr(args, "garden", False):
+        conditions.append("garden_surface > 0")
+    if getattr(args, "pool", False):
+        conditions.append("swimming_pool = 1")
+    return (" WHERE " + " AND ".join(conditions)) if conditions else "", parameters
+
+
+def print_rows(cursor: sqlite3.Cursor) -> int:
+    writer = csv.writer(sys.stdout)
+    writer.writerow(column[0] for column in cursor.description)
+    count = 0
+    for row in cursor:
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+def query(filename: str, args: argparse.Namespace) -> None:
+    """
+    Print the listings matching the filters of the command line.
+
+    Args:
+        filename (str): Path to the listing store.
+        args (argparse.Namespace): Parsed command line.
+    """
+    columns = ", ".join(["classified_id", "province"] + [name for _, name, _ in STORE_COLUMNS])
+    where, parameters = build_filters(args)
+    order = f" ORDER BY {args.order_by}" if args.order_by else ""
+    connection = sqlite3.connect(f"file:{filename}?mode=ro", uri=True)
+    try:
+        start = time.perf_counter()
+        count = print_rows(connection.execute(f"SELECT {columns} FROM listings{where}{order} LIMIT ?", parameters + [args.limit]))
+        print(f"{count} rows in {(time.perf_counter() - start) * 1000:.1f} ms", file=sys.stderr)
+    finally:
+        connection.close()
+
+
+def stats(filename: str, args: argparse.Namespace) -> None:
+    """
+    Print the precomputed aggregates of the postal codes matching the filters of the command line.
+
+    Args:
+        filename (str): Path to the listing store.
+        args (argparse.Namespace): Parsed command line.
+    """
+    where, parameters = build_filters(args)
+    connection = sqlite3.connect(f"file:{filename}?mode=ro", uri=True)
+    try:
+        start = time.perf_counter()
+        count = print_rows(connection.execute(f"SELECT * FROM postal_stats{where} ORDER BY locality, type_of_sale", parameters))
+        print(f"{count} rows in {(time.perf_counter() - start) * 1000:.1f} ms", file=sys.stderr)
+    finally:
+        connection.close()
+
+
+def refresh(filename: str) -> None:
+    """
+    Recompute the aggregates of a listing store.
+
+    Args:
+        filename (str): Path to the listing store.
+    """
+    store = ListingStore(filename)
+    store.open()
+    store.close()
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Query the indexed listing store filled by the scraper.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    query_parser = commands.add_parser("query", help="Print the listings matching the filters as CSV.")
+    stats_parser = commands.add_parser("stats", help="Print the aggregates per postal code as CSV.")
+    refresh_parser = commands.add_parser("refresh", help="Recompute the aggregates per postal code.")
+    for command in (query_parser, stats_parser, refresh_parser):
+        command.add_argument("store", help="Path to the .db listing store.")
+    for command in (query_parser, stats_parser):
+        command.add_argument("--locality", nargs="+", help="Postal codes.")
+        command.add_argument("--province", choices=list(PROVINCE_POSTAL_RANGES))
+        command.add_argument("--sale", choices=["sale", "rent"], help="Type of sale.")
+    query_parser.add_argument("--type", help="Type of property, e.g. house.")
+    query_parser.add_argument("--subtype", help="Subtype of property, e.g. villa.")
+    query_parser.add_argument("--min-price", type=float)
+    query_parser.add_argument("--max-price", type=float)
+    query_parser.add_argument("--min-bedrooms", type=int)
+    query_parser.add_argument("--min-living-area", type=float)
+    query_parser.add_argument("--garden", action="store_true", help="Only listings with a garden.")
+    query_parser.add_argument("--pool", action="store_true", help="Only listings with a swimming pool.")
+    query_parser.add_argument("--order-by", choices=["price", "living_area", "bedrooms", "updated"])
+    query_parser.add_argument("--limit", type=int, default=100)
+    args = parser.parse_args(argv)
+
+    if args.command == "query":
+        query(args.store, args)
+    elif args.command == "stats":
+        stats(args.store, args)
+    else:
+        refresh(args.store)
+
+
+if __name__ == "__main__":
+    main()
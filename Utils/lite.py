@@ -0,0 +1,33 @@
+from typing import Dict, Any, Iterable
+
+REQUIRED_COLUMNS = ("Locality", "Type of property", "Price")
+
+
+class DetailPolicy:
+    """
+    Decide whether a partial row harvested from a search page still needs its detail page.
+
+    A column is missing when the search page does not carry it at all, which
+    the partial row marks with None. A column the search page carries as null
+    is known to be empty and holds False, like in a full row. The default
+    policy fetches the detail page when a required column is missing.
+    Subclass and override needs_detail for other rules.
+    """
+    def __init__(self, required: Iterable[str] = REQUIRED_COLUMNS) -> None:
+        """
+        Args:
+            required (Iterable[str]): Columns a row must have to be saved without its detail page.
+        """
+        self.required = tuple(required)
+
+    def needs_detail(self, row: Dict[str, Any]) -> bool:
+        """
+        Tell whether a partial row must be completed from its detail page.
+
+        Args:
+            row (Dict[str, Any]): Partial row built from the search page.
+
+        Returns:
+            bool: True to fetch the detail page, False to save the partial row as is.
+        """
+        return any(row.get(column) is None for column in self.required)
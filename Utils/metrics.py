@@ -0,0 +1,209 @@
+import bisect
+import json
+import threading
+import time
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, Any, Callable, Iterator, Optional
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Metrics:
+    """
+    Thread-safe per-stage instrumentation of a crawl.
+
+    Every stage keeps a count and a latency histogram. Counters hold totals
+    such as bytes downloaded and rows, and errors are counted by stage and
+    exception type. Gauges are callables read at snapshot time, e.g. queue
+    depths.
+    """
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        self.counters: Dict[str, float] = {}
+        self.errors: Dict[str, Dict[str, int]] = {}
+        self.gauges: Dict[str, Callable[[], float]] = {}
+
+    def observe(self, stage: str, seconds: float) -> None:
+        """
+        Record the duration of one run of a stage.
+
+        Args:
+            stage (str): Name of the stage, e.g. "detail_fetch".
+            seconds (float): Duration in seconds.
+        """
+        with self.lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = {"count": 0, "sum": 0.0, "buckets": [0] * (len(LATENCY_BUCKETS) + 1)}
+            histogram["count"] += 1
+            histogram["sum"] += seconds
+            histogram["buckets"][bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+    @contextmanager
+    def time(self, stage: str) -> Iterator[None]:
+        """
+        Time a block as one run of a stage, counting the error if it raises.
+
+        Args:
+            stage (str): Name of the stage.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.error(stage, e)
+            raise
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def count(self, name: str, value: float = 1) -> None:
+        """
+        Add to a counter.
+
+        Args:
+            name (str): Name of the counter, e.g. "bytes_downloaded".
+            value (float): Amount to add.
+        """
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def error(self, stage: str, error: BaseException) -> None:
+        """
+        Count an error of a stage by exception type.
+
+        Args:
+            stage (str): Name of the stage.
+            error (BaseException): Exception raised.
+        """
+        with self.lock:
+            by_type = self.errors.setdefault(stage, {})
+            name = type(error).__name__
+            by_type[name] = by_type.get(name, 0) + 1
+
+    def gauge(self, name: str, read: Optional[Callable[[], float]]) -> None:
+        """
+        Register a gauge, or remove it when read is None.
+
+        Args:
+            name (str): Name of the gauge, e.g. "links_queue".
+            read (Optional[Callable[[], float]]): Returns the current value.
+        """
+        with self.lock:
+            if read is None:
+                self.gauges.pop(name, None)
+            else:
+                self.gauges[name] = read
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Get a JSON-serializable copy of every metric.
+
+        Returns:
+            Dict[str, Any]: Stages with count, total and mean seconds and histogram, counters, errors and gauges.
+        """
+        with self.lock:
+            stages = {
+                stage: {
+                    "count": histogram["count"],
+                    "seconds": round(histogram["sum"], 6),
+                    "mean_ms": round(histogram["sum"] * 1000 / histogram["count"], 3),
+                    "buckets": dict(zip([str(bound) for bound in LATENCY_BUCKETS] + ["+Inf"], histogram["buckets"])),
+                }
+                for stage, histogram in self.stages.items()
+            }
+            counters = dict(self.counters)
+            errors = {stage: dict(by_type) for stage, by_type in self.errors.items()}
+            gauges = dict(self.gauges)
+        return {
+            "uptime": round(time.time() - self.started, 3),
+            "stages": stages,
+            "counters": counters,
+            "errors": errors,
+            "gauges": {name: read() for name, read in gauges.items()},
+        }
+
+    def render_prometheus(self) -> str:
+        """
+        Render every metric in the Prometheus text exposition format.
+
+        Returns:
+            str: Metrics text.
+        """
+        snapshot = self.snapshot()
+        lines = ["# TYPE immoweb_stage_seconds histogram"]
+        for stage, histogram in snapshot["stages"].items():
+            cumulative = 0
+            for bound, count in histogram["buckets"].items():
+                cumulative += count
+                lines.append(f'immoweb_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'immoweb_stage_seconds_sum{{stage="{stage}"}} {histogram["seconds"]}')
+            lines.append(f'immoweb_stage_seconds_count{{stage="{stage}"}} {histogram["count"]}')
+        for name, value in snapshot["counters"].items():
+            lines.append(f"# TYPE immoweb_{name}_total counter")
+            lines.append(f"immoweb_{name}_total {value}")
+        lines.append("# TYPE immoweb_errors_total counter")
+        for stage, by_type in snapshot["errors"].items():
+            for name, count in by_type.items():
+                lines.append(f'immoweb_errors_total{{stage="{stage}",type="{name}"}} {count}')
+        lines.append("# TYPE immoweb_queue_depth gauge")
+        for name, value in snapshot["gauges"].items():
+            label = name.replace("\\", "\\\\").replace('"', '\\"')
+            lines.append(f'immoweb_queue_depth{{queue="{label}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+
+class StatsServer:
+    """
+    Localhost endpoint serving the metrics as Prometheus text on /metrics and as JSON on /stats.
+    """
+    def __init__(self, metrics: Metrics, port: int = 9100, host: str = "127.0.0.1") -> None:
+        """
+        Args:
+            metrics (Metrics): Metrics to serve.
+            port (int): Port to listen on, 0 for any free port.
+            host (str): Interface to listen on.
+        """
+        self.metrics = metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args) -> None:
+                pass
+
+            def do_GET(self) -> None:
+                if self.path.startswith("/metrics"):
+                    body = metrics.render_prometheus().encode()
+                    content_type = "text/plain; version=0.0.4"
+                elif self.path.startswith("/stats"):
+                    body = json.dumps(metrics.snapshot()).encode()
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        self.thread = None
+
+    def start(self) -> "StatsServer":
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> "StatsServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
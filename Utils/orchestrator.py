@@ -0,0 +1,195 @@
+import os
+import threading
+from typing import List, Dict, Any, Optional, Callable
+
+from Utils.scrap_in_json import ImmowebScraper, parse_listing
+from Utils.crawl_state import CrawlState, export_records
+from Utils.concurrency import AdaptiveLimiter, ThrottledSession
+from Utils.writer import BatchWriter, make_sink
+from Utils.dedup import make_deduplicator
+from Utils.metrics import Metrics, StatsServer
+from Utils.transport import make_transport
+from Utils.parse_pool import ParsePool
+from Utils.archive import PageArchive
+
+
+class MultiSearchOrchestrator:
+    """
+    Run several searches concurrently in one process.
+
+    Every search gets its own ImmowebScraper and pipeline thread. They all
+    share one session, so one connection pool and one adaptive limit act as
+    the global rate budget. They also share one writer, so rows from every
+    search go to the output file through a single thread, and one
+    deduplicator, so a listing found by two searches is scraped once. With
+    parser_cores, one parse pool serves the detail pages of every search.
+    """
+    def __init__(
+            self,
+            searches: List[Dict[str, Any]],
+            headers: Dict[str, str],
+            output_file: str,
+            max_concurrency: int = 40,
+            expected_items: Optional[int] = None,
+            dedup_error_rate: float = 0.001,
+            stats_port: Optional[int] = None,
+            transport: str = "http1",
+            parser_cores: int = 0,
+            dead_letter_file: Optional[str] = None,
+            archive_dir: Optional[str] = None
+    ) -> None:
+        """
+        Args:
+            searches (List[Dict[str, Any]]): Searches with their "base_url" and "type_of_sale", plus any other
+                ImmowebScraper argument, e.g. a "checkpoint_file" per search. With a "state_file" on every search,
+                output_file is rebuilt from all the states at the end of the run.
+            headers (Dict[str, str]): HTTP headers for requests.
+            output_file (str): Path to the CSV file shared by every search, or to a Parquet dataset (.parquet).
+            max_concurrency (int): Upper bound of the shared limit on requests in flight.
+            expected_items (Optional[int]): Expected number of distinct listings. Above one million a Bloom filter
+                replaces the exact set deduplicating listings across searches.
+            dedup_error_rate (float): False positive rate of the Bloom filter.
+            stats_port (Optional[int]): Serve the metrics of every search on localhost at /metrics and /stats
+                during the run (default is no endpoint).
+            transport (str): "http1" for a keep-alive pool sized to max_concurrency, "http2" for httpx with HTTP/2
+                multiplexing.
+            parser_cores (int): Number of processes parsing the detail pages of every search (default is 0, parsing
+                in the fetch threads).
+            dead_letter_file (Optional[str]): JSONL file shared by every search, recording the URLs that failed
+                every retry (default is counting them only).
+            archive_dir (Optional[str]): Directory of the raw-page archive shared by every search (default is no
+                archive).
+        """
+        if 0 < sum(search.get("state_file") is not None for search in searches) < len(searches):
+            # Rows of searches with a state only reach the output when it is rebuilt from the states.
+            raise ValueError("state_file must be set on every search or on none")
+        self.searches = searches
+        self.headers = headers
+        self.output_file = output_file
+        self.limiter = AdaptiveLimiter(initial=min(10, max_concurrency), maximum=max_concurrency)
+        self.session = ThrottledSession(self.limiter, transport=make_transport(transport, max_concurrency, hosts=len(searches)))
+        self.session.headers.update(headers)
+        self.metrics = Metrics()
+        self.stats_port = stats_port
+        self.writer = BatchWriter(make_sink(output_file), metrics=self.metrics, name=f"writer:{output_file}")
+        self.deduplicator = make_deduplicator(expected_items, dedup_error_rate)
+        self.parse_pool = ParsePool(parse_listing, parser_cores, metrics=self.metrics) if parser_cores > 0 else None
+        self.archive = PageArchive(archive_dir) if archive_dir is not None else None
+        self.scrapers = [
+            ImmowebScraper(
+                search["base_url"], headers, output_file, search["type_of_sale"],
+                session=self.session, writer=self.writer, deduplicator=self.deduplicator, metrics=self.metrics,
+                parse_pool=self.parse_pool, archive=self.archive, dead_letter_file=search.get("dead_letter_file", dead_letter_file),
+                **{key: value for key, value in search.items() if key not in ("base_url", "type_of_sale", "dead_letter_file")}
+            )
+            for search in searches
+        ]
+
+    def run(self, **run_kwargs) -> None:
+        """
+        Run every search concurrently and wait for all of them.
+
+        Args:
+            **run_kwargs: Arguments of ImmowebScraper.run_scraper, applied to every search.
+
+        Raises:
+            Exception: The first error raised by a search, once every search has stopped.
+        """
+        self.run_each(lambda scraper: scraper.run_scraper(**run_kwargs))
+
+    def run_sweep(self, stop_after: int = 30) -> None:
+        """
+        Sweep the newest listings of every search concurrently, see ImmowebScraper.run_sweep.
+
+        Every search needs its own "state_file".
+
+        Args:
+            stop_after (int): Number of consecutive known listings after which a search stops paginating.
+
+        Raises:
+            Exception: The first error raised by a search, once every search has stopped.
+        """
+        self.run_each(lambda scraper: scraper.run_sweep(stop_after), export=False)
+
+    def retry_dead_letters(self) -> None:
+        """
+        Scrape again the dead letters of every search concurrently, see ImmowebScraper.retry_dead_letters.
+
+        Raises:
+            Exception: The first error raised by a search, once every search has stopped.
+        """
+        self.run_each(ImmowebScraper.retry_dead_letters)
+
+    def run_each(self, run_search: Callable[[ImmowebScraper], None], export: bool = True) -> None:
+        """
+        Call a function on every scraper concurrently, with the shared writer, parse pool and stats endpoint.
+
+        Args:
+            run_search (Callable[[ImmowebScraper], None]): Runs one search.
+            export (bool): Rebuild output_file from the crawl states of every search once the writer is closed, if
+                the searches have one.
+
+        Raises:
+            Exception: The first error raised by a search, once every search has stopped.
+        """
+        errors = []
+
+        def run_guarded(scraper: ImmowebScraper) -> None:
+            try:
+                run_search(scraper)
+            except Exception as e:
+                errors.append(e)
+
+        if export:
+            self.seed_states()
+        stats_server = StatsServer(self.metrics, self.stats_port).start() if self.stats_port is not None else None
+        try:
+            with self.writer:
+                if self.parse_pool is not None:
+                    self.parse_pool.start()
+                try:
+                    threads = [threading.Thread(target=run_guarded, args=(scraper,)) for scraper in self.scrapers]
+                    for thread in threads:
+                        thread.start()
+                    for thread in threads:
+                        thread.join()
+                finally:
+                    if self.parse_pool is not None:
+                        self.parse_pool.close()
+            if export:
+                self.export_states()
+        finally:
+            if stats_server is not None:
+                stats_server.stop()
+
+        if errors:
+            raise errors[0]
+
+    def states(self) -> List[CrawlState]:
+        """
+        Get the crawl states of the searches, each database once.
+
+        Returns:
+            List[CrawlState]: States in the order of the searches.
+        """
+        states = {}
+        for scraper in self.scrapers:
+            if scraper.state is not None:
+                states.setdefault(os.path.abspath(scraper.state.filename), scraper.state)
+        return list(states.values())
+
+    def seed_states(self) -> None:
+        """
+        Import the rows of an existing output_file into the first crawl state, if every state was just created.
+        """
+        states = self.states()
+        if states and all(state.created for state in states):
+            states[0].seed(self.output_file)
+
+    def export_states(self) -> None:
+        """
+        Rewrite output_file with the records of the crawl states of every search, each database counted once.
+        """
+        states = self.states()
+        if states:
+            export_records([record for state in states for record in state.records()], self.output_file)
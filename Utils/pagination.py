@@ -0,0 +1,181 @@
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from Utils.extract import extract_result_count
+from Utils.metrics import Metrics
+from Utils.provinces import PROVINCE_POSTAL_RANGES
+
+# Immoweb shows 30 listings per search page and no page past the 333rd.
+PAGE_SIZE = 30
+MAX_PAGES = 333
+
+# Upper price bound of the first split. Listings above it form one open-ended partition, split by province if needed.
+PRICE_CEILINGS = {"for-sale": 5000000, "for-rent": 20000}
+
+
+def with_query(url: str, **params: Optional[object]) -> str:
+    """
+    Set or remove query parameters of a URL.
+
+    Args:
+        url (str): URL to change.
+        **params (Optional[object]): Parameters to set, None removing the parameter.
+
+    Returns:
+        str: URL with the parameters.
+    """
+    parts = urlsplit(url)
+    query = [(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True) if key not in params]
+    query += [(key, str(value)) for key, value in params.items() if value is not None]
+    return urlunsplit(parts._replace(query=urlencode(query, safe=",")))
+
+
+def query_value(url: str, key: str) -> Optional[str]:
+    """
+    Get a query parameter of a URL.
+
+    Args:
+        url (str): URL to read.
+        key (str): Name of the parameter.
+
+    Returns:
+        Optional[str]: Value of the parameter, or None if the URL does not have it.
+    """
+    return dict(parse_qsl(urlsplit(url).query)).get(key)
+
+
+def has_price_filter(url: str) -> bool:
+    return query_value(url, "minPrice") is not None or query_value(url, "maxPrice") is not None
+
+
+def split_query(url: str) -> List[str]:
+    """
+    Split a search by province, or in two by price once it is limited to a province or to a price range.
+
+    Listings with the price on request match no price range, so a search
+    is split by province first, which keeps them in every partition that
+    fits without a price split. minPrice and maxPrice are inclusive. A
+    search without an upper bound is first split at the price ceiling of its
+    transaction. A price range that cannot be split is split by province if
+    the search is not limited to one yet.
+
+    Args:
+        url (str): Search URL.
+
+    Returns:
+        List[str]: Search URLs covering the same listings, or an empty list if the search cannot be split.
+    """
+    if query_value(url, "provinces") is None and not has_price_filter(url):
+        return [with_query(url, provinces=province) for province in PROVINCE_POSTAL_RANGES]
+    low = int(query_value(url, "minPrice") or 0)
+    high = query_value(url, "maxPrice")
+    high = int(high) if high is not None else None
+    if high is None:
+        ceiling = next((price for transaction, price in PRICE_CEILINGS.items() if f"/{transaction}" in url), max(PRICE_CEILINGS.values()))
+        if low < ceiling:
+            return [with_query(url, minPrice=low or None, maxPrice=ceiling - 1), with_query(url, minPrice=ceiling)]
+    elif high > low:
+        middle = (low + high) // 2
+        return [with_query(url, minPrice=low or None, maxPrice=middle), with_query(url, minPrice=middle + 1, maxPrice=high)]
+    if query_value(url, "provinces") is None:
+        return [with_query(url, provinces=province) for province in PROVINCE_POSTAL_RANGES]
+    return []
+
+
+class SearchPlanner:
+    """
+    Plan every search page of a search from the result count shown on page 1.
+
+    A search with more results than max_pages pages can show is split by
+    split_query until every partition fits, so the crawl covers every
+    listing instead of stopping at the last page shown. The first page of
+    every partition is kept, so the crawl does not fetch it twice.
+
+    When a search without a price filter has to be split by price, its
+    listings with the price on request are in none of the price ranges, so
+    the search itself is also planned as a last partition of max_pages pages.
+    This is best-effort: it costs up to max_pages more search pages per such
+    search, its other listings are found again there and dropped as
+    duplicates by the crawl, and the listings with the price on request it
+    shows past max_pages are still missed.
+    """
+    def __init__(
+            self,
+            fetch: Callable[[str], bytes],
+            page_size: int = PAGE_SIZE,
+            max_pages: int = MAX_PAGES,
+            workers: int = 4,
+            metrics: Optional[Metrics] = None
+    ) -> None:
+        """
+        Args:
+            fetch (Callable[[str], bytes]): Fetches the first page of a search URL.
+            page_size (int): Number of listings per search page.
+            max_pages (int): Number of pages the site shows at most for a search.
+            workers (int): Number of first pages fetched at the same time while splitting.
+            metrics (Optional[Metrics]): Counts the "partitions" and the listings of "truncated_results" that no
+                split could bring under max_pages.
+        """
+        self.fetch = fetch
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.workers = workers
+        self.metrics = metrics
+        self.first_pages: Dict[str, bytes] = {}
+        self.lock = threading.Lock()
+
+    def count(self, url: str) -> Optional[int]:
+        """
+        Fetch the first page of a search and read its result count.
+
+        Args:
+            url (str): Search URL.
+
+        Returns:
+            Optional[int]: Number of listings, or None if the page does not say.
+        """
+        content = self.fetch(url)
+        with self.lock:
+            self.first_pages[url] = content
+        return extract_result_count(content)
+
+    def plan(self, url: str) -> Optional[List[Tuple[str, int]]]:
+        """
+        Plan the pages of a search.
+
+        Args:
+            url (str): Search URL.
+
+        Returns:
+            Optional[List[Tuple[str, int]]]: Search URL and number of pages of every partition, or None if the
+                first page has no result count, in which case the pages must be walked until an empty one.
+        """
+        count = self.count(url)
+        if count is None:
+            return None
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            plan = self._plan(url, count, executor)
+        if self.metrics is not None:
+            self.metrics.count("partitions", len(plan))
+        return plan
+
+    def _plan(self, url: str, count: Optional[int], executor: ThreadPoolExecutor) -> List[Tuple[str, int]]:
+        if count is None:
+            return [(url, self.max_pages)]
+        pages = math.ceil(count / self.page_size)
+        if pages <= self.max_pages:
+            return [(url, pages)] if pages else []
+        parts = split_query(url)
+        if not parts:
+            if self.metrics is not None:
+                self.metrics.count("truncated_results", count - self.max_pages * self.page_size)
+            return [(url, self.max_pages)]
+        plan = []
+        for part, part_count in zip(parts, executor.map(self.count, parts)):
+            plan.extend(self._plan(part, part_count, executor))
+        if not has_price_filter(url) and has_price_filter(parts[0]):
+            plan.append((url, self.max_pages))
+        return plan
@@ -0,0 +1,214 @@
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, List, Optional, Tuple
+
+from Utils.metrics import Metrics
+
+
+def parse_chunk(parse: Callable[..., Any], chunk: List[Tuple]) -> List[Tuple[bool, Any, float]]:
+    """
+    Parse a chunk of pages in a parser process.
+
+    Args:
+        parse (Callable[..., Any]): Module-level parse function.
+        chunk (List[Tuple]): Arguments of parse for every page.
+
+    Returns:
+        List[Tuple[bool, Any, float]]: Success, record or exception, and seconds spent, for every page.
+    """
+    results = []
+    for args in chunk:
+        start = time.perf_counter()
+        try:
+            results.append((True, parse(*args), time.perf_counter() - start))
+        except Exception as e:
+            results.append((False, e, time.perf_counter() - start))
+    return results
+
+
+class ParsePool:
+    """
+    Process pool parsing the raw pages handed over by the fetch workers.
+
+    Parsing holds the GIL, so the threads doing the network I/O only ever
+    use one core for it. Fetch workers submit the raw bytes and move on to
+    the next request, a single thread groups the pages into chunks and
+    sends them to the parser processes, and only the compact record
+    returned by parse comes back. A chunk is sent when it holds chunk_size
+    pages or when flush_interval seconds passed since its first page, so
+    pickling and the round trip are paid per chunk rather than per page.
+    submit blocks while max_pending pages wait for their record.
+
+    parse must be a module-level function, so the processes can unpickle it.
+    """
+    _STOP = object()
+
+    def __init__(
+            self,
+            parse: Callable[..., Any],
+            cores: Optional[int] = None,
+            chunk_size: int = 8,
+            flush_interval: float = 0.05,
+            max_pending: Optional[int] = None,
+            metrics: Optional[Metrics] = None,
+            stage: str = "parse"
+    ) -> None:
+        """
+        Args:
+            parse (Callable[..., Any]): Module-level function turning the arguments of submit into a record.
+            cores (Optional[int]): Number of parser processes (default is the number of CPUs).
+            chunk_size (int): Number of pages sent to a process at once.
+            flush_interval (float): Maximum number of seconds a page waits for its chunk to fill.
+            max_pending (Optional[int]): Maximum number of pages submitted and not parsed yet (default is four
+                chunks per process).
+            metrics (Optional[Metrics]): Records the parse time of every page under stage, and the pending pages
+                as the "parse_pending" gauge.
+            stage (str): Name of the parse stage in the metrics.
+        """
+        self.parse = parse
+        self.cores = cores or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.flush_interval = flush_interval
+        self.slots = threading.BoundedSemaphore(max_pending or self.cores * chunk_size * 4)
+        self.metrics = metrics
+        self.stage = stage
+        self.queue = queue.Queue()
+        self.pending = 0
+        self.idle = threading.Condition()
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.thread: Optional[threading.Thread] = None
+
+    def start(self) -> "ParsePool":
+        """
+        Start the parser processes and the chunking thread.
+
+        Returns:
+            ParsePool: The pool itself.
+        """
+        if self.thread is None:
+            # Forking a parent whose threads hold locks can deadlock the children.
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            self.executor = ProcessPoolExecutor(max_workers=self.cores, mp_context=multiprocessing.get_context(method))
+            if self.metrics is not None:
+                self.metrics.gauge("parse_pending", lambda: self.pending)
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+        return self
+
+    def submit(self, *args: Any, callback: Optional[Callable[[Future], None]] = None) -> Future:
+        """
+        Queue a page for parsing, blocking while max_pending pages are waiting.
+
+        Args:
+            *args: Arguments of parse, the raw bytes of the page first.
+            callback (Optional[Callable[[Future], None]]): Called with the future once it resolves, before the page
+                stops counting as pending, so flush also waits for it, e.g. for the row to be saved.
+
+        Returns:
+            Future: Resolves to the record returned by parse, or to its exception.
+        """
+        self.slots.acquire()
+        with self.idle:
+            self.pending += 1
+        future = Future()
+        if callback is not None:
+            future.add_done_callback(callback)
+        future.add_done_callback(self._done)
+        self.queue.put((args, future))
+        return future
+
+    def flush(self) -> None:
+        """
+        Send the pages waiting for their chunk to fill, and block until every page submitted so far is parsed and its
+        callback returned.
+        """
+        if self.thread is None:
+            return
+        sent = threading.Event()
+        self.queue.put(sent)
+        sent.wait()
+        with self.idle:
+            self.idle.wait_for(lambda: self.pending == 0)
+
+    def close(self) -> None:
+        """
+        Parse the remaining pages and stop the processes and the chunking thread.
+        """
+        if self.thread is None:
+            return
+        self.queue.put(self._STOP)
+        self.thread.join()
+        self.thread = None
+        self.executor.shutdown(wait=True)
+        self.executor = None
+        if self.metrics is not None:
+            self.metrics.gauge("parse_pending", None)
+
+    def __enter__(self) -> "ParsePool":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _done(self, future: Future) -> None:
+        self.slots.release()
+        with self.idle:
+            self.pending -= 1
+            if self.pending == 0:
+                self.idle.notify_all()
+
+    def _send(self, chunk: List[Tuple[Tuple, Future]]) -> None:
+        if not chunk:
+            return
+        futures = [future for _, future in chunk]
+        try:
+            sent = self.executor.submit(parse_chunk, self.parse, [args for args, _ in chunk])
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+            return
+        sent.add_done_callback(lambda sent: self._resolve(futures, sent))
+
+    def _resolve(self, futures: List[Future], sent: Future) -> None:
+        error = sent.exception()
+        if error is not None:
+            for future in futures:
+                future.set_exception(error)
+            return
+        for future, (ok, value, seconds) in zip(futures, sent.result()):
+            if self.metrics is not None:
+                self.metrics.observe(self.stage, seconds)
+                if not ok:
+                    self.metrics.error(self.stage, value)
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+    def _run(self) -> None:
+        chunk = []
+        deadline = None
+        while True:
+            try:
+                item = self.queue.get(timeout=max(deadline - time.monotonic(), 0) if chunk else None)
+            except queue.Empty:
+                item = None
+            if item is self._STOP:
+                self._send(chunk)
+                break
+            if isinstance(item, threading.Event):
+                self._send(chunk)
+                chunk = []
+                item.set()
+                continue
+            if item is not None:
+                if not chunk:
+                    deadline = time.monotonic() + self.flush_interval
+                chunk.append(item)
+            if chunk and (len(chunk) >= self.chunk_size or time.monotonic() >= deadline):
+                self._send(chunk)
+                chunk = []
@@ -0,0 +1,37 @@
+from typing import Optional
+
+# Belgian provinces as Immoweb names them, with the postal code ranges they cover.
+PROVINCE_POSTAL_RANGES = {
+    "BRUSSELS": [(1000, 1299)],
+    "WALLOON_BRABANT": [(1300, 1499)],
+    "FLEMISH_BRABANT": [(1500, 1999), (3000, 3499)],
+    "ANTWERP": [(2000, 2999)],
+    "LIMBURG": [(3500, 3999)],
+    "LIEGE": [(4000, 4999)],
+    "NAMUR": [(5000, 5999)],
+    "HAINAUT": [(6000, 6599), (7000, 7999)],
+    "LUXEMBOURG": [(6600, 6999)],
+    "WEST_FLANDERS": [(8000, 8999)],
+    "EAST_FLANDERS": [(9000, 9999)],
+}
+
+
+def province_of(postal_code) -> Optional[str]:
+    """
+    Get the province of a Belgian postal code.
+
+    Args:
+        postal_code: Postal code, as a string or an integer.
+
+    Returns:
+        Optional[str]: Immoweb name of the province, or None if the code is not Belgian.
+    """
+    try:
+        code = int(postal_code)
+    except (TypeError, ValueError):
+        return None
+    for province, ranges in PROVINCE_POSTAL_RANGES.items():
+        for low, high in ranges:
+            if low <= code <= high:
+                return province
+    return None
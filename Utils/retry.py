@@ -0,0 +1,295 @@
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+import requests
+
+from Utils.extract import ExtractionError
+from Utils.metrics import Metrics
+
+
+class RetryPolicy(NamedTuple):
+    """
+    How often and how late a failed URL is tried again.
+
+    attempts counts the first try, so 1 sends the URL to the dead letters
+    at its first failure. The n-th retry waits delay * factor ** (n - 1)
+    seconds, at most max_delay.
+    """
+    attempts: int
+    delay: float = 0.0
+    factor: float = 2.0
+    max_delay: float = 600.0
+
+    def wait(self, attempt: int) -> float:
+        return min(self.delay * self.factor ** (attempt - 1), self.max_delay)
+
+
+# Throttling and network errors are worth waiting for, a missing listing or a row the code cannot build is not.
+DEFAULT_POLICIES = {
+    "throttled": RetryPolicy(5, 30.0),
+    "network": RetryPolicy(4, 5.0),
+    "server": RetryPolicy(3, 10.0),
+    "extraction": RetryPolicy(2, 60.0),
+    "gone": RetryPolicy(1),
+    "client": RetryPolicy(1),
+    "data": RetryPolicy(1),
+    "other": RetryPolicy(2, 10.0),
+}
+
+
+def classify(error: BaseException) -> str:
+    """
+    Get the class of an error, the key of its retry policy.
+
+    Args:
+        error (BaseException): Exception raised while scraping a URL.
+
+    Returns:
+        str: "throttled", "gone", "server", "client", "network", "extraction", "data" or "other".
+    """
+    response = getattr(error, "response", None)
+    status = getattr(response, "status_code", None) or getattr(error, "status", None)
+    if isinstance(status, int):
+        if status in (429, 503):
+            return "throttled"
+        if status in (404, 410):
+            return "gone"
+        return "server" if status >= 500 else "client"
+    if isinstance(error, ExtractionError):
+        return "extraction"
+    if isinstance(error, (requests.ConnectionError, requests.Timeout, TimeoutError, OSError)):
+        return "network"
+    if type(error).__module__.startswith("aiohttp"):
+        return "network"
+    if isinstance(error, (KeyError, IndexError, TypeError, ValueError)):
+        return "data"
+    return "other"
+
+
+class DeadLetterStore:
+    """
+    Append-only JSONL file of the URLs that failed every attempt, with the reason.
+
+    Stores opened on the same file in one process share a lock, so several
+    scrapers can record and take dead letters at the same time.
+    """
+    _locks: Dict[str, threading.Lock] = {}
+    _locks_lock = threading.Lock()
+
+    def __init__(self, filename: str) -> None:
+        """
+        Args:
+            filename (str): Path to the JSONL file.
+        """
+        self.filename = filename
+        with self._locks_lock:
+            self.lock = self._locks.setdefault(os.path.abspath(filename), threading.Lock())
+
+    def add(self, record: Dict[str, Any]) -> None:
+        """
+        Append a failed URL.
+
+        Args:
+            record (Dict[str, Any]): URL, error class, error, attempts, time of the failure and context of the search.
+        """
+        line = json.dumps(record) + "\n"
+        with self.lock:
+            with open(self.filename, "a") as file:
+                file.write(line)
+
+    def records(self) -> List[Dict[str, Any]]:
+        """
+        Read the dead letters, the last record of a URL replacing the earlier ones.
+
+        Returns:
+            List[Dict[str, Any]]: Records in the order their URL first failed.
+        """
+        with self.lock:
+            return list(self._read().values())
+
+    def take(self, select: Callable[[Dict[str, Any]], bool]) -> List[Dict[str, Any]]:
+        """
+        Remove the selected dead letters from the file and return them, e.g. to scrape them again.
+
+        Args:
+            select (Callable[[Dict[str, Any]], bool]): Tells whether a record is taken.
+
+        Returns:
+            List[Dict[str, Any]]: Taken records.
+        """
+        with self.lock:
+            records = self._read()
+            taken = [record for record in records.values() if select(record)]
+            with open(self.filename + ".tmp", "w") as file:
+                for record in records.values():
+                    if not select(record):
+                        file.write(json.dumps(record) + "\n")
+            os.replace(self.filename + ".tmp", self.filename)
+        return taken
+
+    def _read(self) -> Dict[str, Dict[str, Any]]:
+        records = {}
+        if os.path.isfile(self.filename):
+            with open(self.filename) as file:
+                for line in file:
+                    if line.strip():
+                        record = json.loads(line)
+                        records[record["url"]] = record
+        return records
+
+
+class RetryQueue:
+    """
+    Delayed retries of failed URLs on their own threads, so the main pipeline never waits for them.
+
+    A failed URL is classified and scheduled again after the delay of its
+    policy. A URL that used every attempt of its policy is recorded in the
+    dead letters with the last error. attempt(url, number) is called for
+    every retry and must report its outcome with done or fail, possibly
+    later from another thread.
+    """
+    def __init__(
+            self,
+            attempt: Callable[[str, int], None],
+            policies: Optional[Dict[str, RetryPolicy]] = None,
+            dead_letters: Optional[DeadLetterStore] = None,
+            metrics: Optional[Metrics] = None,
+            workers: int = 2,
+            context: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """
+        Args:
+            attempt (Callable[[str, int], None]): Scrapes a URL, given the number of the attempt.
+            policies (Optional[Dict[str, RetryPolicy]]): Policy of every error class, merged into DEFAULT_POLICIES.
+            dead_letters (Optional[DeadLetterStore]): Store of the URLs that failed every attempt (default is
+                counting them only).
+            metrics (Optional[Metrics]): Counts the "retried", "recovered" and "dead_letters" URLs.
+            workers (int): Number of threads running the retries.
+            context (Optional[Dict[str, Any]]): Fields added to every dead letter, e.g. the search.
+        """
+        self.attempt = attempt
+        self.policies = dict(DEFAULT_POLICIES, **(policies or {}))
+        self.dead_letters = dead_letters
+        self.metrics = metrics
+        self.workers = workers
+        self.context = context or {}
+        self.condition = threading.Condition()
+        self.scheduled: List[tuple] = []
+        self.sequence = itertools.count()
+        self.outstanding = 0
+        self.stopped = False
+        self.threads: List[threading.Thread] = []
+
+    def start(self) -> "RetryQueue":
+        """
+        Start the retry threads.
+
+        Returns:
+            RetryQueue: The queue itself.
+        """
+        if not self.threads:
+            self.stopped = False
+            self.threads = [threading.Thread(target=self._run, daemon=True) for _ in range(self.workers)]
+            for thread in self.threads:
+                thread.start()
+        return self
+
+    def fail(self, url: str, error: BaseException, attempt: int) -> None:
+        """
+        Report a failed attempt, scheduling a retry or recording a dead letter.
+
+        Args:
+            url (str): URL of the property detail page.
+            error (BaseException): Exception raised by the attempt.
+            attempt (int): Number of the attempt, 1 for the first.
+        """
+        reason = classify(error)
+        policy = self.policies.get(reason, self.policies["other"])
+        with self.condition:
+            if attempt == 1:
+                self.outstanding += 1
+            if attempt < policy.attempts and not self.stopped:
+                heapq.heappush(self.scheduled, (time.monotonic() + policy.wait(attempt), next(self.sequence), url, attempt + 1, error))
+                self.condition.notify()
+                retry = True
+            else:
+                self.outstanding -= 1
+                self.condition.notify_all()
+                retry = False
+        if retry:
+            self._count("retried")
+        else:
+            self._bury(url, error, attempt, reason)
+
+    def done(self, url: str, attempt: int) -> None:
+        """
+        Report a successful attempt.
+
+        Args:
+            url (str): URL of the property detail page.
+            attempt (int): Number of the attempt, 1 for the first.
+        """
+        if attempt == 1:
+            return
+        self._count("recovered")
+        with self.condition:
+            self.outstanding -= 1
+            self.condition.notify_all()
+
+    def join(self) -> None:
+        """
+        Block until every failed URL succeeded or went to the dead letters.
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.outstanding == 0)
+
+    def close(self) -> None:
+        """
+        Stop the retry threads. URLs still waiting for their retry go to the dead letters with their last error.
+        """
+        with self.condition:
+            self.stopped = True
+            abandoned, self.scheduled = self.scheduled, []
+            self.outstanding -= len(abandoned)
+            self.condition.notify_all()
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+        for _, _, url, attempt, error in abandoned:
+            self._bury(url, error, attempt - 1, classify(error))
+
+    def __enter__(self) -> "RetryQueue":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _count(self, name: str) -> None:
+        if self.metrics is not None:
+            self.metrics.count(name)
+
+    def _bury(self, url: str, error: BaseException, attempts: int, reason: str) -> None:
+        self._count("dead_letters")
+        if self.dead_letters is not None:
+            self.dead_letters.add(dict(
+                self.context, url=url, reason=reason, error=f"{type(error).__name__}: {error}",
+                attempts=attempts, failed_at=time.time()
+            ))
+
+    def _run(self) -> None:
+        while True:
+            with self.condition:
+                while not self.stopped and (not self.scheduled or self.scheduled[0][0] > time.monotonic()):
+                    self.condition.wait(self.scheduled[0][0] - time.monotonic() if self.scheduled else None)
+                if self.stopped:
+                    return
+                _, _, url, attempt, _ = heapq.heappop(self.scheduled)
+            try:
+                self.attempt(url, attempt)
+            except Exception as e:
+                self.fail(url, e, attempt)
@@ -0,0 +1,185 @@
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+
+class _Missing:
+    # Subscripting a missing object raises KeyError, so absence propagates down a path.
+    def __getitem__(self, key: Any) -> Any:
+        raise KeyError(key)
+
+
+MISSING = _Missing()
+_USE_DEFAULT = object()
+
+
+class Field(NamedTuple):
+    """
+    Column of a row and where to find it in the JSON data of a listing.
+
+    path is a tuple of keys, a tuple of such tuples when the column is
+    computed from several values, or None for a constant column holding
+    default. A null value, or a null object on the way, gives default. A
+    single value that is not null goes through transform. Several values go
+    through transform together, nulls included as None.
+    """
+    column: str
+    path: Optional[Tuple]
+    default: Any = False
+    transform: Optional[Callable[..., Any]] = None
+
+
+class Record(tuple):
+    """
+    Compact row built by a CompiledSchema: a tuple of the values, in the order of columns.
+
+    keys, values, items and get follow the dict interface, so the writers
+    take records and dicts alike.
+    """
+    __slots__ = ()
+    columns: Tuple[str, ...] = ()
+    positions: Dict[str, int] = {}
+
+    def keys(self) -> Tuple[str, ...]:
+        return self.columns
+
+    def values(self) -> "Record":
+        return self
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        return zip(self.columns, self)
+
+    def get(self, column: str, default: Any = None) -> Any:
+        position = self.positions.get(column)
+        return self[position] if position is not None else default
+
+    def as_dict(self) -> Dict[str, Any]:
+        return dict(zip(self.columns, self))
+
+
+def _is_multi(path: Tuple) -> bool:
+    return bool(path) and isinstance(path[0], tuple)
+
+
+class CompiledSchema:
+    """
+    Row builder compiled once from a list of fields.
+
+    The fields are turned into the source of a single function, compiled
+    with exec. Every object on the paths is read once into a local, so
+    data["property"] is looked up once for all the columns below it. A row
+    then costs one call, with no per-field dispatch and no second walk of the
+    JSON to test for None.
+    """
+    def __init__(self, fields: List[Field], missing: Any = _USE_DEFAULT) -> None:
+        """
+        Args:
+            fields (List[Field]): Columns of the rows, in order.
+            missing (Any): Value of a column whose key is absent from the data (default is the default of the
+                field, so absent keys never fail a row).
+        """
+        self.fields = list(fields)
+        columns = tuple(field.column for field in self.fields)
+        self.record_type = type("Record", (Record,), {
+            "__slots__": (),
+            "columns": columns,
+            "positions": {column: position for position, column in enumerate(columns)},
+        })
+        namespace: Dict[str, Any] = {"MISSING": MISSING, "Record": self.record_type}
+        lines = ["def build(data):"]
+        names: Dict[Tuple, str] = {(): "data"}
+
+        def read(path: Tuple) -> str:
+            # Emit the lookup of every object on the path not read yet, and return the local holding the value.
+            for depth in range(1, len(path) + 1):
+                prefix = path[:depth]
+                if prefix in names:
+                    continue
+                name = names[prefix] = f"o{len(names)}"
+                lines.extend([
+                    "    try:",
+                    f"        {name} = {names[prefix[:-1]]}[{prefix[-1]!r}]",
+                    "    except (KeyError, IndexError):",
+                    f"        {name} = MISSING",
+                    "    except TypeError:",
+                    f"        {name} = None",
+                ])
+            return names[path]
+
+        for i, field in enumerate(self.fields):
+            namespace[f"d{i}"] = field.default
+            namespace[f"m{i}"] = field.default if missing is _USE_DEFAULT else missing
+            namespace[f"t{i}"] = field.transform
+            if field.path is None:
+                lines.append(f"    v{i} = d{i}")
+                continue
+            paths = field.path if _is_multi(field.path) else (field.path,)
+            values = [read(tuple(path)) for path in paths]
+            absent = " or ".join(f"{value} is MISSING" for value in values)
+            if _is_multi(field.path):
+                lines.append(f"    v{i} = m{i} if {absent} else t{i}({', '.join(values)})")
+            elif field.transform is not None:
+                lines.append(f"    v{i} = m{i} if {absent} else d{i} if {values[0]} is None else t{i}({values[0]})")
+            else:
+                lines.append(f"    v{i} = m{i} if {absent} else d{i} if {values[0]} is None else {values[0]}")
+        values = ", ".join(f"v{i}" for i in range(len(self.fields)))
+        lines.append(f"    return Record(({values},))")
+        self.source = "\n".join(lines)
+        exec(compile(self.source, f"<schema {columns[0] if columns else ''}>", "exec"), namespace)
+        self.build: Callable[[Dict[str, Any]], Record] = namespace["build"]
+
+    def __call__(self, data: Dict[str, Any]) -> Record:
+        """
+        Build the row of a listing.
+
+        Args:
+            data (Dict[str, Any]): JSON data of the listing.
+
+        Returns:
+            Record: Values of the columns.
+        """
+        return self.build(data)
+
+
+def rent_price(monthly_rent: Optional[float], monthly_costs: Optional[float]) -> Any:
+    """
+    Add the monthly costs to the rent, or give False when either is unknown or zero.
+    """
+    return monthly_rent + monthly_costs if (monthly_rent and monthly_costs) else False
+
+
+def listing_fields(type_of_sale: str) -> List[Field]:
+    """
+    Get the fields of the CSV row of a listing.
+
+    Args:
+        type_of_sale (str): Type of sale ("sale" or "rent").
+
+    Returns:
+        List[Field]: Fields of the 16 columns.
+    """
+    if type_of_sale == "rent":
+        price = Field("Price", (
+            ("transaction", "rental", "monthlyRentalPrice"),
+            ("transaction", "rental", "monthlyRentalCosts"),
+        ), transform=rent_price)
+        furnished = Field("Furnished", ("transaction", "rental", "isFurnished"), default=None)
+    else:
+        price = Field("Price", ("transaction", "sale", "price"))
+        furnished = Field("Furnished", ("transaction", "sale", "isFurnished"), default=None)
+    return [
+        Field("Locality", ("property", "location", "postalCode")),
+        Field("Type of property", ("property", "type")),
+        Field("Subtype of property", ("property", "subtype")),
+        price,
+        Field("Type of sale", None, default=type_of_sale),
+        Field("Bedrooms", ("property", "bedroomCount")),
+        Field("Living area", ("property", "netHabitableSurface")),
+        Field("Kitchen type", ("property", "kitchen", "type")),
+        furnished,
+        Field("How many fireplaces?", ("property", "fireplaceCount")),
+        Field("Terrace surface", ("property", "terraceSurface")),
+        Field("Garden surface", ("property", "gardenSurface")),
+        Field("Surface of the plot", ("property", "netHabitableSurface")),
+        Field("Number of frontages", ("property", "building", "facadeCount")),
+        Field("Swimming pool", ("property", "hasSwimmingPool")),
+        Field("Building condition", ("property", "building", "condition")),
+    ]
@@ -4,6 +4,7 @@ import re
 import pandas as pd
 from typing import List, Dict
 import os
+from Utils.extract import extract_table
 
 
 def price(url: str) -> str:
@@ -108,7 +109,7 @@ def extract_number(value: str) -> float | str:
         return int(match.group(1))
     return value
 
-def get_other_info(soup) -> Dict[str, str | int | None | bool]:
+def get_other_info(content: bytes) -> Dict[str, str | int | None | bool]:
     property_other = {
         "Bedrooms": 0,
         "Living area": 0,
@@ -122,28 +123,22 @@ def get_other_info(soup) -> Dict[str, str | int | None | bool]:
         "Swimming pool": False,
     }
 
-    all_info = soup.find_all('div', class_='text-block') + soup.find_all('div', class_='accordion__content')
-    for i in all_info:
-        headers = i.find_all('th', class_='classified-table__header')
-        data = i.find_all('td', class_='classified-table__data')
-        for th, td in zip(headers, data):
-            key = re.sub('<[^<]+?>', '', str(th)).strip()
-            value = re.sub('<[^<]+?>', '', str(td)).strip()
-            if key in property_other:
-                if key == "Terrace surface":
-                    property_other["Terrace surface"]["Area"] = extract_number(value)
-                    property_other["Terrace surface"]["Present"] = True
-                elif key == "Garden surface":
-                    property_other["Garden surface"]["Area"] = extract_number(value)
-                    property_other["Garden surface"]["Present"] = True
-                else:
-                    if key == "Kitchen type":
-                        value = (True if value == "Installed" else False)
-                    elif value == "Yes":
-                        value = True
-                    elif value == "No":
-                        value = False
-                    property_other[key] = value if type(value) == bool else extract_number(value)
+    for key, value in extract_table(content).items():
+        if key in property_other:
+            if key == "Terrace surface":
+                property_other["Terrace surface"]["Area"] = extract_number(value)
+                property_other["Terrace surface"]["Present"] = True
+            elif key == "Garden surface":
+                property_other["Garden surface"]["Area"] = extract_number(value)
+                property_other["Garden surface"]["Present"] = True
+            else:
+                if key == "Kitchen type":
+                    value = (True if value == "Installed" else False)
+                elif value == "Yes":
+                    value = True
+                elif value == "No":
+                    value = False
+                property_other[key] = value if type(value) == bool else extract_number(value)
     return property_other
 
 def scrap(localite_cp: List[str], price: int, url: str) -> None:
@@ -151,8 +146,7 @@ def scrap(localite_cp: List[str], price: int, url: str) -> None:
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, comme Gecko) Chrome/91.0.4472.124 Safari/537.36'
     }
     link = requests.get(url, headers=headers)
-    soup = bs(link.content, 'html.parser')
-    other = get_other_info(soup)
+    other = get_other_info(link.content)
     save_init_dic_building(localite_cp, [None, None], price, "None", other, "None", "all.xlsx")
 
 if __name__ == "__main__":
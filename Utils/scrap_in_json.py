@@ -1,38 +1,180 @@
-import requests
 from bs4 import BeautifulSoup as bs
 import re
 import pandas as pd
-from typing import List, Dict, Any
-import os
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Any, Optional, Tuple, Callable
+from concurrent.futures import Future, ThreadPoolExecutor
 import json
 import threading
-import csv
+import asyncio
+import queue
+import itertools
+from Utils.extract import ExtractionError, extract_classified, extract_search_results, classified_from_table
+from Utils.writer import BatchWriter, make_sink
+from Utils.http_cache import ResponseCache, CachingAdapter
+from Utils.crawl_state import CrawlState, classified_id
+from Utils.checkpoint import Checkpoint
+from Utils.concurrency import AdaptiveLimiter, ThrottledSession
+from Utils.dedup import Deduplicator, ExactDeduplicator
+from Utils.metrics import Metrics, StatsServer
+from Utils.transport import make_transport, transport_stats
+from Utils.lite import DetailPolicy
+from Utils.schema import CompiledSchema, Record, listing_fields
+from Utils.parse_pool import ParsePool
+from Utils.retry import RetryPolicy, RetryQueue, DeadLetterStore
+from Utils.pagination import MAX_PAGES, SearchPlanner
+from Utils.archive import PageArchive
+
+_SCHEMAS: Dict[str, CompiledSchema] = {}
+
+
+def parse_listing(content: bytes, url: str, type_of_sale: str) -> Tuple[Optional[str], Tuple]:
+    """
+    Parse a detail page into the classified ID and the values of its row, in a process of the parse pool.
+
+    Args:
+        content (bytes): Raw HTML of the property detail page.
+        url (str): URL of the property detail page.
+        type_of_sale (str): Type of sale ("sale" or "rent").
+
+    Returns:
+        Tuple[Optional[str], Tuple]: Classified ID and values of the columns, in the order of listing_fields.
+    """
+    schema = _SCHEMAS.get(type_of_sale)
+    if schema is None:
+        schema = _SCHEMAS[type_of_sale] = CompiledSchema(listing_fields(type_of_sale))
+    data = ImmowebScraper.parse_json_data(content, url)
+    cid = str(data["id"]) if data.get("id") is not None else classified_id(url)
+    return cid, tuple(schema(data))
 
-file_lock = threading.Lock()
 
 class ImmowebScraper:
     """
     A scraper class to extract property data from Immoweb for sale and rent listings.
     """
-    def __init__(self, base_url: str, headers: Dict[str, str], output_file: str, type_of_sale: str, count: int = 0) -> None:
+    def __init__(
+            self,
+            base_url: str,
+            headers: Dict[str, str],
+            output_file: str,
+            type_of_sale: str,
+            count: int = 0,
+            cache_dir: Optional[str] = None,
+            cache_size: int = 1 << 30,
+            state_file: Optional[str] = None,
+            recrawl_after: float = 86400,
+            checkpoint_file: Optional[str] = None,
+            max_concurrency: int = 20,
+            session: Optional[ThrottledSession] = None,
+            writer: Optional[BatchWriter] = None,
+            deduplicator: Optional[Deduplicator] = None,
+            metrics: Optional[Metrics] = None,
+            stats_port: Optional[int] = None,
+            transport: str = "http1",
+            lite: bool = False,
+            detail_policy: Optional[DetailPolicy] = None,
+            store_file: Optional[str] = None,
+            parser_cores: int = 0,
+            parse_pool: Optional[ParsePool] = None,
+            dead_letter_file: Optional[str] = None,
+            retry_policies: Optional[Dict[str, RetryPolicy]] = None,
+            max_pages: int = MAX_PAGES,
+            archive_dir: Optional[str] = None,
+            archive: Optional[PageArchive] = None
+    ) -> None:
         """
         Constructor for initializing the scraper class.
 
         Args:
             base_url (str): Base URL for property search.
             headers (Dict[str, str]): HTTP headers for requests.
-            output_file (str): Path to the CSV file for saving data.
+            output_file (str): Path to the CSV file for saving data, or to a partitioned Parquet dataset if it
+                ends in .parquet.
             type_of_sale (str): Type of sale ("sale" or "rent").
             count (int): Counter for properties (default is 0).
+            cache_dir (Optional[str]): Directory of the on-disk cache of detail pages (default is no cache).
+            cache_size (int): Maximum size of the cache in bytes (default is 1 GiB).
+            state_file (Optional[str]): SQLite crawl state keyed by classified ID (default is no state). A new state
+                is seeded with the rows of an existing CSV output_file, so rebuilding the file keeps them.
+            recrawl_after (float): Seconds after which a known listing is scraped again (default is one day).
+            checkpoint_file (Optional[str]): JSON checkpoint of the threaded pipeline (default is no checkpoint).
+            max_concurrency (int): Upper bound of the adaptive limit on requests in flight (default is 20).
+            session (Optional[ThrottledSession]): Session shared with other scrapers, with its connection pool
+                and limiter (default is a new session).
+            writer (Optional[BatchWriter]): Started writer shared with other scrapers for output_file, closed by
+                its owner (default is a writer of this scraper).
+            deduplicator (Optional[Deduplicator]): Drops listings already found on another page or search
+                (default is an exact set for this scraper).
+            metrics (Optional[Metrics]): Per-stage metrics shared with other scrapers (default is metrics of this
+                scraper).
+            stats_port (Optional[int]): Serve the metrics on localhost at /metrics and /stats during the run
+                (default is no endpoint).
+            transport (str): "http1" for a keep-alive pool sized to max_concurrency, "http2" for httpx with HTTP/2
+                multiplexing. Ignored with a shared session, which brings its own transport.
+            lite (bool): Build rows from the listing summaries embedded in search pages, and only fetch the detail
+                pages the policy asks for (default is a detail fetch per listing).
+            detail_policy (Optional[DetailPolicy]): Decides which partial rows need their detail page in lite mode
+                (default is a fetch when the locality, type or price is missing).
+            store_file (Optional[str]): Indexed SQLite listing store (.db) filled alongside output_file, see
+                Utils/listing_store.py (default is no store).
+            parser_cores (int): Number of processes parsing the detail pages, so parsing is not bound to the core
+                of the fetch threads (default is 0, parsing in the fetch threads).
+            parse_pool (Optional[ParsePool]): Started pool of parse_listing shared with other scrapers, closed by
+                its owner (default is a pool of parser_cores processes for this scraper).
+            dead_letter_file (Optional[str]): JSONL file recording the URLs that failed every retry, see
+                retry_dead_letters (default is counting them only).
+            retry_policies (Optional[Dict[str, RetryPolicy]]): Retry policy per error class, overriding
+                Utils.retry.DEFAULT_POLICIES.
+            max_pages (int): Number of pages the site shows at most for a search. A search with more results is
+                split by province, then by price, until every part fits (default is 333). Listings with the price
+                on request are only covered best-effort once a price split is needed, see SearchPlanner.
+            archive_dir (Optional[str]): Directory of an append-only archive of the raw detail pages, to extract
+                them again offline with Utils.archive.reextract (default is no archive). Rows built from search
+                summaries in lite mode have no detail page, so they are not archived.
+            archive (Optional[PageArchive]): Archive shared with other scrapers, instead of archive_dir.
         """
         self.base_url = base_url
         self.headers = headers
         self.output_file = output_file
         self.type_of_sale = type_of_sale
         self.counter = count
-        self.session = requests.Session()
-        self.session.headers.update(headers)
+        self.counter_lock = threading.Lock()
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.stats_port = stats_port
+        if session is None:
+            limiter = AdaptiveLimiter(initial=min(10, max_concurrency), maximum=max_concurrency)
+            session = ThrottledSession(limiter, transport=make_transport(transport, max_concurrency))
+            session.headers.update(headers)
+        self.session = session
+        self.limiter = session.limiter
+        self.cache = None
+        if cache_dir is not None:
+            self.cache = ResponseCache(cache_dir, cache_size)
+            adapter = CachingAdapter(self.cache, should_cache=lambda url: "/classified/" in url, transport=self.session.transport)
+            self.session.mount("https://", adapter)
+            self.session.mount("http://", adapter)
+        self.state = CrawlState(state_file) if state_file is not None else None
+        self.recrawl_after = recrawl_after
+        self.checkpoint_file = checkpoint_file
+        self.shared_writer = writer
+        self.deduplicator = deduplicator if deduplicator is not None else ExactDeduplicator()
+        self.writers: Dict[str, BatchWriter] = {}
+        self.writers_lock = threading.Lock()
+        self.lite = lite
+        self.detail_policy = detail_policy if detail_policy is not None else DetailPolicy()
+        self.schema = CompiledSchema(listing_fields(type_of_sale))
+        self.partial_schema = CompiledSchema(listing_fields(type_of_sale), missing=None)
+        self.store_file = store_file
+        self.shared_parse_pool = parse_pool
+        self.parse_pool = parse_pool
+        if parse_pool is None and parser_cores > 0:
+            self.parse_pool = ParsePool(parse_listing, parser_cores, metrics=self.metrics)
+        self.dead_letters = DeadLetterStore(dead_letter_file) if dead_letter_file is not None else None
+        self.retry_policies = retry_policies
+        self.max_pages = max_pages
+        self.first_pages: Dict[str, bytes] = {}
+        self.order_by = "relevance"
+        self.archive = archive if archive is not None else (PageArchive(archive_dir) if archive_dir is not None else None)
+        self.emit_changes = False
 
     def get_links(self, page: int) -> List[str]:
         """
@@ -44,10 +186,103 @@ class ImmowebScraper:
         Returns:
             List[str]: List of property links.
         """
-        response = self.session.get(f'{self.base_url}&page={page}&orderBy=relevance')
-        soup = bs(response.content, 'html.parser')
+        return self.parse_links(self.fetch_search_page(page))
+
+    def get_listings(self, page: int, query: Optional[str] = None) -> List[Tuple[str, Optional[Dict[str, Any]]]]:
+        """
+        Get property links from a search result page, with their summary in lite mode.
+
+        Args:
+            page (int): Page number to scrape.
+            query (Optional[str]): Search URL of a partition (default is base_url).
+
+        Returns:
+            List[Tuple[str, Optional[Dict[str, Any]]]]: Property links with their JSON summary, or None.
+        """
+        return self.parse_listings(self.fetch_search_page(page, query))
+
+    def fetch_search_page(self, page: int, query: Optional[str] = None) -> bytes:
+        """
+        Fetch a search result page, or take the first page already fetched by plan_search.
+
+        Args:
+            page (int): Page number to fetch.
+            query (Optional[str]): Search URL of a partition (default is base_url).
+
+        Returns:
+            bytes: Raw HTML of the search result page.
+        """
+        query = query or self.base_url
+        content = self.first_pages.pop(query, None) if page == 1 else None
+        if content is not None:
+            return content
+        with self.metrics.time("search_fetch"):
+            response = self.session.get(self.page_url(page, query))
+            response.raise_for_status()
+        self.metrics.count("bytes_downloaded", len(response.content))
+        return response.content
+
+    def page_url(self, page: int, query: Optional[str] = None) -> str:
+        """
+        Build the URL of a search result page.
+
+        Args:
+            page (int): Page number.
+            query (Optional[str]): Search URL of a partition (default is base_url).
+
+        Returns:
+            str: URL of the search result page.
+        """
+        return f'{query or self.base_url}&page={page}&orderBy={self.order_by}'
+
+    def plan_search(self) -> Optional[List[Tuple[str, int]]]:
+        """
+        Plan every search page from the result count of the first page, splitting the search if it is too deep.
+
+        The first page of every partition is kept for fetch_search_page.
+
+        Returns:
+            Optional[List[Tuple[str, int]]]: Search URL and number of pages of every partition, or None if the
+                first page has no result count.
+        """
+        planner = SearchPlanner(lambda query: self.fetch_search_page(1, query), max_pages=self.max_pages, metrics=self.metrics)
+        plan = planner.plan(self.base_url)
+        self.first_pages.update(planner.first_pages)
+        return plan
+
+    @staticmethod
+    def parse_links(content: bytes) -> List[str]:
+        """
+        Parse property links out of a search result page.
+
+        Args:
+            content (bytes): Raw HTML of the search result page.
+
+        Returns:
+            List[str]: List of property links.
+        """
+        soup = bs(content, 'html.parser')
         links = [a['href'] for a in soup.find_all('a', class_="card__title-link")]
-        return links        
+        return links
+
+    def parse_listings(self, content: bytes) -> List[Tuple[str, Optional[Dict[str, Any]]]]:
+        """
+        Parse property links out of a search result page and, in lite mode, pair them with their summary.
+
+        Summaries come from the results JSON embedded in the page and are
+        matched to links by classified ID.
+
+        Args:
+            content (bytes): Raw HTML of the search result page.
+
+        Returns:
+            List[Tuple[str, Optional[Dict[str, Any]]]]: Property links with their JSON summary, or None.
+        """
+        links = self.parse_links(content)
+        if not self.lite:
+            return [(link, None) for link in links]
+        summaries = {str(result.get("id")): result for result in extract_search_results(content) or []}
+        return [(link, summaries.get(classified_id(link))) for link in links]
 
     def extract_json_data(self, url: str) -> Dict[str, Any]:
         """
@@ -59,10 +294,76 @@ class ImmowebScraper:
         Returns:
             Dict[str, Any]: JSON data of the property.
         """
-        response = self.session.get(url)
-        soup = bs(response.content, 'html.parser')
+        content = self.fetch_detail(url)
+        with self.metrics.time("extract"):
+            return self.parse_json_data(content, url)
+
+    def fetch_detail(self, url: str) -> bytes:
+        """
+        Fetch the raw HTML of a property detail page.
+
+        Args:
+            url (str): URL of the property detail page.
+
+        Returns:
+            bytes: Raw HTML of the page.
+        """
+        with self.metrics.time("detail_fetch"):
+            response = self.session.get(url)
+            response.raise_for_status()
+        self.metrics.count("bytes_downloaded", len(response.content))
+        if self.archive is not None:
+            with self.metrics.time("archive"):
+                self.archive.add(url, response.content, self.type_of_sale)
+        return response.content
+
+    @staticmethod
+    def parse_json_data(content: bytes, url: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Parse the window.classified JSON out of a property detail page.
+
+        The raw bytes are scanned first, BeautifulSoup is only used when the
+        fast path cannot find the payload. A page without the script falls
+        back to the classified-table rows and the URL, so the listing is
+        saved with the columns they carry instead of being lost.
+
+        Args:
+            content (bytes): Raw HTML of the property detail page.
+            url (Optional[str]): URL of the property detail page.
+
+        Returns:
+            Dict[str, Any]: JSON data of the property.
+
+        Raises:
+            ExtractionError: The page has neither the script nor the table.
+        """
+        json_data = extract_classified(content)
+        if json_data is not None:
+            return json_data
+        json_data = ImmowebScraper.parse_json_data_soup(content)
+        if json_data:
+            return json_data
+        json_data = classified_from_table(content, url)
+        if json_data is None:
+            raise ExtractionError(f"No listing data in {url or 'the page'}")
+        return json_data
+
+    @staticmethod
+    def parse_json_data_soup(content: bytes) -> Dict[str, Any]:
+        """
+        Parse the window.classified JSON out of a property detail page with BeautifulSoup.
+
+        Args:
+            content (bytes): Raw HTML of the property detail page.
+
+        Returns:
+            Dict[str, Any]: JSON data of the property.
+        """
+        soup = bs(content, 'html.parser')
         script_tag = soup.find('div', class_="classified")
-        script = script_tag.find('script', text=re.compile('window.classified'))
+        script = script_tag and script_tag.find('script', text=re.compile('window.classified'))
+        if script is None or script.string is None:
+            return {}
         script_content = script.string
         json_data_match = re.search(r'window\.classified\s*=\s*({.*});', script_content, re.DOTALL)
         if json_data_match:
@@ -70,91 +371,740 @@ class ImmowebScraper:
             return json_data
         return {}
 
-    def save_data(self, data: Dict[str, Any], filename: str) -> None:
+    def save_data(self, data: Dict[str, Any], filename: str, url: Optional[str] = None) -> None:
         """
-        Save extracted property data to a CSV file.
+        Queue extracted property data for the writer of a CSV file.
+
+        With a crawl state, the row is upserted in the state instead, and the
+        CSV file is rebuilt from it at the end of the run.
 
         Args:
             data (Dict[str, Any]): Property data.
             filename (str): Path to the CSV file.
+            url (Optional[str]): URL of the property detail page.
         """
-        self.counter += 1
-        print(self.counter)
-
-        if self.type_of_sale == "sale":
-            price = data["transaction"]["sale"]["price"] if data["transaction"]["sale"]["price"] is not None else False
-        elif self.type_of_sale == "rent":
-            monthly_rent = data["transaction"]["rental"]["monthlyRentalPrice"] if data["transaction"]["rental"]["monthlyRentalPrice"] is not None else 0
-            monthly_costs = data["transaction"]["rental"]["monthlyRentalCosts"] if data["transaction"]["rental"]["monthlyRentalCosts"] is not None else 0
-            price = monthly_rent + monthly_costs if (monthly_rent and monthly_costs) else False
-
-        property_info = {
-            "Locality": data["property"]["location"]["postalCode"] if data["property"]["location"]["postalCode"] is not None else False,
-            "Type of property": data["property"]["type"] if data["property"]["type"] is not None else False,
-            "Subtype of property": data["property"]["subtype"] if data["property"]["subtype"] is not None else False,
-            "Price": price,
-            "Type of sale": self.type_of_sale,
-            "Bedrooms": data["property"]["bedroomCount"] if data["property"]["bedroomCount"] is not None else False,
-            "Living area": data["property"]["netHabitableSurface"] if data["property"]["netHabitableSurface"] is not None else False,
-            "Kitchen type": data["property"]["kitchen"]["type"] if data["property"]["kitchen"]["type"] is not None else False,
-            "Furnished": data["transaction"]["rental"]["isFurnished"] if self.type_of_sale == "rent" else data["transaction"]["sale"]["isFurnished"],
-            "How many fireplaces?": data["property"]["fireplaceCount"] if data["property"]["fireplaceCount"] is not None else False,
-            "Terrace surface": data["property"]["terraceSurface"] if data["property"]["terraceSurface"] is not None else False,
-            "Garden surface": data["property"]["gardenSurface"] if data["property"]["gardenSurface"] is not None else False,
-            "Surface of the plot": data["property"]["netHabitableSurface"] if data["property"]["netHabitableSurface"] is not None else False,
-            "Number of frontages": data["property"]["building"]["facadeCount"] if data["property"]["building"]["facadeCount"] is not None else False,
-            "Swimming pool": data["property"]["hasSwimmingPool"] if data["property"]["hasSwimmingPool"] is not None else False,
-            "Building condition": data["property"]["building"]["condition"] if data["property"]["building"]["condition"] is not None else False
-        }
+        with self.metrics.time("build"):
+            property_info = self.build_property_info(data)
+        cid = str(data["id"]) if data.get("id") is not None else (url and classified_id(url))
+        self.save_row(property_info, filename, cid, url)
+
+    def save_row(self, property_info: Record, filename: str, cid: Optional[str], url: Optional[str]) -> None:
+        """
+        Queue a row for the writer of a CSV file, or upsert it in the crawl state.
 
-        with file_lock:
-            file_exists = os.path.isfile(filename)
-            is_empty = not file_exists or os.path.getsize(filename) == 0
+        During a sweep, rows upserted as new or changed are also queued for
+        the writer, so the file only receives what the sweep found.
 
-            with open(filename, 'a', newline='') as file:
-                writer = csv.writer(file)
+        Args:
+            property_info (Record): Column name to value mapping.
+            filename (str): Path to the CSV file.
+            cid (Optional[str]): Classified ID of the property.
+            url (Optional[str]): URL of the property detail page.
+        """
+        with self.counter_lock:
+            self.counter += 1
+        self.metrics.count("rows")
+        if self.state is not None and cid:
+            status = self.state.upsert(cid, url, property_info.as_dict())
+            if self.emit_changes and status != "unchanged":
+                self.get_writer(filename).put(property_info)
+        else:
+            self.get_writer(filename).put(property_info)
+        if self.store_file is not None:
+            self.get_writer(self.store_file).put(dict(property_info.items(), classified_id=cid))
 
-                if is_empty:
-                    writer.writerow(property_info.keys())
+    def is_fresh(self, url: str) -> bool:
+        """
+        Tell whether a listing is known to the crawl state and was scraped recently.
+
+        Args:
+            url (str): URL of the property detail page.
+
+        Returns:
+            bool: True if the listing can be skipped.
+        """
+        if self.state is None:
+            return False
+        cid = classified_id(url)
+        if cid is None or not self.state.is_fresh(cid, self.recrawl_after):
+            return False
+        self.state.skip()
+        return True
 
-                writer.writerow(property_info.values())
+    def get_writer(self, filename: str) -> BatchWriter:
+        """
+        Get the batched writer of a CSV file, starting it on first use.
+
+        Args:
+            filename (str): Path to the CSV file.
+
+        Returns:
+            BatchWriter: Writer appending rows to the file.
+        """
+        if self.shared_writer is not None and filename == self.output_file:
+            return self.shared_writer
+        with self.writers_lock:
+            writer = self.writers.get(filename)
+            if writer is None:
+                writer = BatchWriter(make_sink(filename), metrics=self.metrics, name=f"writer:{filename}")
+                writer = self.writers[filename] = writer.start()
+            return writer
+
+    def close_writers(self) -> None:
+        """
+        Flush and close every writer started by save_data.
+        """
+        with self.writers_lock:
+            writers = list(self.writers.values())
+            self.writers.clear()
+        for writer in writers:
+            writer.close()
+
+    def flush_writers(self) -> None:
+        """
+        Block until every row queued so far is written to its file.
+        """
+        with self.writers_lock:
+            writers = list(self.writers.values())
+        if self.shared_writer is not None:
+            writers.append(self.shared_writer)
+        for writer in writers:
+            writer.flush()
+
+    def build_property_info(self, data: Dict[str, Any]) -> Record:
+        """
+        Build the CSV row of a property from its JSON data.
+
+        The columns are declared in Utils/schema.py. A missing or null value
+        gives False instead of failing the row.
+
+        Args:
+            data (Dict[str, Any]): Property data.
+
+        Returns:
+            Record: Column name to value mapping, as a compact tuple.
+        """
+        return self.schema(data)
+
+    def build_partial_info(self, summary: Dict[str, Any]) -> Record:
+        """
+        Build a partial CSV row from the summary of a listing on a search page.
+
+        Columns the summary does not carry are None, see DetailPolicy.
+
+        Args:
+            summary (Dict[str, Any]): JSON summary of the listing.
+
+        Returns:
+            Record: Column name to value mapping, as a compact tuple.
+        """
+        return self.partial_schema(summary)
 
-    def scrap(self, url: str) -> None:
+    def summary_changed(self, cid: str, summary: Optional[Dict[str, Any]]) -> bool:
+        """
+        Tell whether the summary of a known listing on a search page disagrees with its record in the crawl state.
+
+        Only the columns the summary carries are compared, e.g. a new price.
+
+        Args:
+            cid (str): Classified ID.
+            summary (Optional[Dict[str, Any]]): JSON summary of the listing on the search page.
+
+        Returns:
+            bool: True if the listing must be scraped again.
+        """
+        if summary is None:
+            return False
+        record = self.state.record(cid)
+        if record is None:
+            return False
+        partial = self.build_partial_info(summary)
+        return any(value is not None and value is not False and record.get(column) != value for column, value in partial.items())
+
+    def harvest(self, url: str, summary: Optional[Dict[str, Any]]) -> bool:
+        """
+        In lite mode, save the partial row of a listing unless the policy asks for its detail page.
+
+        Args:
+            url (str): URL of the property detail page.
+            summary (Optional[Dict[str, Any]]): JSON summary of the listing on the search page.
+
+        Returns:
+            bool: True if the listing is done, False if its detail page must be scraped.
+        """
+        if not self.lite or summary is None:
+            return False
+        if self.is_fresh(url):
+            return True
+        with self.metrics.time("build"):
+            property_info = self.build_partial_info(summary)
+        if self.detail_policy.needs_detail(property_info):
+            self.metrics.count("detail_needed")
+            return False
+        self.metrics.count("harvested")
+        cid = str(summary["id"]) if summary.get("id") is not None else classified_id(url)
+        self.save_row(property_info, self.output_file, cid, url)
+        return True
+
+    def parse_in_pool(self, content: bytes, url: str) -> Future:
+        """
+        Hand a detail page to the parse pool and save its row once parsed.
+
+        Args:
+            content (bytes): Raw HTML of the property detail page.
+            url (str): URL of the property detail page.
+
+        Returns:
+            Future: Resolves once the row is saved, or to the error of the parsing or of the saving.
+        """
+        saved = Future()
+
+        def save(parsed: Future) -> None:
+            try:
+                cid, values = parsed.result()
+                self.save_row(self.schema.record_type(values), self.output_file, cid, url)
+            except Exception as e:
+                saved.set_exception(e)
+            else:
+                saved.set_result(None)
+
+        self.parse_pool.submit(content, url, self.type_of_sale, callback=save)
+        return saved
+
+    def scrap(self, url: str) -> Optional[Future]:
         """
         Scrape data from a property URL and save it.
 
+        With a parse pool, the page is handed over once fetched and the row is
+        saved later, without waiting for the parsing.
+
         Args:
             url (str): URL of the property detail page.
+
+        Returns:
+            Optional[Future]: Resolves once the row is saved when the page went to the parse pool, else None.
         """
+        if self.is_fresh(url):
+            return None
+        if self.parse_pool is not None:
+            return self.parse_in_pool(self.fetch_detail(url), url)
         data = self.extract_json_data(url)
-        self.save_data(data, self.output_file)
+        self.save_data(data, self.output_file, url)
+        return None
+
+    def retry_queue(self, on_done: Optional[Callable[[str, Optional[BaseException]], None]] = None) -> RetryQueue:
+        """
+        Build the retry queue of a run, retrying with attempt and recording dead letters in dead_letter_file.
+
+        Args:
+            on_done (Optional[Callable[[str, Optional[BaseException]], None]]): Called with the URL and the error,
+                or None, after every attempt.
+
+        Returns:
+            RetryQueue: Queue to start, fed by attempt.
+        """
+        retries = RetryQueue(
+            lambda url, number: self.attempt(url, number, retries, on_done),
+            self.retry_policies, self.dead_letters, self.metrics,
+            context={"base_url": self.base_url, "type_of_sale": self.type_of_sale}
+        )
+        return retries
+
+    def attempt(
+            self,
+            url: str,
+            number: int,
+            retries: RetryQueue,
+            on_done: Optional[Callable[[str, Optional[BaseException]], None]] = None
+    ) -> None:
+        """
+        Scrape a property URL, handing it to the retry queue if it fails.
+
+        Args:
+            url (str): URL of the property detail page.
+            number (int): Number of the attempt, 1 for the first.
+            retries (RetryQueue): Queue of the failed URLs.
+            on_done (Optional[Callable[[str, Optional[BaseException]], None]]): Called with the URL and the error,
+                or None, once the row is saved or the attempt failed.
+        """
+        def finish(error: Optional[BaseException]) -> None:
+            if on_done is not None:
+                on_done(url, error)
+            if error is None:
+                retries.done(url, number)
+            else:
+                retries.fail(url, error, number)
+
+        try:
+            saved = self.scrap(url)
+        except Exception as e:
+            finish(e)
+            return
+        if saved is None:
+            finish(None)
+        else:
+            saved.add_done_callback(lambda saved: finish(saved.exception()))
+
+    def drain(self, retries: RetryQueue) -> None:
+        """
+        Block until the pages handed to the parse pool are saved and every failed URL is retried or buried.
+
+        A page failing to parse only reaches the retry queue once the pool
+        returns it, so the pool is flushed before the queue is joined, in turn
+        until neither has work left.
+
+        Args:
+            retries (RetryQueue): Retry queue of the run.
+        """
+        while True:
+            if self.parse_pool is not None:
+                self.parse_pool.flush()
+            retries.join()
+            if self.parse_pool is None or self.parse_pool.pending == 0:
+                return
 
     def scrape_links(self, links: List[str]) -> None:
         """
         Scrape multiple property links concurrently.
 
+        Failed links are retried according to their policy, and the ones that
+        fail every attempt go to the dead letters.
+
         Args:
             links (List[str]): List of property links to scrape.
         """
-        with ThreadPoolExecutor(max_workers=20) as executor:
-            futures = [executor.submit(self.scrap, link) for link in links]
-            for future in as_completed(futures):
+        with self.retry_queue() as retries:
+            with ThreadPoolExecutor(max_workers=self.limiter.maximum) as executor:
+                for link in links:
+                    executor.submit(self.attempt, link, 1, retries)
+            self.drain(retries)
+
+    def run_scraper(
+            self,
+            engine: str = "thread",
+            max_in_flight: int = 200,
+            workers: Optional[int] = None,
+            discovery_workers: int = 2,
+            queue_size: int = 200,
+            resume: bool = False
+    ) -> None:
+        """
+        Run the scraper for multiple pages until the last page.
+
+        Args:
+            engine (str): "thread" for the threaded pipeline, "async" for the asyncio engine.
+            max_in_flight (int): Maximum number of concurrent requests for the async engine.
+            workers (Optional[int]): Number of detail workers for the threaded pipeline (default is max_concurrency).
+            discovery_workers (int): Number of search page workers for the threaded pipeline.
+            queue_size (int): Maximum number of links waiting between discovery and detail workers.
+            resume (bool): Continue from the checkpoint file of the threaded pipeline.
+        """
+        if engine not in ("thread", "async"):
+            raise ValueError(f"Unknown engine: {engine}")
+        if resume and (engine != "thread" or self.checkpoint_file is None):
+            raise ValueError("resume needs the thread engine and a checkpoint_file")
+
+        if engine == "async":
+            self.run(lambda: asyncio.run(self.run_scraper_async(max_in_flight)))
+        else:
+            self.run(lambda: self.run_pipeline(workers or self.limiter.maximum, discovery_workers, queue_size, resume))
+
+    def run_sweep(self, stop_after: int = 30) -> None:
+        """
+        Scrape the listings published since the last run, newest first, and write only the new or changed ones.
+
+        Needs a crawl state holding the listings already scraped. The output
+        file receives the rows upserted as new or changed, it is not rebuilt
+        from the state.
+
+        Args:
+            stop_after (int): Number of consecutive known listings after which the sweep stops paginating (default
+                is one search page).
+        """
+        if self.state is None:
+            raise ValueError("run_sweep needs a state_file")
+        self.order_by = "newest"
+        self.emit_changes = True
+        self.run(lambda: self.sweep(stop_after), export=False)
+
+    def sweep(self, stop_after: int) -> None:
+        """
+        Walk the search pages ordered by newest until stop_after consecutive cards are known to the crawl state.
+
+        Unknown listings are scraped. A known listing is only scraped again
+        when its summary on the search page disagrees with its record.
+
+        Args:
+            stop_after (int): Number of consecutive known listings after which the sweep stops paginating.
+        """
+        known = 0
+        with self.retry_queue() as retries:
+            with ThreadPoolExecutor(max_workers=self.limiter.maximum) as executor:
+                for page in range(1, self.max_pages + 1):
+                    content = self.fetch_search_page(page)
+                    links = self.parse_links(content)
+                    if not links:
+                        break
+                    self.metrics.count("sweep_pages")
+                    summaries = {str(result.get("id")): result for result in extract_search_results(content) or []}
+                    for link in links:
+                        cid = classified_id(link)
+                        summary = summaries.get(cid)
+                        if cid is not None and self.state.last_seen(cid) is not None:
+                            known += 1
+                            if self.summary_changed(cid, summary):
+                                self.metrics.count("sweep_changed")
+                                self.state.expire(cid)
+                                executor.submit(self.attempt, link, 1, retries)
+                            if known >= stop_after:
+                                break
+                            continue
+                        known = 0
+                        if not self.deduplicator.add(link) or self.harvest(link, summary):
+                            continue
+                        self.metrics.count("sweep_new")
+                        executor.submit(self.attempt, link, 1, retries)
+                    if known >= stop_after:
+                        self.metrics.count("sweep_stopped")
+                        break
+            self.drain(retries)
+
+    def retry_dead_letters(self) -> None:
+        """
+        Scrape again the URLs of this type of sale recorded in the dead-letter file.
+
+        They are taken out of the file first, and the ones failing every
+        attempt again are recorded anew.
+        """
+        if self.dead_letters is None:
+            raise ValueError("retry_dead_letters needs a dead_letter_file")
+        records = self.dead_letters.take(lambda record: record.get("type_of_sale") == self.type_of_sale)
+        self.run(lambda: self.scrape_links([record["url"] for record in records]))
+
+    def run(self, crawl: Callable[[], None], export: bool = True) -> None:
+        """
+        Run a crawl with the stats endpoint and the parse pool, then close the writers and print the summary.
+
+        Args:
+            crawl (Callable[[], None]): Scrapes the listings.
+            export (bool): Rebuild output_file from the crawl state at the end, if there is one. With a shared writer,
+                the owner of the writer rebuilds it from the states of every scraper instead.
+        """
+        if self.state is not None and export and self.shared_writer is None:
+            # An output written before the state existed keeps its rows when rebuilt from the state
+            self.state.seed(self.output_file)
+        stats_server = StatsServer(self.metrics, self.stats_port).start() if self.stats_port is not None else None
+        if self.parse_pool is not None and self.shared_parse_pool is None:
+            self.parse_pool.start()
+        try:
+            crawl()
+        finally:
+            if self.parse_pool is not None:
+                if self.shared_parse_pool is None:
+                    self.parse_pool.close()
+                else:
+                    self.parse_pool.flush()
+            self.close_writers()
+            if self.state is not None and export and self.shared_writer is None:
+                self.state.export(self.output_file)
+            if stats_server is not None:
+                stats_server.stop()
+            self.print_summary()
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Get the counters of the run.
+
+        Returns:
+            Dict[str, Any]: Counters per stage of the scraper.
+        """
+        summary = {
+            "rows": self.counter,
+            "dedup": self.deduplicator.stats(),
+            "limiter": self.limiter.stats(),
+        }
+        metrics = self.metrics.snapshot()
+        summary["stages"] = {
+            stage: {"count": histogram["count"], "mean_ms": histogram["mean_ms"]}
+            for stage, histogram in metrics["stages"].items()
+        }
+        summary["bytes_downloaded"] = metrics["counters"].get("bytes_downloaded", 0)
+        summary["errors"] = metrics["errors"]
+        summary["retries"] = {
+            name: metrics["counters"].get(name, 0) for name in ("retried", "recovered", "dead_letters")
+        }
+        if self.lite:
+            summary["lite"] = {
+                "harvested": metrics["counters"].get("harvested", 0),
+                "detail_needed": metrics["counters"].get("detail_needed", 0),
+            }
+        if "sweep_pages" in metrics["counters"]:
+            summary["sweep"] = {
+                name: metrics["counters"].get(f"sweep_{name}", 0) for name in ("pages", "new", "changed", "stopped")
+            }
+        connections = transport_stats(self.session.transport)
+        if connections is not None:
+            summary["connections"] = connections
+        if self.cache is not None:
+            summary["cache"] = self.cache.stats()
+        if self.state is not None:
+            summary["state"] = dict(self.state.counts)
+        if self.archive is not None:
+            summary["archive"] = self.archive.stats()
+        return summary
+
+    def print_summary(self) -> None:
+        """
+        Print the counters of the run.
+        """
+        print(f"Run summary for {self.base_url}")
+        for stage, value in self.summary().items():
+            print(f"  {stage}: {value}")
+
+    def run_pipeline(self, workers: int = 20, discovery_workers: int = 2, queue_size: int = 200, resume: bool = False) -> None:
+        """
+        Run the scraper as a streaming producer/consumer pipeline.
+
+        The search is planned first from the result count of its first page
+        (plan_search), so discovery workers fetch every planned page in
+        parallel, partitions included. They push the links they find into a
+        bounded queue, which detail workers drain continuously. A full queue
+        blocks discovery, so memory stays constant however many pages the
+        search has. Without a result count, discovery workers claim search
+        pages in order and stop at the first empty page.
+
+        Failed URLs go to a retry queue running on its own threads, and the
+        ones failing every attempt to the dead letters.
+
+        With a checkpoint file, the discovered pages and the completed, pending
+        and failed URLs are logged periodically. A resumed run queues the
+        pending URLs again and continues discovery after the last full page.
+
+        Args:
+            workers (int): Number of detail workers.
+            discovery_workers (int): Number of search page workers.
+            queue_size (int): Maximum number of links waiting in the queue.
+            resume (bool): Continue from the checkpoint file.
+        """
+        checkpoint = None
+        if self.checkpoint_file is not None:
+            checkpoint = Checkpoint(self.checkpoint_file, before_save=self.flush_writers)
+            if resume:
+                checkpoint.load()
+        plan = checkpoint.plan if checkpoint is not None and checkpoint.plan is not None else self.plan_search()
+        if checkpoint is not None:
+            checkpoint.set_plan(plan)
+        planned_pages = [(query, page) for query, pages in plan or [] for page in range(1, pages + 1)]
+
+        links_queue = queue.Queue(maxsize=queue_size)
+        queue_name = f"links:{self.base_url}"
+        self.metrics.gauge(queue_name, links_queue.qsize)
+        pages = itertools.count(checkpoint.next_page() if checkpoint else 1)
+        pages_lock = threading.Lock()
+        last_page_found = threading.Event()
+        if plan is None and checkpoint is not None and checkpoint.last_page_found:
+            last_page_found.set()
+        resumed_urls = checkpoint.pending_urls() if checkpoint else []
+        errors = []
+
+        def discover() -> None:
+            while not last_page_found.is_set():
+                with pages_lock:
+                    page = next(pages)
+                if plan is not None and page > len(planned_pages):
+                    break
+                if checkpoint is not None and checkpoint.is_page_done(page):
+                    continue
+                query, query_page = planned_pages[page - 1] if plan is not None else (None, page)
                 try:
-                    future.result()
+                    listings = self.get_listings(query_page, query)
                 except Exception as e:
-                    pass
+                    errors.append(e)
+                    last_page_found.set()
+                    break
+                if not listings and plan is None:
+                    last_page_found.set()
+                    if checkpoint is not None:
+                        checkpoint.page_done(page, last=True)
+                    break
+                for link, summary in listings:
+                    if not self.deduplicator.add(link):
+                        continue
+                    if checkpoint is not None and not checkpoint.add_pending(link):
+                        continue
+                    if self.harvest(link, summary):
+                        if checkpoint is not None:
+                            checkpoint.complete(link)
+                        continue
+                    links_queue.put(link)
+                if checkpoint is not None:
+                    checkpoint.page_done(page)
 
-    def run_scraper(self) -> None:
+        def requeue() -> None:
+            for link in resumed_urls:
+                links_queue.put(link)
+
+        def record(link: str, error: Optional[BaseException]) -> None:
+            if error is not None:
+                checkpoint.fail(link, error)
+            else:
+                checkpoint.complete(link)
+
+        retries = self.retry_queue(record if checkpoint is not None else None).start()
+
+        def scrape() -> None:
+            while True:
+                link = links_queue.get()
+                if link is None:
+                    break
+                self.attempt(link, 1, retries, record if checkpoint is not None else None)
+
+        discoverers = [threading.Thread(target=requeue, daemon=True)]
+        discoverers += [threading.Thread(target=discover, daemon=True) for _ in range(discovery_workers)]
+        scrapers = [threading.Thread(target=scrape, daemon=True) for _ in range(workers)]
+        try:
+            for thread in discoverers + scrapers:
+                thread.start()
+            for thread in discoverers:
+                thread.join()
+            for _ in scrapers:
+                links_queue.put(None)
+            for thread in scrapers:
+                thread.join()
+            self.drain(retries)
+        finally:
+            retries.close()
+            self.metrics.gauge(queue_name, None)
+            if self.parse_pool is not None:
+                self.parse_pool.flush()
+            if checkpoint is not None:
+                checkpoint.close()
+
+        if errors:
+            raise errors[0]
+
+    async def scrap_async(self, client, semaphore: asyncio.Semaphore, url: str, retries: RetryQueue) -> None:
         """
-        Run the scraper for multiple pages until the last page.
+        Scrape data from a property URL and save it, on the event loop.
+
+        Args:
+            client (aiohttp.ClientSession): Shared async HTTP client.
+            semaphore (asyncio.Semaphore): Bound on the requests in flight.
+            url (str): URL of the property detail page.
+            retries (RetryQueue): Queue retrying the URL with the threaded session if it fails.
         """
-        page = 1
-        while True:
-            links = self.get_links(page)
-            if not links:
-                break
-            self.scrape_links(links)
-            page += 1
+        try:
+            if self.is_fresh(url):
+                return
+            with self.metrics.time("detail_fetch"):
+                async with client.get(url) as response:
+                    response.raise_for_status()
+                    content = await response.read()
+            self.metrics.count("bytes_downloaded", len(content))
+            if self.archive is not None:
+                with self.metrics.time("archive"):
+                    await asyncio.to_thread(self.archive.add, url, content, self.type_of_sale)
+            if self.parse_pool is not None:
+                await asyncio.wrap_future(self.parse_in_pool(content, url))
+                return
+            with self.metrics.time("extract"):
+                data = self.parse_json_data(content, url)
+            self.save_data(data, self.output_file, url)
+        except Exception as e:
+            retries.fail(url, e, 1)
+        finally:
+            semaphore.release()
+
+    async def run_scraper_async(self, max_in_flight: int = 200, search_in_flight: int = 10) -> None:
+        """
+        Run the scraper on a single event loop until the last page.
+
+        The search is planned first from the result count of its first page
+        (plan_search), and every planned page is fetched concurrently.
+        Without a result count, search pages are fetched one after the other
+        until an empty one. Detail pages are scheduled as soon as their link
+        is known. The semaphore is acquired before a detail page is
+        scheduled, so discovery waits when max_in_flight requests are already
+        running. Failed detail pages are retried off the loop, on the threads
+        of the retry queue. A search page answered with an error status is
+        fetched again with the backoff of the threaded session, and if it
+        still fails the error is raised once the scheduled pages are done.
+
+        Args:
+            max_in_flight (int): Maximum number of concurrent requests.
+            search_in_flight (int): Maximum number of concurrent search page requests.
+        """
+        import aiohttp
+
+        semaphore = asyncio.Semaphore(max_in_flight)
+        search_semaphore = asyncio.Semaphore(search_in_flight)
+        connector = aiohttp.TCPConnector(limit=max_in_flight + search_in_flight)
+        tasks = set()
+        queue_name = f"tasks:{self.base_url}"
+        self.metrics.gauge(queue_name, lambda: len(tasks))
+        retries = self.retry_queue().start()
+        errors = []
+
+        async def fetch_listings(client, page: int, query: Optional[str] = None) -> List[Tuple[str, Optional[Dict[str, Any]]]]:
+            content = self.first_pages.pop(query or self.base_url, None) if page == 1 else None
+            if content is None:
+                async with search_semaphore:
+                    with self.metrics.time("search_fetch"):
+                        try:
+                            async with client.get(self.page_url(page, query)) as response:
+                                if response.status < 400:
+                                    content = await response.read()
+                        except aiohttp.ClientError:
+                            pass
+                if content is None:
+                    # Throttled or failed, retried with backoff by the session, which raises once it gives up.
+                    content = await asyncio.to_thread(self.fetch_search_page, page, query)
+                else:
+                    self.metrics.count("bytes_downloaded", len(content))
+            return self.parse_listings(content)
+
+        async def schedule(client, listings: List[Tuple[str, Optional[Dict[str, Any]]]]) -> None:
+            for link, summary in listings:
+                if not self.deduplicator.add(link) or self.harvest(link, summary):
+                    continue
+                await semaphore.acquire()
+                task = asyncio.create_task(self.scrap_async(client, semaphore, link, retries))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+
+        try:
+            plan = await asyncio.to_thread(self.plan_search)
+            async with aiohttp.ClientSession(headers=self.headers, connector=connector) as client:
+                if plan is None:
+                    page = 1
+                    while True:
+                        try:
+                            listings = await fetch_listings(client, page)
+                        except Exception as e:
+                            errors.append(e)
+                            break
+                        if not listings:
+                            break
+                        await schedule(client, listings)
+                        page += 1
+                else:
+                    pages = [fetch_listings(client, page, query) for query, count in plan for page in range(1, count + 1)]
+                    for pending in asyncio.as_completed(pages):
+                        try:
+                            listings = await pending
+                        except Exception as e:
+                            errors.append(e)
+                            continue
+                        await schedule(client, listings)
+                if tasks:
+                    await asyncio.gather(*tasks)
+            await asyncio.to_thread(retries.join)
+        finally:
+            retries.close()
+            self.metrics.gauge(queue_name, None)
+
+        if errors:
+            raise errors[0]
 
 if __name__ == "__main__":
     headers = {
@@ -1,27 +1,38 @@
-import requests
 from bs4 import BeautifulSoup as bs
 import re
 import pandas as pd
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
 import os
+import json
+import threading
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from Utils.extract import extract_table
+from Utils.writer import BatchWriter, SqliteRowSink
+from Utils.concurrency import AdaptiveLimiter, ThrottledSession
+from Utils.pagination import MAX_PAGES, SearchPlanner
 
 class ImmowebScraper:
-    def __init__(self, base_url: str, headers: Dict[str, str], output_file: str, property_types: Dict[str, List[str]]):
+    def __init__(self, base_url: str, headers: Dict[str, str], output_file: str, property_types: Dict[str, List[str]], max_concurrency: int = 10):
         self.base_url = base_url
         self.headers = headers
         self.output_file = output_file
         self.property_types = property_types
+        # AIMD limit on the requests in flight, throttled answers retried with backoff
+        self.limiter = AdaptiveLimiter(initial=min(10, max_concurrency), maximum=max_concurrency)
+        self.session = ThrottledSession(self.limiter)
+        self.session.headers.update(headers)
+        self.writers: Dict[str, BatchWriter] = {}
+        self.writers_lock = threading.Lock()
 
     def get_price(self, url: str) -> int:
         print(f"{url}")
-        response = requests.get(url, headers=self.headers)
+        response = self.session.get(url)
         soup = bs(response.content, 'html.parser')
         price = soup.find('span', class_='sr-only').text
         return price
 
-    def get_links(self, page: int) -> List[str]:
-        response = requests.get(f'{self.base_url}&page={page}&orderBy=relevance', headers=self.headers)
+    def get_links(self, page: int, query: Optional[str] = None) -> List[str]:
+        response = self.session.get(f'{query or self.base_url}&page={page}&orderBy=relevance')
         soup = bs(response.content, 'html.parser')
         links = [a['href'] for a in soup.find_all('a', class_="card__title-link")]
         return links        
@@ -66,17 +77,42 @@ class ImmowebScraper:
             else:
                 new_data[key] = other[key]
 
-        new_df = pd.DataFrame([new_data])
+        self.get_writer(link_save).put(new_data)
 
-        if os.path.exists(link_save):
-            df = pd.read_excel(link_save)
-            df_cleaned = df.dropna(axis=1, how='all')
-            new_df_cleaned = new_df.dropna(axis=1, how='all')
-            df_combined = pd.concat([df_cleaned, new_df_cleaned], ignore_index=True)
-        else:
-            df_combined = new_df
+    @staticmethod
+    def store_file(link_save: str) -> str:
+        return os.path.splitext(link_save)[0] + ".sqlite"
+
+    def get_writer(self, link_save: str) -> BatchWriter:
+        with self.writers_lock:
+            writer = self.writers.get(link_save)
+            if writer is None:
+                # The rows of an Excel file written before the store existed are carried over once
+                if not os.path.exists(self.store_file(link_save)) and os.path.exists(link_save):
+                    self.import_excel(link_save)
+                writer = self.writers[link_save] = BatchWriter(SqliteRowSink(self.store_file(link_save))).start()
+            return writer
+
+    def import_excel(self, link_save: str) -> None:
+        rows = json.loads(pd.read_excel(link_save).to_json(orient="records"))
+        sink = SqliteRowSink(self.store_file(link_save))
+        sink.open()
+        try:
+            sink.write_rows(rows)
+        finally:
+            sink.close()
 
-        df_combined.to_excel(link_save, index=False)
+    def close_writers(self) -> None:
+        with self.writers_lock:
+            writers = list(self.writers.values())
+            self.writers.clear()
+        for writer in writers:
+            writer.close()
+
+    def export_excel(self, link_save: str) -> None:
+        rows = SqliteRowSink.read_rows(self.store_file(link_save))
+        df = pd.DataFrame(rows).dropna(axis=1, how='all')
+        df.to_excel(link_save, index=False)
 
     def get_type_and_subtype_of_property(self, soup) -> List[str | None]:
         h1_title = soup.find('h1', class_='classified__title')
@@ -85,7 +121,7 @@ class ImmowebScraper:
         full_title = h1_title.text.strip()
         first_word = full_title.split()[0] if full_title else ""
         
-        for j, i in property_types.items():
+        for j, i in self.property_types.items():
             if first_word in i:
                 return [j, first_word]
             
@@ -102,7 +138,7 @@ class ImmowebScraper:
             return int(match.group(1))
         return value
 
-    def get_other_info(self, soup) -> Dict[str, str | int | None | bool]:
+    def get_other_info(self, content: bytes) -> Dict[str, str | int | None | bool]:
         property_other = {
             "Bedrooms": 0,
             "Living area": 0,
@@ -117,40 +153,34 @@ class ImmowebScraper:
             "Building condition": ""
         }
 
-        all_info = soup.find_all('div', class_='text-block') + soup.find_all('div', class_='accordion__content')
-        for i in all_info:
-            headers = i.find_all('th', class_='classified-table__header')
-            data = i.find_all('td', class_='classified-table__data')
-            for th, td in zip(headers, data):
-                key = re.sub('<[^<]+?>', '', str(th)).strip()
-                value = re.sub('<[^<]+?>', '', str(td)).strip()
-                if key in property_other:
-                    if key == "Terrace surface":
-                        property_other["Terrace surface"]["Area"] = self.extract_number(value)
-                        property_other["Terrace surface"]["Present"] = True
-                    elif key == "Garden surface":
-                        property_other["Garden surface"]["Area"] = self.extract_number(value)
-                        property_other["Garden surface"]["Present"] = True
-                    else:
-                        if key == "Kitchen type":
-                            value = (True if value == "Installed" else False)
-                        elif value == "Yes":
-                            value = True
-                        elif value == "No":
-                            value = False
-                        property_other[key] = value if type(value) == bool else self.extract_number(value)
+        for key, value in extract_table(content).items():
+            if key in property_other:
+                if key == "Terrace surface":
+                    property_other["Terrace surface"]["Area"] = self.extract_number(value)
+                    property_other["Terrace surface"]["Present"] = True
+                elif key == "Garden surface":
+                    property_other["Garden surface"]["Area"] = self.extract_number(value)
+                    property_other["Garden surface"]["Present"] = True
+                else:
+                    if key == "Kitchen type":
+                        value = (True if value == "Installed" else False)
+                    elif value == "Yes":
+                        value = True
+                    elif value == "No":
+                        value = False
+                    property_other[key] = value if type(value) == bool else self.extract_number(value)
         return property_other
 
     def scrap(self, localite_cp: List[str], price: int, url: str) -> None:
-        link = requests.get(url, headers=self.headers)
+        link = self.session.get(url)
         soup = bs(link.content, 'html.parser')
 
-        other = self.get_other_info(soup)
+        other = self.get_other_info(link.content)
         self.save_init_dic_building(localite_cp, self.get_type_and_subtype_of_property(soup), price, "None", other, self.output_file)
 
 
     def scrape_links(self, links: List[str]) -> None:
-        with ThreadPoolExecutor(max_workers=10) as executor:
+        with ThreadPoolExecutor(max_workers=self.limiter.maximum) as executor:
             futures = [executor.submit(self.scrap, [], self.get_price(link), link) for link in links]
             for future in as_completed(futures):
                 try:
@@ -158,18 +188,46 @@ class ImmowebScraper:
                 except Exception as e:
                     print(f"An error occurred: {e}")
 
-    def run_scraper(self, total_pages: int, pages_per_batch: int) -> None:
-        for i in range(0, total_pages, pages_per_batch):
-            page_range = range(i, min(i + pages_per_batch, total_pages))
-            all_links = []
-            with ThreadPoolExecutor(max_workers=10) as executor:
-                futures = [executor.submit(self.get_links, page) for page in page_range]
-                for future in as_completed(futures):
-                    try:
-                        all_links.extend(future.result())
-                    except Exception as e:
-                        print(f"An error occurred while fetching links: {e}")
-            self.scrape_links(all_links)
+    def plan_pages(self) -> List[Tuple[str, int]]:
+        # Result count of page 1, split by province then price past the page cap
+        planner = SearchPlanner(lambda query: self.session.get(f'{query}&page=1&orderBy=relevance').content)
+        return planner.plan(self.base_url) or [(self.base_url, MAX_PAGES)]
+
+    def run_scraper(self, total_pages: Optional[int] = None, pages_per_batch: int = 5) -> None:
+        # The rows saved so far are flushed and exported even if the crawl fails
+        try:
+            if total_pages is None:
+                pages = [(query, page) for query, count in self.plan_pages() for page in range(1, count + 1)]
+            else:
+                pages = [(self.base_url, page) for page in range(total_pages)]
+            # Planned partitions can overlap, e.g. the search walked again for listings with the price on request
+            seen = set()
+            # A batch without links ends the partitions of its pages only, the later partitions of the plan are still walked
+            exhausted = set()
+            for i in range(0, len(pages), pages_per_batch):
+                batch = [(query, page) for query, page in pages[i:i + pages_per_batch] if query not in exhausted]
+                all_links = []
+                empty = {query for query, _ in batch}
+                with ThreadPoolExecutor(max_workers=self.limiter.maximum) as executor:
+                    futures = {executor.submit(self.get_links, page, query): query for query, page in batch}
+                    for future in as_completed(futures):
+                        try:
+                            links = future.result()
+                        except Exception as e:
+                            # A failed page does not end its partition
+                            empty.discard(futures[future])
+                            print(f"An error occurred while fetching links: {e}")
+                            continue
+                        if links:
+                            empty.discard(futures[future])
+                        all_links.extend(link for link in links if link not in seen)
+                        seen.update(links)
+                exhausted.update(empty)
+                if all_links:
+                    self.scrape_links(all_links)
+        finally:
+            self.close_writers()
+            self.export_excel(self.output_file)
 
 if __name__ == "__main__":
 
@@ -254,4 +312,4 @@ if __name__ == "__main__":
     }
     output_file = "all.xlsx"
     scraper = ImmowebScraper(base_url, headers, output_file, property_types)
-    scraper.run_scraper(total_pages=50, pages_per_batch=5)
+    scraper.run_scraper(pages_per_batch=5)
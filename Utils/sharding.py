@@ -0,0 +1,361 @@
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import shutil
+import socket
+import threading
+import time
+from typing import List, Dict, Any, Optional, Sequence, Tuple
+
+from Utils.scrap_in_json import ImmowebScraper
+from Utils.writer import CsvSink
+from Utils.provinces import PROVINCE_POSTAL_RANGES
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+TRANSACTIONS = {"for-sale": "sale", "for-rent": "rent"}
+
+PROPERTY_TYPES = ("house", "apartment")
+
+
+def plan_shards(
+        transactions: Sequence[str] = tuple(TRANSACTIONS),
+        property_types: Sequence[str] = PROPERTY_TYPES,
+        provinces: Sequence[str] = tuple(PROVINCE_POSTAL_RANGES),
+        price_bands: Optional[Sequence[int]] = None
+) -> List[Dict[str, str]]:
+    """
+    Split the search space into independent shards.
+
+    Args:
+        transactions (Sequence[str]): Transaction types, "for-sale" and/or "for-rent".
+        property_types (Sequence[str]): Immoweb property types, e.g. "house".
+        provinces (Sequence[str]): Provinces to search one by one.
+        price_bands (Optional[Sequence[int]]): Increasing price bounds, e.g. [0, 200000, 400000].
+            The last band has no upper bound. None searches every price at once. Listings with the price on
+            request match no band, so a sharded crawl with price bands never finds them.
+
+    Returns:
+        List[Dict[str, str]]: Shards with their id, search URL and type of sale.
+    """
+    bands: List[Tuple[Optional[int], Optional[int]]] = [(None, None)]
+    if price_bands:
+        bounds = list(price_bands) + [None]
+        bands = [(bounds[i], bounds[i + 1]) for i in range(len(price_bands))]
+
+    shards = []
+    for transaction in transactions:
+        for property_type in property_types:
+            for province in provinces:
+                for low, high in bands:
+                    url = f"https://www.immoweb.be/en/search/{property_type}/{transaction}?countries=BE&provinces={province}"
+                    shard_id = f"{transaction}_{property_type}_{province}".lower()
+                    if low is not None:
+                        url += f"&minPrice={low}"
+                    if high is not None:
+                        url += f"&maxPrice={high - 1}"
+                    if (low, high) != (None, None):
+                        shard_id += f"_{low}-{high if high is not None else 'max'}"
+                    shards.append({"id": shard_id, "url": url, "type_of_sale": TRANSACTIONS[transaction]})
+    return shards
+
+
+class ShardDirectory:
+    """
+    Shared directory through which workers claim shards.
+
+    The directory can live on a network file system, so workers on several
+    hosts can share it. A shard is claimed by creating its claim file with
+    O_EXCL, which only one worker can do. While a worker crawls a shard, it
+    touches the claim file. A claim older than lease seconds is considered
+    abandoned and can be taken over. The new owner resumes from the
+    shard's checkpoint.
+
+    Every claim carries a generation, one more than the number of times the
+    shard was taken over, which works as a fencing token: each generation
+    crawls into files of its own, and only the worker whose generation still
+    holds the claim commits its part, so a worker that was paused past its
+    lease cannot overwrite the part of the worker that took over.
+    """
+    def __init__(self, directory: str, lease: float = 600.0) -> None:
+        """
+        Args:
+            directory (str): Path to the shared directory.
+            lease (float): Seconds after which a claim that was not touched can be taken over.
+        """
+        self.directory = directory
+        self.lease = lease
+        self.claims = os.path.join(directory, "claims")
+        self.done = os.path.join(directory, "done")
+        self.parts = os.path.join(directory, "parts")
+
+    def write_plan(self, shards: List[Dict[str, str]]) -> None:
+        """
+        Create the directory and write the shards to crawl.
+
+        Args:
+            shards (List[Dict[str, str]]): Shards from plan_shards.
+        """
+        for path in (self.claims, self.done, self.parts):
+            os.makedirs(path, exist_ok=True)
+        with open(os.path.join(self.directory, "shards.json"), "w") as file:
+            json.dump(shards, file, indent=2)
+
+    def read_plan(self) -> List[Dict[str, str]]:
+        with open(os.path.join(self.directory, "shards.json")) as file:
+            return json.load(file)
+
+    def is_done(self, shard_id: str) -> bool:
+        return os.path.exists(os.path.join(self.done, shard_id))
+
+    def claim(self) -> Optional[Dict[str, Any]]:
+        """
+        Claim the first shard that is neither done nor claimed by a live worker.
+
+        Returns:
+            Optional[Dict[str, Any]]: Claimed shard with the generation of the claim, or None if there is nothing
+                left to claim.
+        """
+        owner = f"{socket.gethostname()}:{os.getpid()}"
+        for shard in self.read_plan():
+            if self.is_done(shard["id"]):
+                continue
+            path = os.path.join(self.claims, shard["id"])
+            try:
+                if time.time() - os.path.getmtime(path) > self.lease:
+                    # Only one worker can move the stale claim away.
+                    os.rename(path, f"{path}.stale.{owner.replace(':', '.')}.{time.time_ns()}")
+            except OSError:
+                pass
+            try:
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                continue
+            # Every takeover leaves a stale claim behind and only one worker can rename a given claim,
+            # so the count only grows.
+            stale = sum(1 for name in os.listdir(self.claims) if name.startswith(f"{shard['id']}.stale."))
+            with os.fdopen(fd, "w") as file:
+                file.write(f"{owner} {stale + 1}")
+            return dict(shard, generation=stale + 1)
+        return None
+
+    def generation(self, shard_id: str) -> Optional[int]:
+        """
+        Get the generation of the current claim of a shard.
+
+        Args:
+            shard_id (str): ID of the shard.
+
+        Returns:
+            Optional[int]: Generation, or None if the shard is not claimed.
+        """
+        try:
+            with open(os.path.join(self.claims, shard_id)) as file:
+                return int(file.read().split()[-1])
+        except (OSError, ValueError, IndexError):
+            return None
+
+    def heartbeat(self, shard_id: str, generation: int) -> bool:
+        """
+        Extend the lease of a claim.
+
+        Args:
+            shard_id (str): ID of the shard.
+            generation (int): Generation of the claim.
+
+        Returns:
+            bool: False if the claim was taken over.
+        """
+        if self.generation(shard_id) != generation:
+            return False
+        try:
+            os.utime(os.path.join(self.claims, shard_id))
+        except OSError:
+            pass
+        return True
+
+    def mark_done(self, shard_id: str) -> None:
+        open(os.path.join(self.done, shard_id), "w").close()
+
+    def part_file(self, shard_id: str) -> str:
+        return os.path.join(self.parts, f"{shard_id}.csv")
+
+    def work_file(self, shard_id: str, generation: int) -> str:
+        return os.path.join(self.parts, f"{shard_id}.{generation}.csv")
+
+    def checkpoint_file(self, shard_id: str, generation: int) -> str:
+        return os.path.join(self.parts, f"{shard_id}.{generation}.checkpoint.json")
+
+    def seed(self, shard_id: str, generation: int) -> bool:
+        """
+        Copy the checkpoint and rows of the latest earlier generation of a shard, so a takeover resumes its crawl.
+
+        The checkpoint is copied before the rows, so every URL it records as
+        scraped has its row in the copy.
+
+        Args:
+            shard_id (str): ID of the shard.
+            generation (int): Generation of the new claim.
+
+        Returns:
+            bool: True if there was a checkpoint to resume from.
+        """
+        for previous in range(generation - 1, 0, -1):
+            checkpoint_file = self.checkpoint_file(shard_id, previous)
+            copies = [
+                (source, self.checkpoint_file(shard_id, generation) + suffix)
+                for source, suffix in ((checkpoint_file, ""), (checkpoint_file + ".log", ".log"))
+                if os.path.isfile(source)
+            ]
+            if not copies:
+                continue
+            if os.path.isfile(self.work_file(shard_id, previous)):
+                copies.append((self.work_file(shard_id, previous), self.work_file(shard_id, generation)))
+            for source, destination in copies:
+                shutil.copyfile(source, destination)
+            return True
+        return False
+
+    def commit(self, shard_id: str, generation: int) -> bool:
+        """
+        Publish the part of a crawled shard and mark it done, unless its claim was taken over meanwhile.
+
+        Args:
+            shard_id (str): ID of the shard.
+            generation (int): Generation of the claim that crawled the shard.
+
+        Returns:
+            bool: False if a later generation holds the claim, in which case the part is left unpublished.
+        """
+        if self.generation(shard_id) != generation:
+            return False
+        if os.path.isfile(self.work_file(shard_id, generation)):
+            os.replace(self.work_file(shard_id, generation), self.part_file(shard_id))
+        self.mark_done(shard_id)
+        return True
+
+
+def run_worker(directory: str, headers: Dict[str, str] = HEADERS, lease: float = 600.0) -> None:
+    """
+    Claim and crawl shards until none are left, writing one partial CSV file per shard.
+
+    A shard whose claim was taken over while it was crawled is not committed.
+
+    Args:
+        directory (str): Path to the shared shard directory.
+        headers (Dict[str, str]): HTTP headers for requests.
+        lease (float): Seconds after which an abandoned claim can be taken over.
+    """
+    shards = ShardDirectory(directory, lease)
+    while True:
+        shard = shards.claim()
+        if shard is None:
+            return
+        shard_id, generation = shard["id"], shard["generation"]
+        stop = threading.Event()
+
+        def beat() -> None:
+            while not stop.wait(lease / 3):
+                if not shards.heartbeat(shard_id, generation):
+                    return
+
+        heart = threading.Thread(target=beat, daemon=True)
+        heart.start()
+        try:
+            resume = shards.seed(shard_id, generation)
+            scraper = ImmowebScraper(
+                shard["url"], headers, shards.work_file(shard_id, generation), shard["type_of_sale"],
+                checkpoint_file=shards.checkpoint_file(shard_id, generation)
+            )
+            scraper.run_scraper(resume=resume)
+            shards.commit(shard_id, generation)
+        finally:
+            stop.set()
+            heart.join()
+
+
+def merge_parts(directory: str, output_file: str) -> int:
+    """
+    Write the partial CSV files of every shard to one output file, in plan order.
+
+    The rows are written next to output_file, which is replaced once they
+    all are, so merging again does not duplicate them.
+
+    Args:
+        directory (str): Path to the shared shard directory.
+        output_file (str): Path to the merged CSV file.
+
+    Returns:
+        int: Number of rows written.
+    """
+    shards = ShardDirectory(directory)
+    partial = output_file + ".tmp"
+    if os.path.exists(partial):
+        os.remove(partial)
+    sink = CsvSink(partial)
+    sink.open()
+    count = 0
+    try:
+        for shard in shards.read_plan():
+            path = shards.part_file(shard["id"])
+            if not os.path.isfile(path):
+                continue
+            with open(path, newline='') as file:
+                rows = list(csv.DictReader(file))
+            if rows:
+                sink.write_rows(rows)
+                count += len(rows)
+    finally:
+        sink.close()
+    os.replace(partial, output_file)
+    return count
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Plan, crawl and merge a sharded Immoweb crawl.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    plan = commands.add_parser("plan", help="Write the shards to crawl into a shared directory.")
+    plan.add_argument("directory")
+    plan.add_argument("--transactions", nargs="+", default=list(TRANSACTIONS), choices=list(TRANSACTIONS))
+    plan.add_argument("--property-types", nargs="+", default=list(PROPERTY_TYPES))
+    plan.add_argument("--provinces", nargs="+", default=list(PROVINCE_POSTAL_RANGES), choices=list(PROVINCE_POSTAL_RANGES))
+    plan.add_argument(
+        "--price-bands", type=int, nargs="+",
+        help="Increasing price bounds, e.g. 0 200000 400000. Listings with the price on request match no band and are "
+             "not crawled; leave it out to keep them."
+    )
+
+    work = commands.add_parser("work", help="Claim and crawl shards until none are left.")
+    work.add_argument("directory")
+    work.add_argument("--processes", type=int, default=1, help="Number of worker processes on this host.")
+    work.add_argument("--lease", type=float, default=600.0, help="Seconds after which an abandoned shard is taken over.")
+
+    merge = commands.add_parser("merge", help="Write every partial output to one CSV file.")
+    merge.add_argument("directory")
+    merge.add_argument("output_file")
+
+    args = parser.parse_args()
+    if args.command == "plan":
+        shards = plan_shards(args.transactions, args.property_types, args.provinces, args.price_bands)
+        ShardDirectory(args.directory).write_plan(shards)
+        print(f"{len(shards)} shards written to {args.directory}")
+    elif args.command == "work":
+        processes = [
+            multiprocessing.Process(target=run_worker, args=(args.directory, HEADERS, args.lease))
+            for _ in range(args.processes)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+    else:
+        print(f"{merge_parts(args.directory, args.output_file)} rows merged into {args.output_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+import threading
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.models import PreparedRequest, Response
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+
+class PooledAdapter(HTTPAdapter):
+    """
+    HTTP/1.1 keep-alive transport with a connection pool sized to the concurrency.
+
+    The default pool of requests keeps 10 connections per host, so with more
+    threads the extra connections are closed after each request and opened
+    again, paying a TCP and TLS handshake per listing.
+    """
+    def __init__(self, pool_maxsize: int = 20, pool_connections: int = 1, **kwargs) -> None:
+        """
+        Args:
+            pool_maxsize (int): Number of connections kept alive per host, at least the number of requests in flight.
+            pool_connections (int): Number of hosts with a pool.
+            **kwargs: Arguments of HTTPAdapter.
+        """
+        super().__init__(pool_connections=pool_connections, pool_maxsize=pool_maxsize, **kwargs)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get the number of connections opened and reused by the pools.
+
+        Returns:
+            Dict[str, int]: Requests sent, connections opened and requests sent on a reused connection.
+        """
+        pools = self.poolmanager.pools
+        with pools.lock:
+            pools = list(pools._container.values())
+        opened = sum(pool.num_connections for pool in pools)
+        sent = sum(pool.num_requests for pool in pools)
+        return {"requests": sent, "opened": opened, "reused": max(sent - opened, 0)}
+
+
+class Http2Adapter(BaseAdapter):
+    """
+    Transport sending requests through an httpx client with HTTP/2 enabled.
+
+    Over TLS the server may accept HTTP/2, and every request to a host is then
+    multiplexed on a few connections. Plain HTTP and servers without HTTP/2
+    fall back to HTTP/1.1 keep-alive. The whole body is read before returning,
+    and verify and cert are those of the client, not of the request.
+    """
+    def __init__(self, max_connections: int = 20) -> None:
+        """
+        Args:
+            max_connections (int): Maximum number of connections kept open.
+        """
+        super().__init__()
+        import httpx
+
+        self.httpx = httpx
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self.client = httpx.Client(http2=True, limits=limits)
+        self.lock = threading.Lock()
+        self.sent = 0
+        self.opened = 0
+
+    def _trace(self, event: str, info: dict) -> None:
+        if event == "connection.connect_tcp.complete":
+            with self.lock:
+                self.opened += 1
+
+    def send(self, request: PreparedRequest, stream: bool = False, timeout=None, verify=True, cert=None, proxies=None) -> Response:
+        if isinstance(timeout, tuple):
+            timeout = self.httpx.Timeout(timeout[1], connect=timeout[0])
+        else:
+            timeout = self.httpx.Timeout(timeout)
+        with self.lock:
+            self.sent += 1
+        try:
+            answer = self.client.request(
+                request.method, request.url, headers=dict(request.headers), content=request.body,
+                timeout=timeout, extensions={"trace": self._trace}
+            )
+        except self.httpx.TimeoutException as e:
+            raise requests.Timeout(e, request=request)
+        except self.httpx.TransportError as e:
+            raise requests.ConnectionError(e, request=request)
+
+        response = Response()
+        response.status_code = answer.status_code
+        response.reason = answer.reason_phrase
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        response.headers = CaseInsensitiveDict(answer.headers.items())
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.elapsed = answer.elapsed
+        response._content = answer.content
+        response._content_consumed = True
+        return response
+
+    def close(self) -> None:
+        self.client.close()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get the number of connections opened and reused by the client.
+
+        Returns:
+            Dict[str, int]: Requests sent, connections opened and requests sent on a reused connection.
+        """
+        with self.lock:
+            return {"requests": self.sent, "opened": self.opened, "reused": max(self.sent - self.opened, 0)}
+
+
+def make_transport(kind: str = "http1", concurrency: int = 20, hosts: int = 1) -> BaseAdapter:
+    """
+    Build the transport of a session.
+
+    Args:
+        kind (str): "http1" for a keep-alive pool, "http2" for httpx with HTTP/2 (needs httpx[http2]).
+        concurrency (int): Maximum number of requests in flight, the size of the pool.
+        hosts (int): Number of hosts with a pool.
+
+    Returns:
+        BaseAdapter: Transport adapter to mount on a session.
+    """
+    if kind == "http1":
+        return PooledAdapter(pool_maxsize=concurrency, pool_connections=hosts)
+    if kind == "http2":
+        return Http2Adapter(max_connections=concurrency)
+    raise ValueError(f"Unknown transport: {kind}")
+
+
+def mount_transport(session: requests.Session, transport: BaseAdapter) -> None:
+    """
+    Send every http:// and https:// request of a session through a transport.
+
+    Args:
+        session (requests.Session): Session to configure.
+        transport (BaseAdapter): Transport adapter.
+    """
+    session.mount("https://", transport)
+    session.mount("http://", transport)
+
+
+def transport_stats(transport: Optional[BaseAdapter]) -> Optional[Dict[str, int]]:
+    """
+    Get the connection counts of a transport, if it keeps any.
+
+    Args:
+        transport (Optional[BaseAdapter]): Transport adapter.
+
+    Returns:
+        Optional[Dict[str, int]]: Requests, connections opened and reused, None for other adapters.
+    """
+    stats = getattr(transport, "stats", None)
+    return stats() if stats is not None else None
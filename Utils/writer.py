@@ -0,0 +1,440 @@
+import csv
+import json
+import os
+import sqlite3
+import queue
+import threading
+import time
+import uuid
+from typing import List, Dict, Any, Optional, Tuple
+
+from Utils.metrics import Metrics
+from Utils.provinces import province_of
+
+file_lock = threading.Lock()
+
+# Arrow type of every column of a listing row. "category" columns are dictionary-encoded strings.
+LISTING_COLUMN_TYPES = {
+    "Locality": "string",
+    "Type of property": "category",
+    "Subtype of property": "category",
+    "Price": "float",
+    "Type of sale": "category",
+    "Bedrooms": "int",
+    "Living area": "float",
+    "Kitchen type": "category",
+    "Furnished": "bool",
+    "How many fireplaces?": "int",
+    "Terrace surface": "float",
+    "Garden surface": "float",
+    "Surface of the plot": "float",
+    "Number of frontages": "int",
+    "Swimming pool": "bool",
+    "Building condition": "category",
+}
+
+
+def typed_value(kind: str, value: Any) -> Any:
+    """
+    Convert a value of a row to the type of its column, with None for a missing value.
+
+    The scraper writes False for a missing value. It stays False in boolean
+    columns and becomes None in the others.
+
+    Args:
+        kind (str): "string", "category", "int", "float" or "bool".
+        value (Any): Value from the row.
+
+    Returns:
+        Any: Typed value, or None.
+    """
+    if value is None or value == "":
+        return None
+    if kind == "bool":
+        return bool(value) if isinstance(value, bool) else str(value).lower() in ("true", "yes", "1")
+    if value is False:
+        return None
+    try:
+        if kind == "int":
+            return int(value)
+        if kind == "float":
+            return float(value)
+    except (TypeError, ValueError):
+        return None
+    return str(value)
+
+
+class Sink:
+    """
+    Destination of the rows flushed by a BatchWriter.
+
+    Subclasses implement write_rows, and open/close when they hold a resource.
+    write_rows and close are only called from the writer thread.
+    """
+    def open(self) -> None:
+        """
+        Open the underlying resource before the first batch.
+        """
+
+    def write_rows(self, rows: List[Dict[str, Any]]) -> None:
+        """
+        Write a batch of rows.
+
+        Args:
+            rows (List[Dict[str, Any]]): Rows mapping column names to values.
+        """
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """
+        Release the underlying resource after the last batch.
+        """
+
+
+class CsvSink(Sink):
+    """
+    Append rows to a CSV file, writing the header once if the file is new or empty.
+    """
+    def __init__(self, filename: str) -> None:
+        """
+        Args:
+            filename (str): Path to the CSV file.
+        """
+        self.filename = filename
+        self.file = None
+        self.writer = None
+        self.header_written = False
+
+    def open(self) -> None:
+        self.header_written = os.path.isfile(self.filename) and os.path.getsize(self.filename) > 0
+        self.file = open(self.filename, 'a', newline='')
+        self.writer = csv.writer(self.file)
+
+    def write_rows(self, rows: List[Dict[str, Any]]) -> None:
+        # Several writers may append to the same file from one process.
+        with file_lock:
+            if not self.header_written:
+                self.writer.writerow(rows[0].keys())
+                self.header_written = True
+            self.writer.writerows(row.values() for row in rows)
+            self.file.flush()
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class SqliteRowSink(Sink):
+    """
+    Append rows as JSON documents to a SQLite table.
+
+    Rows of any shape are kept as they are, so the table works as an
+    append-only log that can be exported to another format at the end.
+    """
+    def __init__(self, filename: str, table: str = "rows") -> None:
+        """
+        Args:
+            filename (str): Path to the SQLite database.
+            table (str): Name of the table holding the rows.
+        """
+        self.filename = filename
+        self.table = table
+        self.connection = None
+
+    def open(self) -> None:
+        self.connection = sqlite3.connect(self.filename, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(f"CREATE TABLE IF NOT EXISTS {self.table} (id INTEGER PRIMARY KEY, data TEXT NOT NULL)")
+        self.connection.commit()
+
+    def write_rows(self, rows: List[Dict[str, Any]]) -> None:
+        with self.connection:
+            self.connection.executemany(
+                f"INSERT INTO {self.table} (data) VALUES (?)",
+                ((json.dumps(row),) for row in rows)
+            )
+
+    def close(self) -> None:
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    @staticmethod
+    def read_rows(filename: str, table: str = "rows") -> List[Dict[str, Any]]:
+        """
+        Read back every row of a SQLite row log, in insertion order.
+
+        Args:
+            filename (str): Path to the SQLite database.
+            table (str): Name of the table holding the rows.
+
+        Returns:
+            List[Dict[str, Any]]: Rows mapping column names to values.
+        """
+        if not os.path.isfile(filename):
+            return []
+        connection = sqlite3.connect(filename)
+        try:
+            return [json.loads(data) for data, in connection.execute(f"SELECT data FROM {table} ORDER BY id")]
+        finally:
+            connection.close()
+
+
+class ParquetSink(Sink):
+    """
+    Write rows to a Parquet dataset partitioned by type of sale and province.
+
+    Files follow the Hive layout, e.g.
+    directory/type_of_sale=sale/province=ANTWERP/part-<id>.parquet, so
+    readers such as pyarrow.dataset or pandas only open the partitions and
+    columns they need. Columns are typed with LISTING_COLUMN_TYPES, enum-like
+    columns are dictionary-encoded, and the False the scraper puts for
+    missing values becomes null, except in boolean columns. Every partition
+    keeps a file open during the crawl and appends a row group each time
+    row_group_size rows are buffered for it, and a file can be read once the
+    sink is closed. Every run adds new files next to the existing ones.
+    Needs pyarrow.
+    """
+    def __init__(self, directory: str, row_group_size: int = 10000, column_types: Dict[str, str] = LISTING_COLUMN_TYPES) -> None:
+        """
+        Args:
+            directory (str): Root directory of the dataset.
+            row_group_size (int): Number of rows of a partition written as one row group.
+            column_types (Dict[str, str]): "string", "category", "int", "float" or "bool" per column. Other
+                columns are written as strings.
+        """
+        self.directory = directory
+        self.row_group_size = row_group_size
+        self.column_types = column_types
+        self.run_id = uuid.uuid4().hex
+        self.partitions: Dict[Tuple[str, str], Dict[str, Any]] = {}
+
+    def open(self) -> None:
+        import pyarrow
+        import pyarrow.parquet
+
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def partition_of(row: Dict[str, Any]) -> Tuple[str, str]:
+        """
+        Get the partition of a row.
+
+        Args:
+            row (Dict[str, Any]): Row mapping column names to values.
+
+        Returns:
+            Tuple[str, str]: Type of sale and province, "UNKNOWN" when they cannot be told.
+        """
+        return row.get("Type of sale") or "UNKNOWN", province_of(row.get("Locality")) or "UNKNOWN"
+
+    def _arrow_type(self, column: str):
+        pa = self.pa
+        kind = self.column_types.get(column, "string")
+        return {
+            "string": pa.string(),
+            "category": pa.dictionary(pa.int32(), pa.string()),
+            "int": pa.int64(),
+            "float": pa.float64(),
+            "bool": pa.bool_(),
+        }[kind]
+
+    def _open_partition(self, key: Tuple[str, str], row: Dict[str, Any]) -> Dict[str, Any]:
+        type_of_sale, province = key
+        directory = os.path.join(self.directory, f"type_of_sale={type_of_sale}", f"province={province}")
+        os.makedirs(directory, exist_ok=True)
+        # The partition columns are in the directory names, not in the files.
+        columns = [column for column in row.keys() if column != "Type of sale"]
+        schema = self.pa.schema([(column, self._arrow_type(column)) for column in columns])
+        categories = [column for column in columns if self.column_types.get(column) == "category"]
+        writer = self.pq.ParquetWriter(
+            os.path.join(directory, f"part-{self.run_id}.parquet"), schema,
+            use_dictionary=categories, compression="zstd"
+        )
+        return {"writer": writer, "schema": schema, "columns": columns, "rows": []}
+
+    def _write_group(self, partition: Dict[str, Any]) -> None:
+        rows = partition["rows"]
+        if not rows:
+            return
+        arrays = [
+            self.pa.array([typed_value(self.column_types.get(column, "string"), row.get(column)) for row in rows], type=field.type)
+            for column, field in zip(partition["columns"], partition["schema"])
+        ]
+        partition["writer"].write_table(self.pa.Table.from_arrays(arrays, schema=partition["schema"]))
+        rows.clear()
+
+    def write_rows(self, rows: List[Dict[str, Any]]) -> None:
+        for row in rows:
+            key = self.partition_of(row)
+            partition = self.partitions.get(key)
+            if partition is None:
+                partition = self.partitions[key] = self._open_partition(key, row)
+            partition["rows"].append(row)
+            if len(partition["rows"]) >= self.row_group_size:
+                self._write_group(partition)
+
+    def close(self) -> None:
+        for partition in self.partitions.values():
+            self._write_group(partition)
+            partition["writer"].close()
+        self.partitions.clear()
+
+
+def make_sink(filename: str) -> Sink:
+    """
+    Choose the sink of an output path from its extension.
+
+    Args:
+        filename (str): Path ending in .parquet for a Parquet dataset directory, in .db for an indexed listing
+            store, any other path for a CSV file.
+
+    Returns:
+        Sink: Sink writing to the path.
+    """
+    if filename.endswith(".parquet"):
+        return ParquetSink(filename)
+    if filename.endswith(".db"):
+        from Utils.listing_store import ListingStore
+        return ListingStore(filename)
+    return CsvSink(filename)
+
+
+class BatchWriter:
+    """
+    Single writer thread fed by a queue, flushing rows to a sink in batches.
+
+    A batch is flushed when it holds batch_size rows or when flush_interval
+    seconds passed since the last flush, whichever comes first.
+    """
+    _STOP = object()
+
+    def __init__(
+            self,
+            sink: Sink,
+            batch_size: int = 100,
+            flush_interval: float = 1.0,
+            queue_size: int = 10000,
+            metrics: Optional[Metrics] = None,
+            name: str = "writer"
+    ) -> None:
+        """
+        Args:
+            sink (Sink): Destination of the rows.
+            batch_size (int): Number of rows that triggers a flush.
+            flush_interval (float): Maximum number of seconds a row waits before being flushed.
+            queue_size (int): Maximum number of rows waiting in the queue.
+            metrics (Optional[Metrics]): Records the "write" stage and the depth of the queue as a gauge.
+            name (str): Name of the queue depth gauge.
+        """
+        self.sink = sink
+        self.metrics = metrics
+        self.name = name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.thread: Optional[threading.Thread] = None
+        self.error: Optional[BaseException] = None
+        self.rows_written = 0
+
+    def start(self) -> "BatchWriter":
+        """
+        Open the sink and start the writer thread.
+
+        Returns:
+            BatchWriter: The writer itself.
+        """
+        if self.thread is None:
+            self.sink.open()
+            if self.metrics is not None:
+                self.metrics.gauge(self.name, self.queue.qsize)
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+        return self
+
+    def put(self, row: Dict[str, Any]) -> None:
+        """
+        Queue a row for writing, blocking while the queue is full.
+
+        Args:
+            row (Dict[str, Any]): Row mapping column names to values.
+        """
+        if self.error is not None:
+            raise self.error
+        self.queue.put(row)
+
+    def flush(self) -> None:
+        """
+        Block until every row queued so far is written to the sink.
+        """
+        if self.thread is None:
+            return
+        done = threading.Event()
+        self.queue.put(done)
+        done.wait()
+
+    def close(self) -> None:
+        """
+        Flush the remaining rows, stop the writer thread and close the sink.
+        """
+        if self.thread is None:
+            return
+        self.queue.put(self._STOP)
+        self.thread.join()
+        self.thread = None
+        if self.metrics is not None:
+            self.metrics.gauge(self.name, None)
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self) -> "BatchWriter":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _flush(self, batch: List[Dict[str, Any]]) -> None:
+        if batch:
+            if self.metrics is not None:
+                with self.metrics.time("write"):
+                    self.sink.write_rows(batch)
+            else:
+                self.sink.write_rows(batch)
+            self.rows_written += len(batch)
+            batch.clear()
+
+    def _run(self) -> None:
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        try:
+            while True:
+                try:
+                    row = self.queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    row = None
+                if row is self._STOP:
+                    break
+                if isinstance(row, threading.Event):
+                    self._flush(batch)
+                    row.set()
+                    continue
+                if row is not None:
+                    batch.append(row)
+                if len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                    self._flush(batch)
+                    deadline = time.monotonic() + self.flush_interval
+            self._flush(batch)
+        except BaseException as e:
+            self.error = e
+            # Keep draining so producers blocked on a full queue are released.
+            while True:
+                row = self.queue.get()
+                if row is self._STOP:
+                    break
+                if isinstance(row, threading.Event):
+                    row.set()
+        finally:
+            self.sink.close()
@@ -1,23 +1,56 @@
-from Utils.scrap_in_json import ImmowebScraper
-
-
-def main():
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    }
-
-    # Scraper for houses for sale
-    base_url_sale = 'https://www.immoweb.be/en/search/house/for-sale?countries=BE'
-    output_file_sale = "./Data/data.csv"
-    scraper_sale = ImmowebScraper(base_url_sale, headers, output_file_sale, type_of_sale="sale")
-    scraper_sale.run_scraper()
-
-    base_url_rent = 'https://www.immoweb.be/en/search/house/for-rent?countries=BE'
-    output_file_rent = "./Data/data.csv"
-    scraper_rent = ImmowebScraper(base_url_rent, headers, output_file_rent, type_of_sale="rent")
-    scraper_rent.run_scraper()
-
-
-
-if __name__ == "__main__":
-    main()
\ No newline at end of file
+import argparse
+
+from Utils.orchestrator import MultiSearchOrchestrator
+from Utils.archive import reextract
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scrape the Immoweb houses for sale and for rent.")
+    parser.add_argument(
+        "command", nargs="?", default="crawl", choices=["crawl", "sweep", "retry-dead-letters", "reextract"],
+        help="crawl the searches, sweep the listings published since the last sweep, scrape again the URLs "
+             "recorded in the dead-letter file, or rebuild the output from the archived pages without any request"
+    )
+    parser.add_argument(
+        "--archive", action="store_true",
+        help="keep the raw detail pages in ./Data/archive, so reextract can rebuild the output later"
+    )
+    args = parser.parse_args()
+
+    headers = {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+    }
+
+    # Houses for sale and for rent are crawled at the same time
+    searches = [
+        {"base_url": 'https://www.immoweb.be/en/search/house/for-sale?countries=BE', "type_of_sale": "sale"},
+        {"base_url": 'https://www.immoweb.be/en/search/house/for-rent?countries=BE', "type_of_sale": "rent"},
+    ]
+    output_file = "./Data/data.csv"
+    # URLs failing every retry are kept here with the reason, for retry-dead-letters
+    dead_letter_file = "./Data/dead_letters.jsonl"
+    # With --archive, raw detail pages are kept here, so reextract can rebuild the output after an extraction change
+    archive_dir = "./Data/archive"
+    if args.command == "reextract":
+        counts = reextract(archive_dir, output_file)
+        print(f"{counts['rows']} rows from {counts['listings']} archived listings, {counts['errors']} errors")
+        return
+    if args.command == "sweep":
+        # Listings already in the state files are skipped, new and changed ones go to their own file
+        searches = [dict(search, state_file=f"./Data/state_{search['type_of_sale']}.db") for search in searches]
+        output_file = "./Data/new_listings.csv"
+    orchestrator = MultiSearchOrchestrator(
+        searches, headers, output_file, dead_letter_file=dead_letter_file,
+        archive_dir=archive_dir if args.archive else None
+    )
+    if args.command == "retry-dead-letters":
+        orchestrator.retry_dead_letters()
+    elif args.command == "sweep":
+        orchestrator.run_sweep()
+    else:
+        orchestrator.run()
+
+
+
+if __name__ == "__main__":
+    main()